@@ -14,7 +14,12 @@ from sqlmodel import SQLModel
 from english_tutor.models.user import User, Session
 from english_tutor.models.content import Curriculum, AgentPrompt
 from english_tutor.models.evaluation import Message, Evaluation
-from english_tutor.models.token_usage import TokenUsage
+from english_tutor.models.token_usage import (
+    TokenUsage,
+    ModelPrice,
+    UserDailyCost,
+    TokenUsageRollup,
+)
 
 config = context.config
 config.set_main_option("sqlalchemy.url", db_url)
@@ -0,0 +1,33 @@
+"""add context summary to session
+
+Revision ID: 5b3e91c2d7a4
+Revises: 9df6e0f80afb
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b3e91c2d7a4'
+down_revision: Union[str, Sequence[str], None] = '9df6e0f80afb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('context_summary', sqlmodel.sql.sqltypes.AutoString(), server_default='', nullable=False))
+        batch_op.add_column(sa.Column('summarized_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('session', schema=None) as batch_op:
+        batch_op.drop_column('summarized_count')
+        batch_op.drop_column('context_summary')
@@ -0,0 +1,41 @@
+"""add latency columns to tokenusage
+
+Revision ID: 7c4d2a9e8f13
+Revises: 5b3e91c2d7a4
+Create Date: 2026-10-18 11:02:17.532840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4d2a9e8f13'
+down_revision: Union[str, Sequence[str], None] = '5b3e91c2d7a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('tokenusage', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('agent_name', sqlmodel.sql.sqltypes.AutoString(), server_default='', nullable=False))
+        batch_op.add_column(sa.Column('ttft_ms', sa.Integer(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('generation_ms', sa.Integer(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('db_ms', sa.Integer(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('chunk_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('mean_inter_token_ms', sa.Float(), server_default=sa.text('0.0'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('tokenusage', schema=None) as batch_op:
+        batch_op.drop_column('mean_inter_token_ms')
+        batch_op.drop_column('chunk_count')
+        batch_op.drop_column('db_ms')
+        batch_op.drop_column('generation_ms')
+        batch_op.drop_column('ttft_ms')
+        batch_op.drop_column('agent_name')
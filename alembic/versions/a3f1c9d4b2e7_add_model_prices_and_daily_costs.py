@@ -0,0 +1,91 @@
+"""add model prices and daily costs
+
+Revision ID: a3f1c9d4b2e7
+Revises: 7c4d2a9e8f13
+Create Date: 2026-10-18 14:21:05.118342
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d4b2e7'
+down_revision: Union[str, Sequence[str], None] = '7c4d2a9e8f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# USD per million tokens: (input, output, cached input)
+INITIAL_PRICES = {
+    'gemini-3-flash-preview': (0.50, 3.00, 0.05),
+    'gemini-2.5-flash': (0.30, 2.50, 0.03),
+    'gemini-2.5-flash-lite': (0.10, 0.40, 0.01),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    modelprice = op.create_table('modelprice',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('model_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('input_per_mtok', sa.Float(), nullable=False),
+    sa.Column('output_per_mtok', sa.Float(), nullable=False),
+    sa.Column('cached_input_per_mtok', sa.Float(), nullable=False),
+    sa.Column('effective_from', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('userdailycost',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('turns', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('cached_prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('total_tokens', sa.Integer(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'day')
+    )
+
+    op.bulk_insert(modelprice, [
+        {
+            'model_name': model,
+            'input_per_mtok': input_price,
+            'output_per_mtok': output_price,
+            'cached_input_per_mtok': cached_price,
+            'effective_from': datetime(2025, 1, 1),
+        }
+        for model, (input_price, output_price, cached_price) in INITIAL_PRICES.items()
+    ])
+
+    # Price existing usage and build its daily totals.
+    op.execute("""
+        UPDATE tokenusage t SET estimated_cost = (
+            (t.prompt_tokens - LEAST(t.cached_prompt_tokens, t.prompt_tokens))
+                * p.input_per_mtok
+            + LEAST(t.cached_prompt_tokens, t.prompt_tokens) * p.cached_input_per_mtok
+            + t.completion_tokens * p.output_per_mtok
+        ) / 1000000.0
+        FROM modelprice p
+        WHERE p.model_name = t.model_name
+    """)
+    op.execute("""
+        INSERT INTO userdailycost (user_id, day, turns, prompt_tokens,
+            completion_tokens, cached_prompt_tokens, total_tokens, cost)
+        SELECT user_id, CAST(created_at AS DATE), COUNT(*), SUM(prompt_tokens),
+            SUM(completion_tokens), SUM(cached_prompt_tokens), SUM(total_tokens),
+            SUM(estimated_cost)
+        FROM tokenusage
+        GROUP BY user_id, CAST(created_at AS DATE)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('userdailycost')
+    op.drop_table('modelprice')
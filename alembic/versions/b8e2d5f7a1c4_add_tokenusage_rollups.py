@@ -0,0 +1,60 @@
+"""add tokenusage rollups
+
+Revision ID: b8e2d5f7a1c4
+Revises: a3f1c9d4b2e7
+Create Date: 2026-10-18 15:07:42.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2d5f7a1c4'
+down_revision: Union[str, Sequence[str], None] = 'a3f1c9d4b2e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tokenusagerollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('model_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('agent_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('turns', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('cached_prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('total_tokens', sa.Integer(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.Column('response_time_ms', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularity', 'bucket', 'model_name', 'agent_name', 'user_id')
+    )
+
+    # Roll up the usage recorded so far.
+    for granularity in ('hour', 'day'):
+        op.execute(f"""
+            INSERT INTO tokenusagerollup (granularity, bucket, model_name,
+                agent_name, user_id, turns, prompt_tokens, completion_tokens,
+                cached_prompt_tokens, total_tokens, cost, response_time_ms)
+            SELECT '{granularity}', date_trunc('{granularity}', created_at),
+                model_name, agent_name, user_id, COUNT(*), SUM(prompt_tokens),
+                SUM(completion_tokens), SUM(cached_prompt_tokens),
+                SUM(total_tokens), SUM(estimated_cost), SUM(response_time_ms)
+            FROM tokenusage
+            GROUP BY date_trunc('{granularity}', created_at), model_name,
+                agent_name, user_id
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('tokenusagerollup')
@@ -0,0 +1,47 @@
+"""add hot query indexes
+
+Revision ID: c4d9e1a7f2b6
+Revises: b8e2d5f7a1c4
+Create Date: 2026-10-18 15:48:21.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d9e1a7f2b6'
+down_revision: Union[str, Sequence[str], None] = 'b8e2d5f7a1c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Chat history and sidebar pages are keyed on (created_at, id) and
+    # (updated_at, id).
+    op.create_index('ix_message_session_id_created_at_id', 'message',
+                    ['session_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_session_user_id_updated_at_id_live', 'session',
+                    ['user_id', 'updated_at', 'id'], unique=False,
+                    postgresql_where=sa.text('is_deleted = false'))
+    op.create_index('ix_tokenusage_created_at', 'tokenusage',
+                    ['created_at'], unique=False)
+    op.create_index('ix_tokenusage_model_agent_id', 'tokenusage',
+                    ['model_name', 'agent_name', 'id'], unique=False)
+    op.create_index('ix_agentprompt_agent_name_version', 'agentprompt',
+                    ['agent_name', 'version'], unique=False)
+    op.create_index('ix_userdailycost_day', 'userdailycost',
+                    ['day'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_userdailycost_day', table_name='userdailycost')
+    op.drop_index('ix_agentprompt_agent_name_version', table_name='agentprompt')
+    op.drop_index('ix_tokenusage_model_agent_id', table_name='tokenusage')
+    op.drop_index('ix_tokenusage_created_at', table_name='tokenusage')
+    op.drop_index('ix_session_user_id_updated_at_id_live', table_name='session')
+    op.drop_index('ix_message_session_id_created_at_id', table_name='message')
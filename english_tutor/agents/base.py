@@ -1,77 +1,309 @@
 import dotenv
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import time
 from langchain_core.messages import (
     SystemMessage,
     HumanMessage,
     AIMessage as AIChatMessage,
 )
+from .blocking import BlockingPool
+from .context import ContextPolicy, ContextWindow, estimate_tokens
+from .context_cache import CacheEntry, context_cache
+from .governor import LLMGovernor
+from .prompt_store import PromptStore
+from .providers import LLM_PROVIDER, create_chat_model
+from .registry import AgentRegistry
+from .router import ModelRouter, Route
+from ..tracing import span, tracer
 
 
 dotenv.load_dotenv()
 
+# Used when a route's model times out or keeps failing; empty disables failover.
+FALLBACK_MODEL = os.environ.get("LLM_FALLBACK_MODEL", "gemini-2.5-flash")
+
+
+def extract_text(part) -> str:
+    if isinstance(part, str):
+        return part
+    elif isinstance(part, dict):
+        return part.get("text", "")
+    elif hasattr(part, "text"):
+        return part.text
+    else:
+        return str(part)
+
+
+def usage_from_response(response, model: str = "") -> dict:
+    """Normalize token usage from a LangChain message or a raw Gemini response.
+
+    `model` is the routed model, reported when the response does not name one.
+    Cached prompt tokens are reported as the provider counts them.
+    """
+    metadata = {
+        "model_name": getattr(response, "response_metadata", {}).get("model_name")
+        or model
+        or ModelRouter.DEFAULT_MODEL,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "total_tokens": 0,
+    }
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict):
+        # LangChain UsageMetadata
+        details = usage.get("input_token_details") or {}
+        metadata["prompt_tokens"] = usage.get("input_tokens", 0)
+        metadata["completion_tokens"] = usage.get("output_tokens", 0)
+        metadata["cached_prompt_tokens"] = details.get("cache_read", 0)
+        metadata["total_tokens"] = usage.get("total_tokens", 0)
+    elif usage is not None:
+        metadata["prompt_tokens"] = getattr(usage, "prompt_token_count", 0)
+        metadata["completion_tokens"] = getattr(usage, "candidates_token_count", 0)
+        metadata["cached_prompt_tokens"] = getattr(
+            usage, "cached_content_token_count", 0
+        )
+        metadata["total_tokens"] = getattr(usage, "total_token_count", 0)
+    elif hasattr(response, "response_metadata"):
+        # Alternative metadata location
+        resp_meta = response.response_metadata
+        if "token_usage" in resp_meta:
+            usage = resp_meta["token_usage"]
+            metadata["prompt_tokens"] = usage.get("prompt_tokens", 0)
+            metadata["completion_tokens"] = usage.get("completion_tokens", 0)
+            metadata["total_tokens"] = usage.get("total_tokens", 0)
+    return metadata
+
 
 class BaseAgent:
+    # Key used by the Orchestrator, admin prompt editor and context cache.
+    agent_key = "onboarding"
+    # Override per agent type to trade context length for cost and latency.
+    context_policy = ContextPolicy()
+    # ModelRouter task used for this agent's turns.
+    task = "chat"
+
     def __init__(self, name: str, prompt_file: str):
         self.name = name
-        with open(prompt_file, "r") as f:
-            self.system_prompt = f.read()
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            # Fallback or let langchain handle it if GOOGLE_API_KEY is set
-            pass
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-3-flash-preview", google_api_key=api_key
+        self.context_window = ContextWindow(self.context_policy)
+        self.prompt_file = prompt_file
+
+    @staticmethod
+    def client(route: Route, model: str | None = None):
+        """Chat model client for `route` (optionally on another model).
+
+        Clients are shared across agents so the HTTP session stays warm.
+        """
+        model = model or route.model
+        return AgentRegistry.llm(
+            f"{LLM_PROVIDER}:{model}:{route.max_output_tokens}:{route.temperature}",
+            lambda: create_chat_model(
+                model,
+                max_output_tokens=route.max_output_tokens,
+                temperature=route.temperature,
+            ),
         )
 
-    def get_response(self, history: list[dict[str, str]], **kwargs) -> tuple[str, dict]:
-        """Get response from LLM and return (text, metadata) tuple."""
-        messages = [SystemMessage(content=self.system_prompt.format(**kwargs))]
-        for msg in history:
+    @property
+    def llm(self):
+        """Client for this agent's own task route."""
+        return self.client(ModelRouter.route(self.task))
+
+    @property
+    def system_prompt(self) -> str:
+        """Active prompt template: the DB version if one exists, else the file."""
+        return PromptStore.get(self.agent_key, self.prompt_file)[1]
+
+    def build_messages(
+        self,
+        history: list[dict[str, str]],
+        context_summary: str = "",
+        summarized_count: int = 0,
+        prompt: tuple[str, str] | None = None,
+        **kwargs,
+    ) -> tuple[str, list]:
+        """Render the system prompt and the windowed history for one call.
+
+        The system message is returned separately so it can be replaced by a
+        provider-side cached prefix. `prompt` is the (version, template) pair
+        when the caller already fetched it with `PromptStore.aget`.
+        """
+        version, template = prompt or PromptStore.get(self.agent_key, self.prompt_file)
+        system_text = PromptStore.render(self.agent_key, version, template, **kwargs)
+        messages = []
+        if context_summary:
+            messages.append(
+                HumanMessage(
+                    content=f"(Summary of our earlier conversation)\n{context_summary}"
+                )
+            )
+        window = self.context_window.select(
+            history,
+            summary=context_summary,
+            summarized_count=summarized_count,
+            reserved_tokens=estimate_tokens(system_text),
+        )
+        for msg in window:
             if msg["sender"] == "user":
                 messages.append(HumanMessage(content=msg["content_text"]))
             else:
                 messages.append(AIChatMessage(content=msg["content_text"]))
+        return system_text, messages
+
+    def cached_prefix(
+        self, system_text: str, model: str, **kwargs
+    ) -> CacheEntry | None:
+        """Look up (or register) the rendered system prompt as cached content."""
+        return context_cache.lookup(
+            self.agent_key,
+            PromptStore.get(self.agent_key, self.prompt_file)[0],
+            kwargs.get("level"),
+            model,
+            system_text,
+        )
+
+    def request(
+        self, system_text: str, messages: list, cache_entry: CacheEntry | None
+    ) -> tuple[list, dict]:
+        """Final message list and call options, using the cached prefix if any."""
+        if cache_entry:
+            return messages, {"cached_content": cache_entry.name}
+        return [SystemMessage(content=system_text)] + messages, {}
+
+    def fallback(
+        self, route: Route, messages: list, system_text: str = ""
+    ) -> tuple | None:
+        """(client, model, messages, options) to fail over to, or None if off.
+
+        Context caches are per model, so the fallback request always carries
+        the full system prompt instead of the primary's cached_content.
+        """
+        model = FALLBACK_MODEL if route.fallback is None else route.fallback
+        if not model or model == route.model:
+            return None
+        if system_text:
+            messages = [SystemMessage(content=system_text)] + messages
+        return self.client(route, model), model, messages, {}
+
+    async def afold_context(
+        self,
+        history: list[dict[str, str]],
+        context_summary: str = "",
+        summarized_count: int = 0,
+    ) -> tuple[str, int, dict] | None:
+        """Fold older turns into the rolling summary.
+
+        Returns (new_summary, new_summarized_count, usage metadata), or None
+        when there is not yet enough history outside the verbatim window to be
+        worth it.
+        """
+        start_time = time.perf_counter()
+        fold = self.context_window.fold_range(history, summarized_count)
+        if fold is None:
+            return None
+        start, end = fold
+        request = self.context_window.summary_request(
+            context_summary, history[start:end]
+        )
+        route = ModelRouter.route("summary")
+        messages = [HumanMessage(content=request[0]["content_text"])]
+        response = await LLMGovernor.ainvoke(
+            self.client(route),
+            route.model,
+            messages,
+            fallback=self.fallback(route, messages),
+        )
+        content = response.content
+        if isinstance(content, list):
+            content = " ".join(extract_text(part) for part in content)
+        metadata = usage_from_response(response, model=route.model)
+        metadata["agent_name"] = "summary"
+        metadata["response_time_ms"] = int((time.perf_counter() - start_time) * 1000)
+        return str(content).strip(), end, metadata
+
+    def get_response(
+        self,
+        history: list[dict[str, str]],
+        context_summary: str = "",
+        summarized_count: int = 0,
+        task: str | None = None,
+        **kwargs,
+    ) -> tuple[str, dict]:
+        """Get response from LLM and return (text, metadata) tuple.
+
+        `task` selects the ModelRouter route (default: the agent's own).
+        Blocking: runs on the bounded BlockingPool. Async callers should use
+        `aget_response` instead.
+        """
+        return BlockingPool.call(
+            self._invoke, history, context_summary, summarized_count, task, **kwargs
+        )
+
+    def _invoke(
+        self,
+        history: list[dict[str, str]],
+        context_summary: str,
+        summarized_count: int,
+        task: str | None,
+        **kwargs,
+    ) -> tuple[str, dict]:
+        start = time.perf_counter()
+        route = ModelRouter.route(task or self.task)
+        system_text, messages = self.build_messages(
+            history, context_summary, summarized_count, **kwargs
+        )
+        cache_entry = self.cached_prefix(system_text, route.model, **kwargs)
+        fallback = self.fallback(route, messages, system_text)
+        messages, options = self.request(system_text, messages, cache_entry)
+
+        response = LLMGovernor.invoke(
+            self.client(route), route.model, messages, fallback=fallback, **options
+        )
+        text, metadata = self.parse_response(response, route.model)
+        metadata["agent_name"] = task or self.agent_key
+        metadata["response_time_ms"] = int((time.perf_counter() - start) * 1000)
+        return text, metadata
+
+    async def aget_response(
+        self,
+        history: list[dict[str, str]],
+        context_summary: str = "",
+        summarized_count: int = 0,
+        task: str | None = None,
+        **kwargs,
+    ) -> tuple[str, dict]:
+        """Async variant of `get_response` that does not block the event loop.
 
-        response = self.llm.invoke(messages)
+        Usage metadata names `task` as the agent when one is given, so utility
+        calls (titles) are accounted separately from chat turns.
+        """
+        start = time.perf_counter()
+        route = ModelRouter.route(task or self.task)
+        prompt = await PromptStore.aget(self.agent_key, self.prompt_file)
+        system_text, messages = self.build_messages(
+            history, context_summary, summarized_count, prompt, **kwargs
+        )
+        cache_entry = await BlockingPool.run(
+            self.cached_prefix, system_text, route.model, **kwargs
+        )
+        fallback = self.fallback(route, messages, system_text)
+        messages, options = self.request(system_text, messages, cache_entry)
+
+        response = await LLMGovernor.ainvoke(
+            self.client(route), route.model, messages, fallback=fallback, **options
+        )
+        text, metadata = self.parse_response(response, route.model)
+        metadata["agent_name"] = task or self.agent_key
+        metadata["response_time_ms"] = int((time.perf_counter() - start) * 1000)
+        return text, metadata
+
+    def parse_response(self, response, model: str = "") -> tuple[str, dict]:
+        """Extract (text, metadata) from a non-streaming LLM response."""
         content = response.content
 
         # Extract usage metadata
-        metadata = {
-            "model_name": getattr(response, "model", "gemini-3-flash-preview"),
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "cached_prompt_tokens": 0,
-            "total_tokens": 0,
-        }
-
-        # Try to extract token usage if available
-        if hasattr(response, "usage_metadata"):
-            usage = response.usage_metadata
-            metadata["prompt_tokens"] = getattr(usage, "prompt_token_count", 0)
-            metadata["completion_tokens"] = getattr(usage, "candidates_token_count", 0)
-            metadata["cached_prompt_tokens"] = getattr(
-                usage, "cached_content_token_count", 0
-            )
-            metadata["total_tokens"] = getattr(usage, "total_token_count", 0)
-        elif hasattr(response, "response_metadata"):
-            # Alternative metadata location
-            resp_meta = response.response_metadata
-            if "token_usage" in resp_meta:
-                usage = resp_meta["token_usage"]
-                metadata["prompt_tokens"] = usage.get("prompt_tokens", 0)
-                metadata["completion_tokens"] = usage.get("completion_tokens", 0)
-                metadata["total_tokens"] = usage.get("total_tokens", 0)
-
-        def extract_text(part):
-            if isinstance(part, str):
-                return part
-            elif isinstance(part, dict):
-                return part.get("text", "")
-            elif hasattr(part, "text"):
-                return part.text
-            else:
-                return str(part)
+        metadata = usage_from_response(response, model)
+        metadata["agent_name"] = self.agent_key
 
         if isinstance(content, str):
             return content, metadata
@@ -84,65 +316,102 @@ class BaseAgent:
         else:
             return str(content), metadata
 
-    async def stream_response(self, history: list[dict[str, str]], **kwargs):
-        """Stream response from LLM and yield (text_chunk, metadata) tuples."""
-        messages = [SystemMessage(content=self.system_prompt.format(**kwargs))]
-        for msg in history:
-            if msg["sender"] == "user":
-                messages.append(HumanMessage(content=msg["content_text"]))
-            else:
-                messages.append(AIChatMessage(content=msg["content_text"]))
+    async def stream_response(
+        self,
+        history: list[dict[str, str]],
+        context_summary: str = "",
+        summarized_count: int = 0,
+        task: str | None = None,
+        **kwargs,
+    ):
+        """Stream response from LLM and yield (text_chunk, metadata) tuples.
+
+        The final metadata also carries stream timings: ttft_ms, generation_ms,
+        chunk_count and mean_inter_token_ms. Its agent_name is `task` when one
+        is given.
+        """
+        start = time.perf_counter()
+        route = ModelRouter.route(task or self.task)
+        prompt = await PromptStore.aget(self.agent_key, self.prompt_file)
+        with span("prompt_render", agent=self.agent_key):
+            system_text, messages = self.build_messages(
+                history, context_summary, summarized_count, prompt, **kwargs
+            )
+        with span("context_cache.lookup", agent=self.agent_key) as cache_span:
+            # Registering a cache entry is a blocking provider call on a miss.
+            cache_entry = await BlockingPool.run(
+                self.cached_prefix, system_text, route.model, **kwargs
+            )
+            cache_span.set(hit=cache_entry is not None)
+        fallback = self.fallback(route, messages, system_text)
+        messages, options = self.request(system_text, messages, cache_entry)
 
         full_text = ""
         last_response = None
-        async for chunk in self.llm.astream(messages):
-            last_response = chunk
-            chunk_text = chunk.content
-            if isinstance(chunk_text, str):
+        first_chunk_at = None
+        last_chunk_at = None
+        chunk_count = 0
+        # Spans are ended by hand because they straddle the yields below.
+        connect_span = tracer.start_span(
+            "upstream_connect", agent=self.agent_key, model=route.model
+        )
+        stream_span = None
+        try:
+            async for chunk in LLMGovernor.astream(
+                self.client(route), route.model, messages, fallback=fallback, **options
+            ):
+                if getattr(chunk, "usage_metadata", None):
+                    last_response = chunk
+                chunk_text = chunk.content
+                if isinstance(chunk_text, list):
+                    # Handle list of content parts
+                    chunk_text = "".join([extract_text(p) for p in chunk_text])
+                if not isinstance(chunk_text, str) or not chunk_text:
+                    continue
+
+                last_chunk_at = time.perf_counter()
+                if first_chunk_at is None:
+                    first_chunk_at = last_chunk_at
+                    tracer.end_span(connect_span)
+                    stream_span = tracer.start_span("streaming", agent=self.agent_key)
+                chunk_count += 1
                 full_text += chunk_text
                 yield chunk_text, {}
-            elif isinstance(chunk_text, list):
-                # Handle list of content parts
-                def extract_text(part):
-                    if isinstance(part, str):
-                        return part
-                    if isinstance(part, dict):
-                        return part.get("text", "")
-                    if hasattr(part, "text"):
-                        return part.text
-                    return str(part)
-
-                text = "".join([extract_text(p) for p in chunk_text])
-                full_text += text
-                yield text, {}
+        except BaseException as e:
+            tracer.end_span(stream_span or connect_span, e)
+            raise
+        if stream_span is None:
+            tracer.end_span(connect_span)
+        else:
+            stream_span.set(chunks=chunk_count)
+            tracer.end_span(stream_span)
 
         # Final chunk: extract metadata
-        metadata = {
-            "model_name": getattr(last_response, "model", "gemini-3-flash-preview"),
-            "prompt_tokens": 0,
-            "completion_tokens": 0,
-            "cached_prompt_tokens": 0,
-            "total_tokens": 0,
-        }
-
-        if last_response and hasattr(last_response, "usage_metadata"):
-            usage = last_response.usage_metadata
-            metadata["prompt_tokens"] = getattr(usage, "prompt_token_count", 0)
-            metadata["completion_tokens"] = getattr(usage, "candidates_token_count", 0)
-            metadata["cached_prompt_tokens"] = getattr(
-                usage, "cached_content_token_count", 0
-            )
-            metadata["total_tokens"] = getattr(usage, "total_token_count", 0)
+        end = time.perf_counter()
+        metadata = usage_from_response(last_response, route.model)
+        metadata["agent_name"] = task or self.agent_key
+        metadata["ttft_ms"] = int(((first_chunk_at or end) - start) * 1000)
+        metadata["generation_ms"] = int(((last_chunk_at or end) - start) * 1000)
+        metadata["chunk_count"] = chunk_count
+        metadata["mean_inter_token_ms"] = (
+            (last_chunk_at - first_chunk_at) * 1000 / (chunk_count - 1)
+            if first_chunk_at is not None and last_chunk_at and chunk_count > 1
+            else 0.0
+        )
 
         yield "", metadata
 
 
 class CounselorAgent(BaseAgent):
+    agent_key = "onboarding"
+
     def __init__(self):
         super().__init__("Counselor", "english_tutor/prompts/counselor.txt")
 
 
 class EvaluatorAgent(BaseAgent):
+    agent_key = "evaluation"
+
     def __init__(self):
         super().__init__("Evaluator", "english_tutor/prompts/evaluator.txt")
 
@@ -150,6 +419,11 @@ class EvaluatorAgent(BaseAgent):
 class PlacementAgent(BaseAgent):
     """Agent for initial 8-level classification."""
 
+    agent_key = "placement"
+    task = "placement"
+    # Placement scores the whole exchange, so keep more of it verbatim.
+    context_policy = ContextPolicy(token_budget=12000, keep_last_turns=12)
+
     def __init__(self):
         super().__init__("Placement Evaluator", "english_tutor/prompts/placement.txt")
 
@@ -157,15 +431,23 @@ class PlacementAgent(BaseAgent):
 class ProgressAgent(BaseAgent):
     """Agent for testing mastery after a curriculum chapter."""
 
+    agent_key = "progress_test"
+    context_policy = ContextPolicy(token_budget=12000, keep_last_turns=10)
+
     def __init__(self):
         super().__init__("Progress Evaluator", "english_tutor/prompts/progress.txt")
 
 
 class TutorAgent(BaseAgent):
+    agent_key = "tutoring"
+    context_policy = ContextPolicy(token_budget=4000, keep_last_turns=6)
+
     def __init__(self):
         super().__init__("Tutor", "english_tutor/prompts/tutor.txt")
 
 
 class PlannerAgent(BaseAgent):
+    agent_key = "planning"
+
     def __init__(self):
         super().__init__("Planner", "english_tutor/prompts/planner.txt")
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+import dotenv
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+dotenv.load_dotenv()
+
+
+class BlockingPool:
+    """Bounded thread pool for blocking provider and cache calls.
+
+    Async code awaits `run` so the event loop keeps serving other users;
+    synchronous callers go through `call`, which caps how many blocking LLM
+    requests run at once (LLM_BLOCKING_WORKERS, default 8). Both run `fn` in
+    a copy of the caller's context, so context variables such as the
+    governor's `llm_user` and the current trace span carry over.
+    """
+
+    _lock = threading.Lock()
+    _executor: ThreadPoolExecutor | None = None
+    max_workers = int(os.environ.get("LLM_BLOCKING_WORKERS", "8"))
+    _stats: dict[str, int] = {
+        "submitted": 0,
+        "in_flight": 0,
+        "sync_calls": 0,
+        # Sync calls made from a thread running an event loop stall that loop.
+        "sync_calls_on_loop": 0,
+    }
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=cls.max_workers, thread_name_prefix="llm-blocking"
+                )
+            return cls._executor
+
+    @classmethod
+    async def run(cls, fn, *args, **kwargs):
+        """Await `fn(*args, **kwargs)` on the pool."""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            cls.executor(),
+            functools.partial(ctx.run, cls._tracked, fn, *args, **kwargs),
+        )
+
+    @classmethod
+    def call(cls, fn, *args, **kwargs):
+        """Run `fn` on the pool and wait for it from synchronous code."""
+        try:
+            asyncio.get_running_loop()
+            on_loop = True
+        except RuntimeError:
+            on_loop = False
+        with cls._lock:
+            cls._stats["sync_calls"] += 1
+            if on_loop:
+                cls._stats["sync_calls_on_loop"] += 1
+        ctx = contextvars.copy_context()
+        future = cls.executor().submit(ctx.run, cls._tracked, fn, *args, **kwargs)
+        return future.result()
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        with cls._lock:
+            return {**cls._stats, "max_workers": cls.max_workers}
+
+    @classmethod
+    def _tracked(cls, fn, *args, **kwargs):
+        with cls._lock:
+            cls._stats["submitted"] += 1
+            cls._stats["in_flight"] += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with cls._lock:
+                cls._stats["in_flight"] -= 1
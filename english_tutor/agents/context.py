@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    """How much conversation history an agent sends to the LLM."""
+
+    # Upper bound for system prompt + summary + verbatim turns.
+    token_budget: int = 6000
+    # Most recent turns (user + agent message pairs) always sent verbatim.
+    keep_last_turns: int = 6
+    # Fold older turns into the summary once at least this many are pending.
+    fold_batch_turns: int = 4
+    # Target length of the rolling summary.
+    summary_max_tokens: int = 400
+
+
+SUMMARY_PROMPT = """You maintain a running summary of an English tutoring conversation.
+Update the summary with the new messages below. Keep the learner's level, goals,
+recurring mistakes, corrections already given and any open tasks. Stay under
+{max_words} words and return ONLY the updated summary.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}"""
+
+
+class ContextWindow:
+    """Select which history messages are sent verbatim and which get summarized.
+
+    `summarized_count` is the number of leading messages of the session already
+    folded into the rolling summary stored on `Session.context_summary`.
+    """
+
+    def __init__(self, policy: ContextPolicy):
+        self.policy = policy
+
+    def select(
+        self,
+        history: list[dict[str, str]],
+        summary: str = "",
+        summarized_count: int = 0,
+        reserved_tokens: int = 0,
+    ) -> list[dict[str, str]]:
+        """Return the messages to send verbatim, newest last, within the budget."""
+        pending = history[summarized_count:]
+        budget = self.policy.token_budget - reserved_tokens - estimate_tokens(summary)
+
+        selected: list[dict[str, str]] = []
+        used = 0
+        for msg in reversed(pending):
+            cost = estimate_tokens(msg["content_text"])
+            # Always keep the latest message, even if it alone exceeds the budget.
+            if selected and used + cost > budget:
+                break
+            selected.append(msg)
+            used += cost
+        selected.reverse()
+        return selected
+
+    def fold_range(
+        self, history: list[dict[str, str]], summarized_count: int
+    ) -> tuple[int, int] | None:
+        """Return the (start, end) slice that should be folded into the summary.
+
+        Folding only happens in batches so the extra LLM call is amortized
+        over several turns.
+        """
+        keep = self.policy.keep_last_turns * 2
+        end = len(history) - keep
+        if end - summarized_count < self.policy.fold_batch_turns * 2:
+            return None
+        return summarized_count, end
+
+    def summary_request(
+        self, summary: str, messages: list[dict[str, str]]
+    ) -> list[dict[str, str]]:
+        """Build the history for the summarization call."""
+        transcript = "\n".join(f"{m['sender']}: {m['content_text']}" for m in messages)
+        return [
+            {
+                "sender": "user",
+                "content_text": SUMMARY_PROMPT.format(
+                    max_words=int(self.policy.summary_max_tokens * 0.75),
+                    summary=summary or "(empty)",
+                    transcript=transcript,
+                ),
+            }
+        ]
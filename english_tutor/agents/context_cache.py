@@ -0,0 +1,272 @@
+import datetime
+import dotenv
+import hashlib
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from .context import estimate_tokens
+
+
+dotenv.load_dotenv()
+
+# (agent, prompt version, curriculum level, model)
+CacheKey = tuple[str, str, int | None, str]
+
+
+@dataclass
+class CacheEntry:
+    """A system prompt prefix registered as provider-side cached content."""
+
+    name: str
+    model: str
+    content_hash: str
+    token_count: int
+    expires_at: float
+
+
+class CacheBackend:
+    """Creates, refreshes and deletes cached content on the provider side."""
+
+    def create(
+        self, model: str, system_instruction: str, ttl_seconds: int
+    ) -> tuple[str, int]:
+        """Register `system_instruction` and return (cache name, token count)."""
+        raise NotImplementedError
+
+    def refresh(self, name: str, ttl_seconds: int):
+        raise NotImplementedError
+
+    def delete(self, name: str):
+        raise NotImplementedError
+
+
+class GeminiCacheBackend(CacheBackend):
+    """Gemini explicit context caching via the google.generativeai SDK."""
+
+    def create(
+        self, model: str, system_instruction: str, ttl_seconds: int
+    ) -> tuple[str, int]:
+        from google.generativeai import caching
+
+        cached = caching.CachedContent.create(
+            model=model if model.startswith("models/") else f"models/{model}",
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+        return cached.name, cached.usage_metadata.total_token_count
+
+    def refresh(self, name: str, ttl_seconds: int):
+        from google.generativeai import caching
+
+        caching.CachedContent.get(name).update(
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+
+    def delete(self, name: str):
+        from google.generativeai import caching
+
+        caching.CachedContent.get(name).delete()
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Local stand-in for offline runs; keeps cached prompts in a dict."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.contents: dict[str, str] = {}
+
+    def create(
+        self, model: str, system_instruction: str, ttl_seconds: int
+    ) -> tuple[str, int]:
+        name = f"cachedContents/local-{next(self._ids)}"
+        self.contents[name] = system_instruction
+        return name, estimate_tokens(system_instruction)
+
+    def refresh(self, name: str, ttl_seconds: int):
+        pass
+
+    def delete(self, name: str):
+        self.contents.pop(name, None)
+
+
+class ContextCache:
+    """Registry of cached system prompt prefixes.
+
+    Entries are keyed by (agent, prompt version, curriculum level, model). An
+    entry is reused while the rendered prompt hash matches, its TTL is extended
+    shortly before it expires, and `invalidate` drops entries when prompts or
+    curricula change. Prompts below `min_tokens` are not cacheable on Gemini
+    and skipped. Concurrent misses on one key share a single create, and a
+    failed create is not retried for `retry_seconds`.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 300,
+        min_tokens: int = 1024,
+        enabled: bool = True,
+        retry_seconds: int = 60,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.min_tokens = min_tokens
+        self.enabled = enabled
+        self.retry_seconds = retry_seconds
+        self._entries: dict[CacheKey, CacheEntry] = {}
+        # key -> (content hash, time before which a failed create is not retried)
+        self._failures: dict[CacheKey, tuple[str, float]] = {}
+        # Held while a key's entry is created, so concurrent misses wait for it.
+        self._creating: dict[CacheKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "skipped": 0,
+            "errors": 0,
+            "backoff": 0,
+        }
+
+    def lookup(
+        self,
+        agent_key: str,
+        prompt_version: str,
+        level: int | None,
+        model: str,
+        system_text: str,
+    ) -> CacheEntry | None:
+        """Return a live cache entry for this prompt, creating one on a miss."""
+        if not self.enabled or estimate_tokens(system_text) < self.min_tokens:
+            self._count("skipped")
+            return None
+
+        key = (agent_key, prompt_version, level, model)
+        content_hash = hashlib.sha1(system_text.encode()).hexdigest()
+        entry = self._hit(key, content_hash)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            creating = self._creating.setdefault(key, threading.Lock())
+        with creating:
+            # Another caller may have created it while this one waited.
+            entry = self._hit(key, content_hash)
+            if entry is not None:
+                return entry
+            now = time.time()
+            with self._lock:
+                stale = self._entries.get(key)
+                failure = self._failures.get(key)
+            if failure and failure[0] == content_hash and failure[1] > now:
+                self._count("backoff")
+                return None
+            if stale:
+                self._drop(key, stale)
+
+            self._count("misses")
+            try:
+                name, token_count = self.backend.create(
+                    model, system_text, self.ttl_seconds
+                )
+            except Exception as e:
+                print(f"Failed to create context cache for {agent_key}: {e}")
+                self._count("errors")
+                with self._lock:
+                    self._failures[key] = (content_hash, now + self.retry_seconds)
+                return None
+
+            entry = CacheEntry(
+                name=name,
+                model=model,
+                content_hash=content_hash,
+                token_count=token_count,
+                expires_at=now + self.ttl_seconds,
+            )
+            with self._lock:
+                self._entries[key] = entry
+                self._failures.pop(key, None)
+            return entry
+
+    def invalidate(self, agent_key: str | None = None, level: int | None = None):
+        """Drop entries for an agent, a curriculum level, or everything."""
+        with self._lock:
+            keys = [
+                key
+                for key in self._entries
+                if (agent_key is None or key[0] == agent_key)
+                and (level is None or key[2] == level)
+            ]
+            entries = [(key, self._entries[key]) for key in keys]
+            for key in list(self._failures):
+                if (agent_key is None or key[0] == agent_key) and (
+                    level is None or key[2] == level
+                ):
+                    del self._failures[key]
+        for key, entry in entries:
+            self._drop(key, entry)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+    def _hit(self, key: CacheKey, content_hash: str) -> CacheEntry | None:
+        """The live entry for `key` if it holds this prompt, refreshed if due."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry.content_hash != content_hash:
+            return None
+        if entry.expires_at <= now:
+            return None
+        if entry.expires_at - now < self.refresh_margin_seconds:
+            self._refresh(entry)
+        self._count("hits")
+        return entry
+
+    def _refresh(self, entry: CacheEntry):
+        try:
+            self.backend.refresh(entry.name, self.ttl_seconds)
+            entry.expires_at = time.time() + self.ttl_seconds
+        except Exception as e:
+            print(f"Failed to refresh context cache {entry.name}: {e}")
+            self._count("errors")
+
+    def _drop(self, key: CacheKey, entry: CacheEntry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        try:
+            self.backend.delete(entry.name)
+        except Exception:
+            # Expired entries are already gone on the provider side.
+            pass
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+
+def prompt_version(prompt_text: str) -> str:
+    """Stable version stamp for a prompt template."""
+    return hashlib.sha1(prompt_text.encode()).hexdigest()[:12]
+
+
+def _backend_from_env() -> CacheBackend:
+    default = "memory" if os.environ.get("LLM_PROVIDER") == "fake" else "gemini"
+    if os.environ.get("CONTEXT_CACHE_BACKEND", default) == "memory":
+        return InMemoryCacheBackend()
+    return GeminiCacheBackend()
+
+
+context_cache = ContextCache(
+    _backend_from_env(),
+    ttl_seconds=int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", "3600")),
+    min_tokens=int(os.environ.get("CONTEXT_CACHE_MIN_TOKENS", "1024")),
+    enabled=os.environ.get("CONTEXT_CACHE_ENABLED", "1") == "1",
+    retry_seconds=int(os.environ.get("CONTEXT_CACHE_RETRY_SECONDS", "60")),
+)
@@ -0,0 +1,615 @@
+"""Shared rate limiting for upstream LLM calls.
+
+Every BaseAgent request goes through `LLMGovernor`, which keeps one
+`RateLimiter` per model:
+
+- token buckets for requests per minute and tokens per minute,
+- a cap on concurrent requests,
+- a wait queue served round-robin across users, so one busy learner (or a
+  classroom of them) cannot starve the others.
+
+Retryable upstream errors (429 and 5xx) are retried with jittered exponential
+backoff; a 429 also empties the request bucket so queued calls back off too.
+Streams are bounded by first-token and inter-chunk timeouts, other calls by a
+request timeout; a timed-out call fails over to the agent's fallback model,
+and a slow first token can optionally be hedged with a second request.
+
+Limits come from LLM_RPM, LLM_TPM and LLM_MAX_CONCURRENCY and can be set per
+model with LLM_RATE_LIMITS, e.g. '{"gemini-3-flash-preview": {"rpm": 1000}}'.
+The user a call is queued under is taken from the `llm_user` context variable.
+"""
+
+import asyncio
+import collections
+import contextvars
+import dotenv
+import json
+import os
+import random
+import threading
+import time
+from concurrent import futures
+
+from .context import estimate_tokens
+from .providers import ProviderError
+from ..metrics import percentile, summarize
+from ..tracing import span
+
+
+dotenv.load_dotenv()
+
+llm_user: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_user", default="anonymous"
+)
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken; oversized amounts need a full bucket."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(min(amount, self.capacity) - self.level, 0) / self.rate
+
+    def take(self, amount: float):
+        # May go negative: the debt delays the next grants.
+        self.level -= amount
+
+    def drain(self):
+        self.level = min(self.level, 0)
+
+
+class _Waiter:
+    def __init__(self, tokens: int, loop: asyncio.AbstractEventLoop | None):
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RateLimiter:
+    """Admission control for one model.
+
+    Usable from both the event loop (`acquire`) and worker threads
+    (`acquire_sync`); every successful acquire must be paired with `release`.
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, max_concurrency: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        # user -> waiters; the first user is served next, then moved to the back
+        self._queues: collections.OrderedDict[str, collections.deque[_Waiter]] = (
+            collections.OrderedDict()
+        )
+        self._timer: threading.Timer | None = None
+        self._waits_ms: collections.deque[float] = collections.deque(maxlen=1000)
+        self._ttft_ms: collections.deque[float] = collections.deque(maxlen=500)
+        self._stats: dict[str, int] = {
+            "granted": 0,
+            "retries": 0,
+            "throttled": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "fallbacks": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    async def acquire(self, user: str, tokens: int) -> float:
+        """Wait for a slot; returns the seconds spent queued."""
+        waiter = _Waiter(tokens, asyncio.get_running_loop())
+        self._enqueue(user, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._abandon(user, waiter)
+            raise
+        return time.monotonic() - waiter.enqueued
+
+    def acquire_sync(self, user: str, tokens: int) -> float:
+        waiter = _Waiter(tokens, None)
+        self._enqueue(user, waiter)
+        waiter.event.wait()
+        return time.monotonic() - waiter.enqueued
+
+    def release(self, estimated_tokens: int, actual_tokens: int | None = None):
+        """Free the slot and true up the token bucket with the real usage."""
+        with self._lock:
+            self.in_flight -= 1
+            if actual_tokens is not None:
+                self.tokens.take(actual_tokens - estimated_tokens)
+            self._dispatch()
+
+    def throttle(self):
+        """Upstream said 429: stop granting until the request bucket refills."""
+        with self._lock:
+            self._stats["throttled"] += 1
+            self.requests.drain()
+
+    def count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def record_ttft(self, ms: float):
+        with self._lock:
+            self._ttft_ms.append(ms)
+
+    def ttft_samples(self) -> list[float]:
+        with self._lock:
+            return list(self._ttft_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = summarize(list(self._waits_ms))
+            ttft = summarize(list(self._ttft_ms))
+            return {
+                **self._stats,
+                "in_flight": self.in_flight,
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "users_waiting": len(self._queues),
+                "wait_p50_ms": waits["p50"],
+                "wait_p95_ms": waits["p95"],
+                "wait_max_ms": waits["max"],
+                "ttft_p95_ms": ttft["p95"],
+            }
+
+    def _enqueue(self, user: str, waiter: _Waiter):
+        with self._lock:
+            self._queues.setdefault(user, collections.deque()).append(waiter)
+            self._dispatch()
+
+    def _abandon(self, user: str, waiter: _Waiter):
+        with self._lock:
+            if not waiter.granted:
+                queue = self._queues.get(user)
+                if queue and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._queues[user]
+                return
+        # Granted while being cancelled: hand the slot back.
+        self.release(waiter.tokens)
+
+    def _dispatch(self):
+        """Grant queued requests round-robin by user. Caller holds the lock."""
+        while self._queues and self.in_flight < self.max_concurrency:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            now = time.monotonic()
+            wait = max(
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(waiter.tokens, now),
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+
+            queue.popleft()
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self.in_flight += 1
+            self._stats["granted"] += 1
+            self._waits_ms.append((now - waiter.enqueued) * 1000)
+            waiter.grant()
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            return
+
+        def fire():
+            with self._lock:
+                self._timer = None
+                self._dispatch()
+
+        self._timer = threading.Timer(delay, fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+def status_code(error: BaseException) -> int | None:
+    """HTTP status of an upstream error, looking through wrapped causes."""
+    while error is not None:
+        for attr in ("status_code", "code"):
+            value = getattr(error, attr, None)
+            if isinstance(value, int):
+                return value
+        error = error.__cause__
+    return None
+
+
+def retryable(error: BaseException) -> bool:
+    status = status_code(error)
+    return status == 429 or (status or 0) >= 500
+
+
+class UpstreamTimeout(ProviderError):
+    """The provider did not connect, start or keep streaming in time."""
+
+    def __init__(self, model: str, phase: str, seconds: float):
+        super().__init__(f"{model} {phase} timeout after {seconds:.1f}s", 504)
+        self.phase = phase
+
+
+class _Stream:
+    """One upstream stream attempt holding a limiter slot."""
+
+    def __init__(self, llm, limiter: RateLimiter, messages: list, options: dict):
+        self.llm = llm
+        self.limiter = limiter
+        self.messages = messages
+        self.options = options
+        self.estimate = LLMGovernor.estimate(messages)
+        self.iterator = None
+        self.actual: int | None = None
+        self.acquired = False
+        self.exhausted = False
+        self.closed = False
+
+    async def open(self, attempt: int):
+        await LLMGovernor._acquire(self.limiter, self.estimate, attempt)
+        self.acquired = True
+        self.started = time.monotonic()
+        self.iterator = self.llm.astream(self.messages, **self.options).__aiter__()
+
+    async def next(self, timeout: float, phase: str = "inter-chunk"):
+        """Next chunk; raises StopAsyncIteration at the end, UpstreamTimeout if late."""
+        try:
+            chunk = await asyncio.wait_for(self.iterator.__anext__(), timeout)
+        except asyncio.TimeoutError:
+            self.limiter.count("timeouts")
+            raise UpstreamTimeout(self.limiter.model, phase, timeout) from None
+        except StopAsyncIteration:
+            self.exhausted = True
+            raise
+        self.actual = _total_tokens(chunk) or self.actual
+        return chunk
+
+    async def first(self, first_token_timeout: float) -> list:
+        """Chunks up to and including the first one carrying text.
+
+        The whole wait, including connecting and any empty leading chunks, is
+        bounded by `first_token_timeout` from the start of the request.
+        """
+        chunks = []
+        try:
+            while not chunks or not chunks[-1].content:
+                remaining = first_token_timeout - (time.monotonic() - self.started)
+                chunks.append(await self.next(max(remaining, 0.001), "first-token"))
+        except StopAsyncIteration:
+            pass
+        self.limiter.record_ttft((time.monotonic() - self.started) * 1000)
+        return chunks
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.iterator is not None and not self.exhausted:
+            try:
+                await self.iterator.aclose()
+            except Exception:
+                pass
+        if self.acquired:
+            self.limiter.release(self.estimate, self.actual)
+
+
+class LLMGovernor:
+    """Routes provider calls through the per-model RateLimiter.
+
+    Besides admission control it bounds tail latency: streams must produce a
+    first token and keep producing chunks within configured timeouts, other
+    calls must finish within a request timeout, a slow first token can be
+    hedged with a second request, and a call that times out (or exhausts its
+    retries) fails over to the fallback request passed by the agent.
+    """
+
+    _lock = threading.Lock()
+    _limiters: dict[str, RateLimiter] = {}
+    rpm = float(os.environ.get("LLM_RPM", "1000"))
+    tpm = float(os.environ.get("LLM_TPM", "1000000"))
+    max_concurrency = int(os.environ.get("LLM_MAX_CONCURRENCY", "32"))
+    overrides: dict[str, dict] = json.loads(os.environ.get("LLM_RATE_LIMITS", "{}"))
+    max_retries = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+    retry_base_seconds = float(os.environ.get("LLM_RETRY_BASE_MS", "500")) / 1000
+    retry_max_seconds = float(os.environ.get("LLM_RETRY_MAX_MS", "8000")) / 1000
+    # Output allowance reserved up front; trued up from usage afterwards.
+    expected_output_tokens = int(os.environ.get("LLM_EXPECTED_OUTPUT_TOKENS", "512"))
+
+    first_token_timeout = float(os.environ.get("LLM_FIRST_TOKEN_TIMEOUT_S", "20"))
+    inter_chunk_timeout = float(os.environ.get("LLM_INTER_CHUNK_TIMEOUT_S", "15"))
+    # Whole-request bound for the non-streaming calls.
+    request_timeout = float(os.environ.get("LLM_REQUEST_TIMEOUT_S", "60"))
+    hedge_enabled = os.environ.get("LLM_HEDGE_ENABLED", "0") == "1"
+    # Used until enough first-token samples exist to take their p95.
+    hedge_delay_seconds = float(os.environ.get("LLM_HEDGE_DELAY_MS", "2000")) / 1000
+    hedge_min_samples = 20
+    # Runs blocking calls so `invoke` can stop waiting for them; the limiter
+    # already caps how many are in flight per model.
+    _executor: futures.ThreadPoolExecutor | None = None
+
+    @classmethod
+    def limiter(cls, model: str) -> RateLimiter:
+        with cls._lock:
+            limiter = cls._limiters.get(model)
+            if limiter is None:
+                limits = cls.overrides.get(model, {})
+                limiter = RateLimiter(
+                    model,
+                    rpm=float(limits.get("rpm", cls.rpm)),
+                    tpm=float(limits.get("tpm", cls.tpm)),
+                    max_concurrency=int(
+                        limits.get("concurrency", cls.max_concurrency)
+                    ),
+                )
+                cls._limiters[model] = limiter
+            return limiter
+
+    @classmethod
+    def estimate(cls, messages: list) -> int:
+        prompt = "".join(str(m.content) for m in messages)
+        return estimate_tokens(prompt) + cls.expected_output_tokens
+
+    @classmethod
+    def backoff(cls, attempt: int) -> float:
+        """Full-jitter exponential backoff for retry `attempt` (0-based)."""
+        return random.uniform(
+            0, min(cls.retry_max_seconds, cls.retry_base_seconds * 2**attempt)
+        )
+
+    @classmethod
+    def hedge_delay(cls, limiter: RateLimiter) -> float:
+        """Seconds to wait for a first token before hedging: the observed p95."""
+        samples = limiter.ttft_samples()
+        if len(samples) < cls.hedge_min_samples:
+            return cls.hedge_delay_seconds
+        return percentile(samples, 95) / 1000
+
+    @classmethod
+    def next_step(
+        cls, limiter: RateLimiter, error: Exception, attempt: int, can_fail_over: bool
+    ) -> str:
+        """"retry" the same model, "fallback" to the next one, or "raise"."""
+        if status_code(error) == 429:
+            limiter.throttle()
+        timed_out = isinstance(error, UpstreamTimeout)
+        if retryable(error) and attempt < cls.max_retries:
+            # A stalled model is unlikely to recover within this turn.
+            if not (timed_out and can_fail_over):
+                limiter.count("retries")
+                return "retry"
+        if can_fail_over and (timed_out or retryable(error)):
+            limiter.count("fallbacks")
+            return "fallback"
+        limiter.count("failures")
+        return "raise"
+
+    @classmethod
+    async def ainvoke(cls, llm, model: str, messages: list, fallback=None, **options):
+        """Invoke with retries, a request timeout and an optional fallback.
+
+        `fallback` is a complete `(llm, model, messages, options)` request,
+        tried once the primary times out or runs out of retries.
+        """
+        targets = [(llm, model, messages, options)] + ([fallback] if fallback else [])
+        attempt = 0
+        while True:
+            llm, model, messages, options = targets[0]
+            limiter = cls.limiter(model)
+            estimate = cls.estimate(messages)
+            await cls._acquire(limiter, estimate, attempt)
+            response = None
+            try:
+                response = await asyncio.wait_for(
+                    llm.ainvoke(messages, **options), cls.request_timeout
+                )
+                return response
+            except asyncio.TimeoutError:
+                limiter.count("timeouts")
+                error = UpstreamTimeout(model, "request", cls.request_timeout)
+            except Exception as e:
+                error = e
+            finally:
+                limiter.release(estimate, _total_tokens(response))
+
+            step = cls.next_step(limiter, error, attempt, len(targets) > 1)
+            if step == "raise":
+                raise error
+            if step == "fallback":
+                targets.pop(0)
+                attempt = 0
+                continue
+            await asyncio.sleep(cls.backoff(attempt))
+            attempt += 1
+
+    @classmethod
+    def invoke(cls, llm, model: str, messages: list, fallback=None, **options):
+        """Blocking variant of `ainvoke` for BlockingPool threads.
+
+        Same retries, request timeout and fallback. A timed-out call cannot be
+        cancelled, so it is left to finish on its worker thread, which frees
+        its limiter slot when it returns.
+        """
+        targets = [(llm, model, messages, options)] + ([fallback] if fallback else [])
+        attempt = 0
+        while True:
+            llm, model, messages, options = targets[0]
+            limiter = cls.limiter(model)
+            estimate = cls.estimate(messages)
+            limiter.acquire_sync(llm_user.get(), estimate)
+            future = cls.executor().submit(
+                contextvars.copy_context().run, llm.invoke, messages, **options
+            )
+            future.add_done_callback(_releaser(limiter, estimate))
+            if futures.wait([future], cls.request_timeout).done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+            else:
+                limiter.count("timeouts")
+                error = UpstreamTimeout(model, "request", cls.request_timeout)
+
+            step = cls.next_step(limiter, error, attempt, len(targets) > 1)
+            if step == "raise":
+                raise error
+            if step == "fallback":
+                targets.pop(0)
+                attempt = 0
+                continue
+            time.sleep(cls.backoff(attempt))
+            attempt += 1
+
+    @classmethod
+    def executor(cls) -> futures.ThreadPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = futures.ThreadPoolExecutor(
+                    max_workers=cls.max_concurrency, thread_name_prefix="llm-invoke"
+                )
+            return cls._executor
+
+    @classmethod
+    async def astream(cls, llm, model: str, messages: list, fallback=None, **options):
+        """Stream chunks under per-phase timeouts, hedging and fallback.
+
+        Failures are retried or failed over only until the first text chunk
+        has been yielded; after that an error or stall ends the stream.
+        `fallback` is a complete `(llm, model, messages, options)` request.
+        """
+        targets = [(llm, model, messages, options)] + ([fallback] if fallback else [])
+        attempt = 0
+        while True:
+            llm, model, messages, options = targets[0]
+            limiter = cls.limiter(model)
+            try:
+                stream, chunks = await cls._open_stream(
+                    llm, limiter, messages, options, attempt
+                )
+            except Exception as e:
+                step = cls.next_step(limiter, e, attempt, len(targets) > 1)
+                if step == "raise":
+                    raise
+                if step == "fallback":
+                    targets.pop(0)
+                    attempt = 0
+                    continue
+                await asyncio.sleep(cls.backoff(attempt))
+                attempt += 1
+                continue
+
+            try:
+                for chunk in chunks:
+                    yield chunk
+                while not stream.exhausted:
+                    try:
+                        chunk = await stream.next(cls.inter_chunk_timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            finally:
+                await stream.close()
+            return
+
+    @classmethod
+    def stats(cls) -> dict[str, dict]:
+        with cls._lock:
+            limiters = dict(cls._limiters)
+        return {model: limiter.stats() for model, limiter in limiters.items()}
+
+    @classmethod
+    async def _acquire(cls, limiter: RateLimiter, estimate: int, attempt: int):
+        with span("llm.queue", model=limiter.model, attempt=attempt) as queue_span:
+            waited = await limiter.acquire(llm_user.get(), estimate)
+            queue_span.set(wait_ms=round(waited * 1000, 1))
+
+    @classmethod
+    async def _open_stream(
+        cls, llm, limiter: RateLimiter, messages: list, options: dict, attempt: int
+    ) -> tuple[_Stream, list]:
+        """Start a stream and read to its first text chunk, hedging if enabled."""
+
+        async def start() -> tuple[_Stream, list]:
+            stream = _Stream(llm, limiter, messages, options)
+            try:
+                await stream.open(attempt)
+                return stream, await stream.first(cls.first_token_timeout)
+            except BaseException:
+                await stream.close()
+                raise
+
+        if not cls.hedge_enabled:
+            return await start()
+
+        primary = asyncio.create_task(start())
+        done, _ = await asyncio.wait({primary}, timeout=cls.hedge_delay(limiter))
+        if done:
+            return primary.result()
+
+        limiter.count("hedges")
+        hedge = asyncio.create_task(start())
+        pending = {primary, hedge}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                winners = [t for t in done if t.exception() is None]
+                if winners:
+                    for extra in winners[1:]:
+                        await extra.result()[0].close()
+                    if winners[0] is hedge:
+                        limiter.count("hedge_wins")
+                    return winners[0].result()
+                error = error or next(iter(done)).exception()
+            raise error
+        finally:
+            # Cancel the loser; its start() closes the stream and frees the slot.
+            for task in pending:
+                task.cancel()
+
+
+def _releaser(limiter: RateLimiter, estimate: int):
+    """Done-callback freeing the limiter slot of a blocking call."""
+
+    def release(future):
+        failed = future.cancelled() or future.exception() is not None
+        limiter.release(estimate, None if failed else _total_tokens(future.result()))
+
+    return release
+
+
+def _total_tokens(message) -> int | None:
+    usage = getattr(message, "usage_metadata", None)
+    if isinstance(usage, dict) and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return None
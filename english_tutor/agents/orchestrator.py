@@ -6,38 +6,46 @@ from .base import (
     PlacementAgent,
     ProgressAgent,
 )
+from .registry import AgentRegistry
 from ..models.user import Session, User
 from ..models.evaluation import Message
 import reflex as rx
 
 
 class Orchestrator:
-    def __init__(self):
-        self.agents = {
-            "onboarding": CounselorAgent(),
-            "evaluation": EvaluatorAgent(),
-            "tutoring": TutorAgent(),
-            "planning": PlannerAgent(),
-            "placement": PlacementAgent(),
-            "progress_test": ProgressAgent(),
-        }
+    # Agents are built on first use and shared process-wide via AgentRegistry.
+    AGENT_CLASSES = {
+        "onboarding": CounselorAgent,
+        "evaluation": EvaluatorAgent,
+        "tutoring": TutorAgent,
+        "planning": PlannerAgent,
+        "placement": PlacementAgent,
+        "progress_test": ProgressAgent,
+    }
+
+    def get_agent(self, key: str):
+        return AgentRegistry.get(key, self.AGENT_CLASSES[key])
 
     def get_agent_for_session(self, session: Session):
         if session.session_type == "onboarding":
-            return self.agents["onboarding"]
+            return self.get_agent("onboarding")
         elif session.session_type == "evaluation":
             # Backward compatibility or generic eval
-            return self.agents["evaluation"]
+            return self.get_agent("evaluation")
         elif session.session_type == "placement":
-            return self.agents["placement"]
+            return self.get_agent("placement")
         elif session.session_type == "progress_test":
-            return self.agents["progress_test"]
+            return self.get_agent("progress_test")
         elif session.session_type == "tutoring":
-            return self.agents["tutoring"]
+            return self.get_agent("tutoring")
         elif session.session_type == "planning":
-            return self.agents["planning"]
-        return self.agents["onboarding"]
+            return self.get_agent("planning")
+        return self.get_agent("onboarding")
 
     def process_message(self, session_id: int, user_id: int, text: str):
         # This will be called from the Reflex state
         pass
+
+
+# Shared instance used by the Reflex states; cheap because agents live in the registry.
+orchestrator = Orchestrator()
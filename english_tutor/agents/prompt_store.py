@@ -0,0 +1,163 @@
+import collections
+import os
+import threading
+import time
+
+from sqlmodel import select
+
+from .context_cache import prompt_version
+from .registry import AgentRegistry
+from ..models.content import AgentPrompt
+from ..db import Database
+
+
+def active_prompt_query(agent_key: str):
+    """The agent's active prompt, newest version first."""
+    return (
+        select(AgentPrompt)
+        .where(AgentPrompt.agent_name == agent_key)
+        .where(AgentPrompt.is_active == True)
+        .order_by(AgentPrompt.version.desc())
+    )
+
+
+class PromptStore:
+    """In-process cache of the active AgentPrompt per agent.
+
+    The active prompt is read from the DB once and served from memory until
+    `invalidate` is called (AdminState does so on save/restore) or the entry is
+    older than PROMPT_CACHE_TTL_SECONDS, which bounds staleness for other
+    backend processes. Agents without a DB prompt fall back to their prompt file.
+
+    Each entry carries a version stamp ("db-v3" or "file-<hash>") that also
+    keys the memoized `system_prompt.format(**kwargs)` renders. Async agent
+    paths use `aget`, which loads a miss on the async session.
+    """
+
+    _lock = threading.Lock()
+    # agent_key -> (version stamp, prompt text, loaded at)
+    _prompts: dict[str, tuple[str, str, float]] = {}
+    _renders: collections.OrderedDict[tuple, str] = collections.OrderedDict()
+    _generation = 0
+    ttl_seconds = float(os.environ.get("PROMPT_CACHE_TTL_SECONDS", "60"))
+    max_renders = 512
+    _stats: dict[str, int] = {
+        "prompt_hits": 0,
+        "prompt_loads": 0,
+        "render_hits": 0,
+        "render_misses": 0,
+        "invalidations": 0,
+    }
+
+    @classmethod
+    def get(cls, agent_key: str, prompt_file: str) -> tuple[str, str]:
+        """Return (version stamp, prompt text) for the agent's active prompt."""
+        entry, generation = cls._cached(agent_key)
+        if entry:
+            return entry
+        prompt = cls._load(agent_key)
+        return cls._store(agent_key, prompt_file, prompt, generation)
+
+    @classmethod
+    async def aget(cls, agent_key: str, prompt_file: str) -> tuple[str, str]:
+        """`get` for coroutines: a miss is loaded without blocking the loop."""
+        entry, generation = cls._cached(agent_key)
+        if entry:
+            return entry
+        prompt = await cls._aload(agent_key)
+        return cls._store(agent_key, prompt_file, prompt, generation)
+
+    @classmethod
+    def render(cls, agent_key: str, version: str, template: str, **kwargs) -> str:
+        """Memoized `template.format(**kwargs)` keyed by prompt version."""
+        key = (agent_key, version, tuple(sorted(kwargs.items())))
+        with cls._lock:
+            text = cls._renders.get(key)
+            if text is not None:
+                cls._renders.move_to_end(key)
+                cls._stats["render_hits"] += 1
+                return text
+
+        text = template.format(**kwargs)
+        with cls._lock:
+            cls._renders[key] = text
+            if len(cls._renders) > cls.max_renders:
+                cls._renders.popitem(last=False)
+            cls._stats["render_misses"] += 1
+        return text
+
+    @classmethod
+    def invalidate(cls, agent_key: str | None = None):
+        """Forget the cached prompt (and its renders) for one agent or all."""
+        with cls._lock:
+            cls._generation += 1
+            cls._stats["invalidations"] += 1
+            if agent_key is None:
+                cls._prompts.clear()
+                cls._renders.clear()
+                return
+            cls._prompts.pop(agent_key, None)
+            for key in [k for k in cls._renders if k[0] == agent_key]:
+                del cls._renders[key]
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        with cls._lock:
+            return {
+                **cls._stats,
+                "prompts": len(cls._prompts),
+                "renders": len(cls._renders),
+            }
+
+    @classmethod
+    def _cached(cls, agent_key: str) -> tuple[tuple[str, str] | None, int]:
+        with cls._lock:
+            entry = cls._prompts.get(agent_key)
+            generation = cls._generation
+        if entry and time.time() - entry[2] < cls.ttl_seconds:
+            cls._count("prompt_hits")
+            return (entry[0], entry[1]), generation
+        return None, generation
+
+    @classmethod
+    def _store(
+        cls,
+        agent_key: str,
+        prompt_file: str,
+        prompt: AgentPrompt | None,
+        generation: int,
+    ) -> tuple[str, str]:
+        if prompt:
+            version, text = f"db-v{prompt.version}", prompt.prompt_text
+        else:
+            text = AgentRegistry.prompt_text(prompt_file)
+            version = f"file-{prompt_version(text)}"
+        with cls._lock:
+            # Don't cache a value read before a concurrent invalidation.
+            if generation == cls._generation:
+                cls._prompts[agent_key] = (version, text, time.time())
+            cls._stats["prompt_loads"] += 1
+        return version, text
+
+    @classmethod
+    def _load(cls, agent_key: str) -> AgentPrompt | None:
+        try:
+            with Database.session() as session:
+                return session.exec(active_prompt_query(agent_key)).first()
+        except Exception as e:
+            print(f"Failed to load prompt for {agent_key} from DB: {e}")
+            return None
+
+    @classmethod
+    async def _aload(cls, agent_key: str) -> AgentPrompt | None:
+        try:
+            async with Database.async_session() as session:
+                return (await session.exec(active_prompt_query(agent_key))).first()
+        except Exception as e:
+            print(f"Failed to load prompt for {agent_key} from DB: {e}")
+            return None
+
+    @classmethod
+    def _count(cls, stat: str):
+        with cls._lock:
+            cls._stats[stat] += 1
@@ -0,0 +1,173 @@
+import asyncio
+import dotenv
+import os
+import random
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from .context import estimate_tokens
+
+
+dotenv.load_dotenv()
+
+# Which backend BaseAgent talks to: "gemini" (default) or "fake" for offline runs.
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini")
+
+
+class ProviderError(Exception):
+    """Upstream failure carrying an HTTP-like status code (429, 503, ...)."""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+FAKE_VOCABULARY = (
+    "Great job! Let's practice this sentence together. Try to use the past tense "
+    "when you describe what happened yesterday. Remember that we say 'I went' "
+    "instead of 'I goed'. Could you tell me more about your weekend plans? "
+    "Your vocabulary is improving and your sentences are clear."
+).split()
+
+
+class FakeChatModel:
+    """Deterministic local stand-in for a chat model.
+
+    Mirrors the subset of the LangChain chat model API BaseAgent uses
+    (`invoke`, `ainvoke`, `astream`) and returns LangChain message objects with
+    usage metadata, so the whole pipeline runs without network access. The
+    same input always produces the same reply.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        ttft_ms: float = 300,
+        tokens_per_sec: float = 50,
+        failure_rate: float = 0.0,
+        reply_tokens: int = 60,
+        seed: int = 0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 5000,
+    ):
+        self.model = model
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.failure_rate = failure_rate
+        self.reply_tokens = reply_tokens
+        self.seed = seed
+        # Fraction of calls whose first token is delayed by slow_ms (tail latency).
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls, model: str) -> "FakeChatModel":
+        return cls(
+            model,
+            ttft_ms=float(os.environ.get("FAKE_LLM_TTFT_MS", "300")),
+            tokens_per_sec=float(os.environ.get("FAKE_LLM_TOKENS_PER_SEC", "50")),
+            failure_rate=float(os.environ.get("FAKE_LLM_FAILURE_RATE", "0")),
+            reply_tokens=int(os.environ.get("FAKE_LLM_REPLY_TOKENS", "60")),
+            seed=int(os.environ.get("FAKE_LLM_SEED", "0")),
+            slow_rate=float(os.environ.get("FAKE_LLM_SLOW_RATE", "0")),
+            slow_ms=float(os.environ.get("FAKE_LLM_SLOW_MS", "5000")),
+        )
+
+    def _plan(self, messages: list) -> tuple[random.Random, list[str], int]:
+        """Reply tokens and prompt size for a request, derived from its content."""
+        self.calls += 1
+        prompt_text = "\n".join(str(m.content) for m in messages)
+        last_user = next(
+            (str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)),
+            "",
+        )
+        rng = random.Random(f"{self.seed}:{last_user}")
+        words = [rng.choice(FAKE_VOCABULARY) for _ in range(self.reply_tokens)]
+        tokens = [w if i == 0 else f" {w}" for i, w in enumerate(words)]
+        return rng, tokens, estimate_tokens(prompt_text)
+
+    def _ttft(self) -> float:
+        """Seconds to the first token; slow calls are picked per call, not per input."""
+        roll = random.Random(f"{self.seed}:call:{self.calls}").random()
+        if roll < self.slow_rate:
+            return (self.ttft_ms + self.slow_ms) / 1000
+        return self.ttft_ms / 1000
+
+    def _check_failure(self, rng: random.Random):
+        if self.failure_rate and rng.random() < self.failure_rate:
+            status = rng.choice([429, 500, 503])
+            raise ProviderError(f"Fake provider injected HTTP {status}", status)
+
+    def _usage(self, prompt_tokens: int, completion_tokens: int, options: dict) -> dict:
+        cached = prompt_tokens // 2 if options.get("cached_content") else 0
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "input_token_details": {"cache_read": cached},
+        }
+
+    def invoke(self, messages: list, **options) -> AIMessage:
+        rng, tokens, prompt_tokens = self._plan(messages)
+        time.sleep(self._ttft() + len(tokens) / self.tokens_per_sec)
+        self._check_failure(rng)
+        return AIMessage(
+            content="".join(tokens),
+            usage_metadata=self._usage(prompt_tokens, len(tokens), options),
+            response_metadata={"model_name": self.model},
+        )
+
+    async def ainvoke(self, messages: list, **options) -> AIMessage:
+        rng, tokens, prompt_tokens = self._plan(messages)
+        await asyncio.sleep(self._ttft() + len(tokens) / self.tokens_per_sec)
+        self._check_failure(rng)
+        return AIMessage(
+            content="".join(tokens),
+            usage_metadata=self._usage(prompt_tokens, len(tokens), options),
+            response_metadata={"model_name": self.model},
+        )
+
+    async def astream(self, messages: list, **options):
+        rng, tokens, prompt_tokens = self._plan(messages)
+        await asyncio.sleep(self._ttft())
+        self._check_failure(rng)
+        for token in tokens:
+            yield AIMessageChunk(content=token)
+            await asyncio.sleep(1 / self.tokens_per_sec)
+        yield AIMessageChunk(
+            content="",
+            usage_metadata=self._usage(prompt_tokens, len(tokens), options),
+            response_metadata={"model_name": self.model},
+        )
+
+
+def create_chat_model(
+    model: str,
+    provider: str | None = None,
+    max_output_tokens: int | None = None,
+    temperature: float | None = None,
+):
+    """Build the chat model client for `model` on the configured provider.
+
+    Generation settings left as None use the provider defaults.
+    """
+    provider = provider or LLM_PROVIDER
+    if provider == "fake":
+        llm = FakeChatModel.from_env(model)
+        if max_output_tokens:
+            llm.reply_tokens = min(llm.reply_tokens, max_output_tokens)
+        return llm
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        params = {}
+        if max_output_tokens is not None:
+            params["max_output_tokens"] = max_output_tokens
+        if temperature is not None:
+            params["temperature"] = temperature
+        # Falls back to GOOGLE_API_KEY inside langchain when unset.
+        api_key = os.environ.get("GEMINI_API_KEY")
+        return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, **params)
+    raise ValueError(f"Unknown LLM provider: {provider}")
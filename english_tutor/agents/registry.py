@@ -0,0 +1,100 @@
+import threading
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class AgentRegistry:
+    """Process-wide cache of agents, prompt files and LLM clients.
+
+    Agents are stateless between calls, so one instance per session type can be
+    shared by every Reflex event handler. Construction happens lazily on first
+    use and is guarded by a lock so concurrent handlers never build twice.
+    """
+
+    _lock = threading.RLock()
+    _agents: dict[str, object] = {}
+    _prompts: dict[str, str] = {}
+    _llms: dict[str, object] = {}
+    _stats: dict[str, int] = {
+        "agent_constructions": 0,
+        "agent_constructions_avoided": 0,
+        "prompt_file_reads": 0,
+        "prompt_file_reads_avoided": 0,
+        "llm_clients_created": 0,
+        "llm_clients_reused": 0,
+    }
+
+    @classmethod
+    def get(cls, key: str, factory: Callable[[], T]) -> T:
+        """Return the shared agent for `key`, building it with `factory` once."""
+        agent = cls._agents.get(key)
+        if agent is not None:
+            cls._bump("agent_constructions_avoided")
+            return agent  # type: ignore[return-value]
+
+        with cls._lock:
+            agent = cls._agents.get(key)
+            if agent is None:
+                agent = factory()
+                cls._agents[key] = agent
+                cls._stats["agent_constructions"] += 1
+            else:
+                cls._stats["agent_constructions_avoided"] += 1
+        return agent  # type: ignore[return-value]
+
+    @classmethod
+    def prompt_text(cls, prompt_file: str) -> str:
+        """Read a prompt file once and serve it from memory afterwards."""
+        text = cls._prompts.get(prompt_file)
+        if text is not None:
+            cls._bump("prompt_file_reads_avoided")
+            return text
+
+        with cls._lock:
+            text = cls._prompts.get(prompt_file)
+            if text is None:
+                with open(prompt_file, "r") as f:
+                    text = f.read()
+                cls._prompts[prompt_file] = text
+                cls._stats["prompt_file_reads"] += 1
+            else:
+                cls._stats["prompt_file_reads_avoided"] += 1
+        return text
+
+    @classmethod
+    def llm(cls, key: str, factory: Callable[[], T]) -> T:
+        """Return a warm LLM client for `key` (usually the model name)."""
+        client = cls._llms.get(key)
+        if client is not None:
+            cls._bump("llm_clients_reused")
+            return client  # type: ignore[return-value]
+
+        with cls._lock:
+            client = cls._llms.get(key)
+            if client is None:
+                client = factory()
+                cls._llms[key] = client
+                cls._stats["llm_clients_created"] += 1
+            else:
+                cls._stats["llm_clients_reused"] += 1
+        return client  # type: ignore[return-value]
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        """Snapshot of construction and reuse counters."""
+        with cls._lock:
+            return dict(cls._stats)
+
+    @classmethod
+    def clear(cls):
+        """Drop every cached agent, prompt and client (e.g. after prompt edits)."""
+        with cls._lock:
+            cls._agents.clear()
+            cls._prompts.clear()
+            cls._llms.clear()
+
+    @classmethod
+    def _bump(cls, counter: str):
+        with cls._lock:
+            cls._stats[counter] += 1
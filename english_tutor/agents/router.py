@@ -0,0 +1,115 @@
+import dotenv
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import yaml
+
+
+dotenv.load_dotenv()
+
+DEFAULT_ROUTES_FILE = os.path.join(os.path.dirname(__file__), "model_routes.yaml")
+
+
+@dataclass(frozen=True)
+class Route:
+    """Model and generation settings for one kind of LLM task."""
+
+    task: str
+    model: str
+    max_output_tokens: int | None = None
+    temperature: float | None = None
+    # Overrides LLM_FALLBACK_MODEL for this task; "" disables failover.
+    fallback: str | None = None
+
+
+class ModelRouter:
+    """Picks the model for each task from the routes file.
+
+    Tasks: chat (tutoring turns), placement (level scoring), title,
+    optimize (admin prompt optimizer) and summary (context folding). Tasks
+    missing from the file use its `default` route. The file
+    (MODEL_ROUTES_FILE, default english_tutor/agents/model_routes.yaml) is
+    re-read when it changes, so routes can be edited without a restart.
+    """
+
+    TASKS = ("chat", "placement", "title", "optimize", "summary")
+    DEFAULT_MODEL = "gemini-3-flash-preview"
+
+    _lock = threading.Lock()
+    _routes: dict[str, Route] = {}
+    _default: Route | None = None
+    _mtime: float | None = None
+    _checked_at = 0.0
+    path = os.environ.get("MODEL_ROUTES_FILE", DEFAULT_ROUTES_FILE)
+    # How often to stat the file for changes (seconds).
+    check_interval = 5.0
+
+    @classmethod
+    def route(cls, task: str) -> Route:
+        cls._maybe_reload()
+        with cls._lock:
+            route = cls._routes.get(task)
+            if route is None:
+                default = cls._default or Route("default", cls.DEFAULT_MODEL)
+                route = Route(
+                    task,
+                    default.model,
+                    default.max_output_tokens,
+                    default.temperature,
+                    default.fallback,
+                )
+            return route
+
+    @classmethod
+    def routes(cls) -> list[Route]:
+        return [cls.route(task) for task in cls.TASKS]
+
+    @classmethod
+    def reload(cls):
+        """Read the routes file; keeps the previous routes if it is invalid."""
+        try:
+            mtime = os.path.getmtime(cls.path)
+            with open(cls.path) as f:
+                config = yaml.safe_load(f) or {}
+            default = cls._parse("default", config.get("default") or {})
+            routes = {
+                task: cls._parse(task, {**(config.get("default") or {}), **spec})
+                for task, spec in (config.get("routes") or {}).items()
+            }
+        except Exception as e:
+            print(f"Failed to load model routes from {cls.path}: {e}")
+            with cls._lock:
+                cls._checked_at = time.time()
+            return
+        with cls._lock:
+            cls._default = default
+            cls._routes = routes
+            cls._mtime = mtime
+            cls._checked_at = time.time()
+
+    @classmethod
+    def _maybe_reload(cls):
+        now = time.time()
+        with cls._lock:
+            if now - cls._checked_at < cls.check_interval:
+                return
+            cls._checked_at = now
+            loaded_mtime = cls._mtime
+        try:
+            changed = os.path.getmtime(cls.path) != loaded_mtime
+        except OSError:
+            changed = False
+        if changed:
+            cls.reload()
+
+    @classmethod
+    def _parse(cls, task: str, spec: dict) -> Route:
+        return Route(
+            task=task,
+            model=spec.get("model", cls.DEFAULT_MODEL),
+            max_output_tokens=spec.get("max_output_tokens"),
+            temperature=spec.get("temperature"),
+            fallback=spec.get("fallback"),
+        )
@@ -0,0 +1,157 @@
+"""Event loop lag and throughput of handler queries, sync vs async sessions.
+
+Runs N concurrent tasks on one event loop, each repeating what a chat turn
+does against the database: load the sidebar page, load the latest message
+page and persist the turn. "sync" uses `Database.session()` inside the
+coroutines, as the handlers did before; "async" uses
+`Database.async_session()` and `apersist_turn`. LoopLagMonitor samples the
+loop while the tasks run.
+
+Usage:
+    python -m english_tutor.bench.db_concurrency --tasks 50 --ops 20 --output db.json
+"""
+
+import argparse
+import asyncio
+import time
+
+from .load_test import BENCH_USER_ID_BASE, USER_LINES, cleanup, create_session
+from ..metrics import summarize
+from .metrics import ProcessSampler, write_report
+from .persist_bench import USAGE
+
+PAGE_SIZE = 30
+
+
+def statements(session_id: int, user_id: int) -> list:
+    """The sidebar and latest-messages queries of ChatState, as built there."""
+    from sqlmodel import select
+
+    from ..models.evaluation import Message
+    from ..models.user import Session
+
+    return [
+        select(Session.id, Session.title, Session.session_type, Session.updated_at)
+        .where(Session.user_id == user_id)
+        .where(Session.is_deleted == False)
+        .order_by(Session.updated_at.desc(), Session.id.desc())
+        .limit(PAGE_SIZE + 1),
+        select(Message.id, Message.sender, Message.content_text, Message.created_at)
+        .where(Message.session_id == session_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(PAGE_SIZE + 1),
+    ]
+
+
+async def sync_op(session_id: int, user_id: int, turn: int):
+    from ..db import Database
+    from ..persistence import persist_turn
+
+    with Database.session() as db_session:
+        for stmt in statements(session_id, user_id):
+            db_session.exec(stmt).all()
+    user_text = USER_LINES[turn % len(USER_LINES)]
+    persist_turn(session_id, user_id, user_text, f"Reply {turn}", dict(USAGE))
+
+
+async def async_op(session_id: int, user_id: int, turn: int):
+    from ..db import Database
+    from ..persistence import apersist_turn
+
+    async with Database.async_session() as db_session:
+        for stmt in statements(session_id, user_id):
+            (await db_session.exec(stmt)).all()
+    user_text = USER_LINES[turn % len(USER_LINES)]
+    await apersist_turn(session_id, user_id, user_text, f"Reply {turn}", dict(USAGE))
+
+
+async def measure(op, session_ids: list[int], args: argparse.Namespace) -> dict:
+    from ..loop_monitor import LoopLagMonitor
+
+    latencies: list[float] = []
+
+    async def task(index: int):
+        session_id = session_ids[index]
+        user_id = BENCH_USER_ID_BASE + index
+        for turn in range(args.ops):
+            start = time.perf_counter()
+            await op(session_id, user_id, turn)
+            latencies.append((time.perf_counter() - start) * 1000)
+            # Yield like a handler between events, so lag is measurable.
+            await asyncio.sleep(0)
+
+    # Warm up connections and the price table outside the measurement.
+    await op(session_ids[0], BENCH_USER_ID_BASE, 0)
+
+    LoopLagMonitor.reset()
+    monitor = asyncio.create_task(LoopLagMonitor.run())
+    with ProcessSampler() as sampler:
+        await asyncio.gather(*[task(i) for i in range(args.tasks)])
+    monitor.cancel()
+
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": round(len(latencies) / sampler.wall_seconds, 2)
+        if sampler.wall_seconds
+        else 0.0,
+        "op_ms": summarize(latencies),
+        "loop_lag_ms": LoopLagMonitor.stats(),
+        "process": sampler.report(),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from ..db import Database
+
+    modes = {"sync": sync_op, "async": async_op}
+    report: dict = {"config": vars(args)}
+    session_ids = [
+        create_session(BENCH_USER_ID_BASE + i, "tutoring") for i in range(args.tasks)
+    ]
+    try:
+        for mode in args.modes:
+            report[mode] = await measure(modes[mode], session_ids, args)
+            report[mode]["pool"] = (
+                Database.async_stats() if mode == "async" else Database.stats()
+            )
+    finally:
+        if not args.keep_data:
+            cleanup(session_ids)
+        await Database.aclose()
+
+    if "sync" in report and "async" in report:
+        before, after = report["sync"], report["async"]
+        report["lag_p95_reduction_ms"] = round(
+            before["loop_lag_ms"]["p95"] - after["loop_lag_ms"]["p95"], 2
+        )
+        report["throughput_ratio"] = round(
+            after["ops_per_sec"] / max(before["ops_per_sec"], 0.01), 2
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=20, help="Turns per task.")
+    parser.add_argument(
+        "--modes", nargs="*", choices=["sync", "async"], default=["sync", "async"]
+    )
+    parser.add_argument(
+        "--keep-data", action="store_true", help="Keep benchmark rows afterwards."
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    from ..db_manager import DBManager
+
+    DBManager.start()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        DBManager.stop()
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
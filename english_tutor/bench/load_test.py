@@ -0,0 +1,285 @@
+"""Concurrent-learner load test for the chat pipeline.
+
+Simulates N learners spread across every session type, each holding a
+multi-turn conversation through `BaseAgent.stream_response` and
+`apersist_turn` against the PGlite database. The LLM is the local fake
+provider unless LLM_PROVIDER is set explicitly.
+
+Usage:
+    python -m english_tutor.bench.load_test --users 50 --turns 8 --output bench.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# Must be set before the agents module reads it.
+os.environ.setdefault("LLM_PROVIDER", "fake")
+
+from ..metrics import summarize  # noqa: E402
+from .metrics import ProcessSampler, write_report  # noqa: E402
+
+USER_LINES = [
+    "Hello, my name is Minji and I want to practice English.",
+    "Yesterday I goed to the market with my friend.",
+    "Can you explain when to use present perfect?",
+    "I am work at a software company since three years.",
+    "What is the difference between 'make' and 'do'?",
+    "My hobby are reading books and playing tennis.",
+    "Could you give me a short exercise about past tense?",
+    "I think I understand now, thank you for the explanation.",
+]
+
+# Superset of the format fields used by the prompt files.
+PROMPT_DEFAULTS = {
+    "level": 3,
+    "chapter_title": "Social Interactions",
+    "learning_goals": "Expressing likes and dislikes",
+    "common_pitfalls": "Overusing 'very'",
+    "curriculum_title": "Social Interactions",
+    "curriculum_description": "Simple conversations on familiar topics.",
+    "evaluation_summary": "Grammar is fair; vocabulary is limited.",
+}
+
+BENCH_USER_ID_BASE = 900_000
+
+
+class Results:
+    def __init__(self):
+        self.ttft_ms: list[float] = []
+        self.reply_ms: list[float] = []
+        self.persist_ms: list[float] = []
+        self.title_ms: list[float] = []
+        self.turns = 0
+        self.errors = 0
+        self.session_ids: list[int] = []
+
+
+def create_session(user_id: int, session_type: str) -> int:
+    from ..db import Database
+    from ..models.user import Session
+
+    with Database.session() as db_session:
+        session = Session(user_id=user_id, session_type=session_type)
+        db_session.add(session)
+        db_session.commit()
+        db_session.refresh(session)
+        return session.id
+
+
+def cleanup(session_ids: list[int]):
+    """Remove the rows written by the benchmark."""
+    from ..db import Database
+    from sqlmodel import delete
+    from ..models.evaluation import Message
+    from ..models.token_usage import TokenUsage, TokenUsageRollup, UserDailyCost
+    from ..models.user import Session
+
+    with Database.session() as db_session:
+        db_session.exec(
+            delete(TokenUsage).where(TokenUsage.session_id.in_(session_ids))
+        )
+        for totals in (UserDailyCost, TokenUsageRollup):
+            db_session.exec(
+                delete(totals).where(totals.user_id >= BENCH_USER_ID_BASE)
+            )
+        db_session.exec(delete(Message).where(Message.session_id.in_(session_ids)))
+        db_session.exec(delete(Session).where(Session.id.in_(session_ids)))
+        db_session.commit()
+
+
+async def learner(
+    index: int,
+    session_type: str,
+    args: argparse.Namespace,
+    results: Results,
+):
+    from ..agents.governor import llm_user
+    from ..agents.orchestrator import orchestrator
+    from ..persistence import apersist_turn
+
+    rng = random.Random(index)
+    await asyncio.sleep(rng.uniform(0, args.ramp_up_s))
+
+    user_id = BENCH_USER_ID_BASE + index
+    llm_user.set(str(user_id))
+    agent = orchestrator.get_agent(session_type)
+    session_id = 0
+    if not args.no_db:
+        session_id = create_session(user_id, session_type)
+        results.session_ids.append(session_id)
+
+    history: list[dict[str, str]] = []
+    for turn in range(args.turns):
+        user_text = USER_LINES[(index + turn) % len(USER_LINES)]
+        history.append({"sender": "user", "content_text": user_text})
+
+        start = time.perf_counter()
+        first_token_at = None
+        reply = ""
+        usage: dict = {}
+        try:
+            async for chunk_text, meta in agent.stream_response(
+                history, **PROMPT_DEFAULTS
+            ):
+                if chunk_text and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                reply += chunk_text
+                if meta:
+                    usage = meta
+        except Exception:
+            results.errors += 1
+            history.pop()
+            continue
+        done = time.perf_counter()
+
+        results.ttft_ms.append(((first_token_at or done) - start) * 1000)
+        results.reply_ms.append((done - start) * 1000)
+
+        if not args.no_db:
+            # Same async path as the Reflex handler.
+            persist_start = time.perf_counter()
+            await apersist_turn(session_id, user_id, user_text, reply, usage)
+            results.persist_ms.append((time.perf_counter() - persist_start) * 1000)
+
+        history.append({"sender": "agent", "content_text": reply})
+        results.turns += 1
+        await asyncio.sleep(rng.uniform(0, args.think_time_ms) / 1000)
+
+    if args.title_mode != "off" and history:
+        # What a session switch triggers; "sync" reproduces the old blocking
+        # call so the loop lag difference can be measured.
+        title_history = [{"sender": "user", "content_text": history[0]["content_text"]}]
+        title_start = time.perf_counter()
+        try:
+            if args.title_mode == "sync":
+                from langchain_core.messages import HumanMessage
+
+                first_line = title_history[0]["content_text"]
+                agent.llm.invoke([HumanMessage(content=first_line)])
+            else:
+                await agent.aget_response(title_history)
+            results.title_ms.append((time.perf_counter() - title_start) * 1000)
+        except Exception:
+            results.errors += 1
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from ..agents.orchestrator import Orchestrator
+    from ..agents.governor import LLMGovernor
+    from ..agents.registry import AgentRegistry
+    from ..db import Database
+    from ..loop_monitor import LoopLagMonitor
+
+    session_types = args.session_types or list(Orchestrator.AGENT_CLASSES)
+    results = Results()
+
+    LoopLagMonitor.reset()
+    monitor = asyncio.create_task(LoopLagMonitor.run())
+    with ProcessSampler() as sampler:
+        await asyncio.gather(*[
+            learner(i, session_types[i % len(session_types)], args, results)
+            for i in range(args.users)
+        ])
+    monitor.cancel()
+
+    write_behind = None
+    if args.write_behind:
+        from ..write_behind import WriteBehindQueue
+
+        # Drain before reporting (and before cleanup deletes the rows).
+        drain_start = time.perf_counter()
+        WriteBehindQueue.stop()
+        write_behind = {
+            **WriteBehindQueue.stats(),
+            "drain_ms": round((time.perf_counter() - drain_start) * 1000, 2),
+        }
+
+    report = {
+        "benchmark": "chat_load_test",
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "users": args.users,
+            "turns": args.turns,
+            "session_types": session_types,
+            "think_time_ms": args.think_time_ms,
+            "ramp_up_s": args.ramp_up_s,
+            "llm_provider": os.environ.get("LLM_PROVIDER"),
+            "persist": not args.no_db,
+            "title_mode": args.title_mode,
+            "write_behind": args.write_behind,
+        },
+        "turns": results.turns,
+        "errors": results.errors,
+        "throughput_turns_per_sec": round(results.turns / sampler.wall_seconds, 2)
+        if sampler.wall_seconds
+        else 0.0,
+        "ttft_ms": summarize(results.ttft_ms),
+        "reply_ms": summarize(results.reply_ms),
+        "persist_ms": summarize(results.persist_ms),
+        "title_ms": summarize(results.title_ms),
+        "loop_lag_ms": LoopLagMonitor.stats(),
+        "process": sampler.report(),
+        "agent_registry": AgentRegistry.stats(),
+        "rate_limits": LLMGovernor.stats(),
+        "write_behind": write_behind,
+    }
+
+    if not args.no_db and not args.keep_data and results.session_ids:
+        cleanup(results.session_ids)
+    # The async pool belongs to this loop; close it before asyncio.run returns.
+    await Database.aclose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument(
+        "--session-types",
+        nargs="*",
+        help="Session types to spread learners over (default: all).",
+    )
+    parser.add_argument("--think-time-ms", type=float, default=500)
+    parser.add_argument("--ramp-up-s", type=float, default=2.0)
+    parser.add_argument("--no-db", action="store_true", help="Skip persistence.")
+    parser.add_argument(
+        "--title-mode",
+        choices=["async", "sync", "off"],
+        default="async",
+        help="Generate a session title per learner with the async or blocking call.",
+    )
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Queue turns for batched writes instead of committing per turn.",
+    )
+    parser.add_argument(
+        "--keep-data", action="store_true", help="Keep benchmark rows afterwards."
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+    if args.write_behind:
+        from ..write_behind import WriteBehindQueue
+
+        WriteBehindQueue.enabled = True
+
+    if not args.no_db:
+        from ..db_manager import DBManager
+
+        DBManager.start()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if not args.no_db:
+            from ..db_manager import DBManager
+
+            DBManager.stop()
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
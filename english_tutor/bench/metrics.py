@@ -0,0 +1,57 @@
+import json
+import resource
+import time
+from pathlib import Path
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process, from /proc when available."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ProcessSampler:
+    """Measures CPU time and memory of this process over a benchmark run."""
+
+    def __enter__(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self._cpu_start = usage.ru_utime + usage.ru_stime
+        self._wall_start = time.perf_counter()
+        self.rss_start_mb = current_rss_mb()
+        return self
+
+    def __exit__(self, *exc):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu_seconds = usage.ru_utime + usage.ru_stime - self._cpu_start
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        self.rss_end_mb = current_rss_mb()
+        self.rss_peak_mb = peak_rss_mb()
+
+    def report(self) -> dict[str, float]:
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "cpu_percent": round(100 * self.cpu_seconds / self.wall_seconds, 1)
+            if self.wall_seconds
+            else 0.0,
+            "rss_start_mb": round(self.rss_start_mb, 1),
+            "rss_end_mb": round(self.rss_end_mb, 1),
+            "rss_peak_mb": round(self.rss_peak_mb, 1),
+        }
+
+
+def write_report(report: dict, output: str | None):
+    """Print the report and optionally write it as JSON for regression tracking."""
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if output:
+        Path(output).write_text(text + "\n")
@@ -0,0 +1,171 @@
+"""Round trips and latency of turn persistence.
+
+Saves the same turns through the previous ORM sequence (two flushes, a
+commit, a session read, the updated_at write and a second commit) and
+through `persist_turn` (one statement plus the commit, then the primary-key
+update recording the write time in `db_ms`), counting the statements, BEGINs
+and COMMITs each one sends to PGlite.
+
+Usage:
+    python -m english_tutor.bench.persist_bench --turns 200 --output persist.json
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from .load_test import BENCH_USER_ID_BASE, USER_LINES, cleanup, create_session
+from ..metrics import summarize
+from .metrics import write_report
+
+USAGE = {
+    "model_name": "gemini-3-flash-preview",
+    "agent_name": "tutoring",
+    "prompt_tokens": 1200,
+    "completion_tokens": 300,
+    "cached_prompt_tokens": 800,
+    "total_tokens": 1500,
+    "response_time_ms": 900,
+    "ttft_ms": 400,
+    "generation_ms": 900,
+    "chunk_count": 30,
+    "mean_inter_token_ms": 15.0,
+}
+
+
+class RoundTrips:
+    """Counts what every engine sends: statements, BEGINs and COMMITs."""
+
+    def __init__(self):
+        self.counts = {"statements": 0, "begins": 0, "commits": 0}
+
+    def __enter__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.listen(Engine, "before_cursor_execute", self._statement)
+        event.listen(Engine, "begin", self._begin)
+        event.listen(Engine, "commit", self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.remove(Engine, "before_cursor_execute", self._statement)
+        event.remove(Engine, "begin", self._begin)
+        event.remove(Engine, "commit", self._commit)
+
+    def _statement(self, *args):
+        self.counts["statements"] += 1
+
+    def _begin(self, *args):
+        self.counts["begins"] += 1
+
+    def _commit(self, *args):
+        self.counts["commits"] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def persist_turn_orm(session_id, user_id, user_text, agent_text, usage_metadata):
+    """The per-row ORM sequence persist_turn used before the single statement."""
+    from ..db import Database
+    from ..models.evaluation import Message
+    from ..models.user import Session
+    from ..persistence import add_usage_totals, build_token_usage
+
+    with Database.session() as db_session:
+        db_session.add(
+            Message(session_id=session_id, sender="user", content_text=user_text)
+        )
+        db_session.flush()
+        agent_message = Message(
+            session_id=session_id, sender="agent", content_text=agent_text
+        )
+        db_session.add(agent_message)
+        db_session.flush()
+        token_usage = build_token_usage(
+            session_id, user_id, user_text, agent_text, usage_metadata
+        )
+        token_usage.message_id = agent_message.id
+        db_session.add(token_usage)
+        add_usage_totals(db_session, token_usage)
+        db_session.commit()
+
+        session_obj = db_session.get(Session, session_id)
+        if session_obj:
+            session_obj.updated_at = datetime.now()
+            db_session.add(session_obj)
+        db_session.commit()
+    return agent_message.id
+
+
+def measure(persist, session_id: int, user_id: int, turns: int) -> dict:
+    latencies: list[float] = []
+    with RoundTrips() as trips:
+        for turn in range(turns):
+            user_text = USER_LINES[turn % len(USER_LINES)]
+            start = time.perf_counter()
+            persist(session_id, user_id, user_text, f"Reply {turn}", dict(USAGE))
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "persist_ms": summarize(latencies),
+        "round_trips_per_turn": round(trips.total / turns, 2),
+        **{f"{name}_per_turn": round(n / turns, 2) for name, n in trips.counts.items()},
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    from ..persistence import persist_turn
+
+    modes = {"orm": persist_turn_orm, "single_statement": persist_turn}
+    session_ids: list[int] = []
+    report: dict = {"config": vars(args)}
+    try:
+        for i, (mode, persist) in enumerate(modes.items()):
+            user_id = BENCH_USER_ID_BASE + i
+            session_id = create_session(user_id, "tutoring")
+            session_ids.append(session_id)
+            # Warm up connections and the price table outside the measurement.
+            persist(session_id, user_id, "warm up", "warm up", dict(USAGE))
+            report[mode] = measure(persist, session_id, user_id, args.turns)
+    finally:
+        if not args.keep_data:
+            cleanup(session_ids)
+
+    if len(session_ids) == len(modes):
+        before = report["orm"]
+        after = report["single_statement"]
+        report["round_trip_reduction"] = round(
+            1 - after["round_trips_per_turn"] / before["round_trips_per_turn"], 3
+        )
+        report["p50_speedup"] = round(
+            before["persist_ms"]["p50"] / max(after["persist_ms"]["p50"], 0.01), 2
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument(
+        "--keep-data", action="store_true", help="Keep benchmark rows afterwards."
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    from ..db_manager import DBManager
+
+    DBManager.start()
+    try:
+        report = run(args)
+    finally:
+        DBManager.stop()
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+from sqlmodel import select
+
+from .models.content import Curriculum
+from .db import Database
+
+
+class CurriculumCache:
+    """Read-through cache of curricula by level.
+
+    Curricula change from the admin page, which calls `invalidate`, or from
+    `seed_curriculum.py`. `invalidate` only clears this process's cache, so
+    entries also expire after CURRICULUM_CACHE_TTL_SECONDS: a reseed shows up
+    in running app processes within that time.
+    Values are plain dicts, safe to use after the DB session is closed.
+    Event handlers use `aget`, which loads a miss on the async session.
+    """
+
+    _lock = threading.Lock()
+    # level -> (curriculum fields or None when the level has none, loaded at)
+    _levels: dict[int, tuple[dict | None, float]] = {}
+    _generation = 0
+    ttl_seconds = float(os.environ.get("CURRICULUM_CACHE_TTL_SECONDS", "300"))
+    _stats: dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    FIELDS = (
+        "id",
+        "level",
+        "title",
+        "description",
+        "base_content",
+        "learning_goals",
+        "common_pitfalls",
+    )
+
+    @classmethod
+    def get(cls, level: int) -> dict | None:
+        """Return the curriculum fields for `level`, or None if it has none."""
+        hit, value, generation = cls._cached(level)
+        if hit:
+            return value
+
+        with Database.session() as session:
+            cur = session.exec(
+                select(Curriculum).where(Curriculum.level == level)
+            ).first()
+            value = {f: getattr(cur, f) for f in cls.FIELDS} if cur else None
+        return cls._store(level, value, generation)
+
+    @classmethod
+    async def aget(cls, level: int) -> dict | None:
+        """`get` for coroutines: a miss is loaded without blocking the loop."""
+        hit, value, generation = cls._cached(level)
+        if hit:
+            return value
+
+        async with Database.async_session() as session:
+            cur = (
+                await session.exec(select(Curriculum).where(Curriculum.level == level))
+            ).first()
+            value = {f: getattr(cur, f) for f in cls.FIELDS} if cur else None
+        return cls._store(level, value, generation)
+
+    @classmethod
+    def _cached(cls, level: int) -> tuple[bool, dict | None, int]:
+        """(hit, value, generation) for `level`, counting the lookup."""
+        with cls._lock:
+            entry = cls._levels.get(level)
+            if entry and time.time() - entry[1] < cls.ttl_seconds:
+                cls._stats["hits"] += 1
+                return True, entry[0], cls._generation
+            cls._stats["misses"] += 1
+            return False, None, cls._generation
+
+    @classmethod
+    def _store(cls, level: int, value: dict | None, generation: int) -> dict | None:
+        with cls._lock:
+            # Don't cache a value read before a concurrent invalidation.
+            if generation == cls._generation:
+                cls._levels[level] = (value, time.time())
+        return value
+
+    @classmethod
+    def invalidate(cls, level: int | None = None):
+        """Drop one level (or all) after curriculum edits."""
+        with cls._lock:
+            cls._generation += 1
+            cls._stats["invalidations"] += 1
+            if level is None:
+                cls._levels.clear()
+            else:
+                cls._levels.pop(level, None)
+
+    @classmethod
+    def stats(cls) -> dict[str, float]:
+        with cls._lock:
+            lookups = cls._stats["hits"] + cls._stats["misses"]
+            return {
+                **cls._stats,
+                "levels": len(cls._levels),
+                "hit_rate": round(cls._stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
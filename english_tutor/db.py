@@ -0,0 +1,239 @@
+import collections
+import dotenv
+import os
+import threading
+import time
+
+import reflex as rx
+import sqlmodel
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .metrics import summarize
+from .db_manager import DBManager
+
+
+dotenv.load_dotenv()
+
+
+class Database:
+    """Pooled SQLAlchemy engine on top of a psycopg ConnectionPool.
+
+    PGlite connection setup is slow enough to show up in every turn, so
+    connections are kept open in a psycopg pool: DB_POOL_MIN_SIZE (2) to
+    DB_POOL_MAX_SIZE (10) connections, checked before hand-out
+    (DB_POOL_CHECK, pre-ping), closed after DB_POOL_MAX_IDLE_S (300) idle or
+    DB_POOL_MAX_LIFETIME_S (3600) in total. DB_PREPARE_THRESHOLD sets the
+    psycopg prepared statement cache ("none" disables it).
+
+    SQLAlchemy runs with NullPool and takes connections from the psycopg
+    pool; with `close_returns` closing one hands it back. `session` replaces
+    `rx.session()` and `stats` reports checkout waits and pool usage.
+
+    `async_session` is the same over an AsyncConnectionPool (same settings)
+    for event handlers, so their queries don't block the event loop. The
+    async pool belongs to the loop that first uses it.
+
+    Both pools are created on first use, once `DBManager` reports PGlite
+    ready; nothing connects at import time.
+    """
+
+    _lock = threading.Lock()
+    _pool: ConnectionPool | None = None
+    _engine = None
+    min_size = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+    max_size = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+    timeout_seconds = float(os.environ.get("DB_POOL_TIMEOUT_S", "30"))
+    max_idle_seconds = float(os.environ.get("DB_POOL_MAX_IDLE_S", "300"))
+    max_lifetime_seconds = float(os.environ.get("DB_POOL_MAX_LIFETIME_S", "3600"))
+    check = os.environ.get("DB_POOL_CHECK", "1").lower() not in ("0", "false")
+    # "" keeps the psycopg default (5 executions before preparing)
+    prepare_threshold = os.environ.get("DB_PREPARE_THRESHOLD", "").strip().lower()
+    # Checkout waits in ms, most recent last
+    _waits: collections.deque[float] = collections.deque(maxlen=1000)
+    _stats: dict[str, int] = {"checkouts": 0, "checkout_errors": 0}
+    _async_pool: AsyncConnectionPool | None = None
+    _async_engine = None
+    _async_waits: collections.deque[float] = collections.deque(maxlen=1000)
+    _async_stats: dict[str, int] = {"checkouts": 0, "checkout_errors": 0}
+
+    @classmethod
+    def conninfo(cls) -> str:
+        """libpq URL of the app database (rxconfig db_url without the driver)."""
+        db_url = rx.config.get_config().db_url
+        return db_url.replace("postgresql+psycopg://", "postgresql://")
+
+    @classmethod
+    def pool_options(cls, pool_class) -> dict:
+        kwargs = {}
+        if cls.prepare_threshold:
+            kwargs["prepare_threshold"] = (
+                None if cls.prepare_threshold == "none" else int(cls.prepare_threshold)
+            )
+        return {
+            "min_size": cls.min_size,
+            "max_size": cls.max_size,
+            "timeout": cls.timeout_seconds,
+            "max_idle": cls.max_idle_seconds,
+            "max_lifetime": cls.max_lifetime_seconds,
+            "check": pool_class.check_connection if cls.check else None,
+            "close_returns": True,
+            "kwargs": kwargs,
+            "open": False,
+        }
+
+    @classmethod
+    def pool(cls) -> ConnectionPool:
+        if cls._pool is None:
+            # First access waits for PGlite, starting it if nothing has.
+            DBManager.wait_ready()
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ConnectionPool(
+                    cls.conninfo(),
+                    name="english_tutor",
+                    **cls.pool_options(ConnectionPool),
+                )
+                cls._pool.open()
+            return cls._pool
+
+    @classmethod
+    def engine(cls):
+        cls.pool()
+        with cls._lock:
+            if cls._engine is None:
+                cls._engine = create_engine(
+                    "postgresql+psycopg://",
+                    creator=cls._checkout,
+                    poolclass=NullPool,
+                )
+            return cls._engine
+
+    @classmethod
+    def session(cls) -> sqlmodel.Session:
+        """A SQLModel session on the pooled engine (use as a context manager)."""
+        return sqlmodel.Session(cls.engine())
+
+    @classmethod
+    async def async_pool(cls) -> AsyncConnectionPool:
+        # Created without awaiting, so concurrent first callers share one pool;
+        # opening an open pool is a no-op.
+        if cls._async_pool is None:
+            await DBManager.await_ready()
+        if cls._async_pool is None:
+            cls._async_pool = AsyncConnectionPool(
+                cls.conninfo(),
+                name="english_tutor_async",
+                **cls.pool_options(AsyncConnectionPool),
+            )
+        pool = cls._async_pool
+        await pool.open()
+        return pool
+
+    @classmethod
+    def async_engine(cls):
+        if cls._async_engine is None:
+            cls._async_engine = create_async_engine(
+                "postgresql+psycopg://",
+                async_creator=cls._async_checkout,
+                poolclass=NullPool,
+            )
+        return cls._async_engine
+
+    @classmethod
+    def async_session(cls) -> AsyncSession:
+        """An AsyncSession on the pooled async engine (`async with`).
+
+        Objects stay loaded after commit, since lazy refreshes can't run
+        implicitly in async code.
+        """
+        return AsyncSession(cls.async_engine(), expire_on_commit=False)
+
+    @classmethod
+    async def aclose(cls):
+        pool, cls._async_pool = cls._async_pool, None
+        engine, cls._async_engine = cls._async_engine, None
+        if engine is not None:
+            await engine.dispose()
+        if pool is not None:
+            await pool.close()
+
+    @classmethod
+    def wait_ready(cls, timeout: float = 30.0):
+        """Block until the pool holds `min_size` working connections."""
+        cls.pool().wait(timeout=timeout)
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            pool, cls._pool = cls._pool, None
+            engine, cls._engine = cls._engine, None
+        if engine is not None:
+            engine.dispose()
+        if pool is not None:
+            pool.close()
+
+    @classmethod
+    def stats(cls) -> dict[str, float]:
+        with cls._lock:
+            return cls._pool_stats(cls._pool, list(cls._waits), dict(cls._stats))
+
+    @classmethod
+    def async_stats(cls) -> dict[str, float]:
+        with cls._lock:
+            return cls._pool_stats(
+                cls._async_pool, list(cls._async_waits), dict(cls._async_stats)
+            )
+
+    @classmethod
+    def _pool_stats(cls, pool, waits: list[float], counters: dict) -> dict:
+        if pool is None:
+            return {"open": 0, **counters}
+        pool_stats = pool.get_stats()
+        size = pool_stats.get("pool_size", 0)
+        wait = summarize(waits)
+        return {
+            "open": 1,
+            "size": size,
+            "in_use": size - pool_stats.get("pool_available", 0),
+            # Connections opened beyond min_size under load
+            "overflow": max(size - cls.min_size, 0),
+            "waiting": pool_stats.get("requests_waiting", 0),
+            **counters,
+            "wait_p50_ms": wait["p50"],
+            "wait_p95_ms": wait["p95"],
+            "wait_max_ms": wait["max"],
+            "connections_made": pool_stats.get("connections_num", 0),
+            "connections_lost": pool_stats.get("connections_lost", 0),
+        }
+
+    @classmethod
+    def _checkout(cls):
+        start = time.perf_counter()
+        try:
+            conn = cls.pool().getconn()
+        except Exception:
+            with cls._lock:
+                cls._stats["checkout_errors"] += 1
+            raise
+        with cls._lock:
+            cls._stats["checkouts"] += 1
+            cls._waits.append((time.perf_counter() - start) * 1000)
+        return conn
+
+    @classmethod
+    async def _async_checkout(cls):
+        start = time.perf_counter()
+        try:
+            conn = await (await cls.async_pool()).getconn()
+        except Exception:
+            with cls._lock:
+                cls._async_stats["checkout_errors"] += 1
+            raise
+        with cls._lock:
+            cls._async_stats["checkouts"] += 1
+            cls._async_waits.append((time.perf_counter() - start) * 1000)
+        return conn
@@ -1,65 +1,226 @@
+import asyncio
+import contextlib
+import dotenv
 import reflex as rx
 from py_pglite import PGliteManager, PGliteConfig
 from pathlib import Path
 import os
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+dotenv.load_dotenv()
+
 
 class DBManager:
+    """Starts PGlite in the background and gates DB access on readiness.
+
+    `start` returns immediately: a thread launches PGlite (or reuses one
+    already serving the configured address, e.g. after a hot reload) and
+    then warms the connection pool. The first DB access waits on `wait_ready`
+    (from `Database.pool`) or `await_ready` (from `Database.async_pool`), and
+    starts PGlite itself if nothing has yet. With PGLITE_SOCKET_DIR set,
+    PGlite listens on a Unix-domain socket in that directory instead of TCP
+    port PGLITE_PORT (default 5432); rxconfig derives db_url the same way.
+    `stats` reports how long each startup phase took.
+    """
+
     _manager = None
+    _lock = threading.Lock()
+    _thread: threading.Thread | None = None
+    # Set once PGlite accepts connections (or startup failed, see _error)
+    _ready = threading.Event()
+    _error: Exception | None = None
+    socket_dir = os.environ.get("PGLITE_SOCKET_DIR", "")
+    port = int(os.environ.get("PGLITE_PORT", "5432"))
+    start_timeout_seconds = float(os.environ.get("PGLITE_START_TIMEOUT_S", "60"))
+    _timings: dict[str, float] = {}
+
+    @classmethod
+    def mode(cls) -> str:
+        return "unix" if cls.socket_dir else "tcp"
 
     @classmethod
     def start(cls):
-        if cls._manager is not None:
+        """Start PGlite in a background thread; a no-op if already started."""
+        with cls._lock:
+            if cls._thread is not None:
+                return
+            cls._ready.clear()
+            cls._error = None
+            cls._timings = {"requested_at": time.time()}
+            cls._thread = threading.Thread(
+                target=cls._start, name="pglite-start", daemon=True
+            )
+            cls._thread.start()
+
+    @classmethod
+    def wait_ready(cls, timeout: float | None = None):
+        """Block until PGlite accepts connections, starting it if needed."""
+        if not cls._ready.is_set():
+            cls.start()
+            start = time.perf_counter()
+            timeout = cls.start_timeout_seconds if timeout is None else timeout
+            ready = cls._ready.wait(timeout)
+            with cls._lock:
+                cls._timings["first_access_wait_ms"] = round(
+                    (time.perf_counter() - start) * 1000, 1
+                )
+            if not ready:
+                raise TimeoutError(f"PGlite not ready after {timeout:.0f}s")
+        if cls._error is not None:
+            raise RuntimeError(f"PGlite failed to start: {cls._error}")
+
+    @classmethod
+    async def await_ready(cls, timeout: float | None = None):
+        """`wait_ready` for coroutines: waits in a thread, not on the loop."""
+        if cls._ready.is_set() and cls._error is None:
             return
+        await asyncio.to_thread(cls.wait_ready, timeout)
 
+    @classmethod
+    def stats(cls) -> dict[str, float | str]:
+        with cls._lock:
+            timings = dict(cls._timings)
+        timings.pop("requested_at", None)
+        return {
+            "mode": cls.mode(),
+            "ready": int(cls._ready.is_set() and cls._error is None),
+            **timings,
+            **({"error": str(cls._error)} if cls._error is not None else {}),
+        }
+
+    @classmethod
+    def _config(cls) -> PGliteConfig:
         data_dir = Path("pgdata")
         data_dir.mkdir(exist_ok=True)
-
-        config = PGliteConfig(
+        if cls.socket_dir:
+            socket_dir = Path(cls.socket_dir).resolve()
+            socket_dir.mkdir(parents=True, exist_ok=True)
+            return PGliteConfig(
+                work_dir=data_dir,
+                cleanup_on_exit=False,
+                use_tcp=False,
+                socket_path=str(socket_dir / f".s.PGSQL.{cls.port}"),
+                timeout=int(cls.start_timeout_seconds),
+            )
+        return PGliteConfig(
             work_dir=data_dir,
             cleanup_on_exit=False,
             use_tcp=True,
-            tcp_port=5432,
-            timeout=60,
+            tcp_port=cls.port,
+            timeout=int(cls.start_timeout_seconds),
         )
 
-        # Check if the socket already exists. PGlite handles this usually,
-        # but we want to be safe across reloads.
-        cls._manager = PGliteManager(config)
+    @classmethod
+    def _server_running(cls) -> bool:
+        """True if something already answers at the configured address."""
+        import psycopg
+
+        from .db import Database
+
+        if cls.socket_dir:
+            socket_path = Path(cls.socket_dir) / f".s.PGSQL.{cls.port}"
+            if not socket_path.exists():
+                return False
         try:
-            logger.info("Starting PGlite server...")
-            cls._manager.start()
-
-            # Custom wait loop since manager.wait_for_ready() defaults to 'postgres' user
-            # and we are running as 'swarf'.
-            import time
-            import psycopg
-
-            logger.info("Waiting for database to be ready...")
-            for i in range(30):
-                try:
-                    # Connect as swarf
-                    with psycopg.connect(
-                        "postgresql://swarf@localhost:5432/postgres", connect_timeout=1
-                    ) as conn:
-                        with conn.cursor() as cur:
-                            cur.execute("SELECT 1")
-                    logger.info("PGlite server is ready (connection verified).")
-                    break
-                except Exception:
-                    time.sleep(0.5)
-            else:
-                logger.error("Failed to connect to PGlite after retries.")
+            with psycopg.connect(Database.conninfo(), connect_timeout=1):
+                return True
+        except Exception:
+            return False
+
+    @classmethod
+    def _start(cls):
+        from .db import Database
+
+        start = time.perf_counter()
+        try:
+            reused = cls._server_running()
+            probed = time.perf_counter()
+            if not reused:
+                # Stopped by DBManager.stop; a reused server belongs to the
+                # process that started it.
+                manager = PGliteManager(cls._config())
+                logger.info(f"Starting PGlite server ({cls.mode()})...")
+                manager.start()
+                with cls._lock:
+                    cls._manager = manager
+            started = time.perf_counter()
+            with cls._lock:
+                cls._timings.update(
+                    reused=int(reused),
+                    probe_ms=round((probed - start) * 1000, 1),
+                    pglite_ms=round((started - probed) * 1000, 1),
+                )
         except Exception as e:
             logger.error(f"Failed to start PGlite: {e}")
-            # If it failed because it's already running, we might be okay
-            pass
+            cls._error = e
+            cls._ready.set()
+            return
+        cls._ready.set()
+
+        # Open the pool's first connections now, so the first request finds
+        # them ready instead of paying for the connection setup.
+        try:
+            Database.wait_ready(timeout=15)
+            logger.info("PGlite server is ready (connection pool open).")
+        except Exception as e:
+            logger.error(f"Failed to connect to PGlite: {e}")
+        else:
+            from .pricing import PriceTable
+            from .write_behind import WriteBehindQueue
+
+            # Turns are priced from memory; load the prices before the first.
+            PriceTable.preload()
+            try:
+                WriteBehindQueue.replay_spill()
+            except Exception as e:
+                logger.error(f"Failed to replay spilled write-behind turns: {e}")
+        with cls._lock:
+            cls._timings["pool_ms"] = round(
+                (time.perf_counter() - started) * 1000, 1
+            )
+            cls._timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"DB startup: {cls.stats()}")
 
     @classmethod
     def stop(cls):
-        if cls._manager:
-            cls._manager.stop()
-            cls._manager = None
+        from .write_behind import WriteBehindQueue
+
+        # Queued write-behind turns go out before the database does. Any it
+        # cannot write are spilled to disk and its error propagates after the
+        # database is shut down.
+        try:
+            WriteBehindQueue.stop()
+        finally:
+            cls._shutdown()
+
+    @classmethod
+    def _shutdown(cls):
+        from .db import Database
+
+        with cls._lock:
+            thread, cls._thread = cls._thread, None
+        if thread is not None:
+            # Let a start in progress finish, so its pool is closed below.
+            thread.join(cls.start_timeout_seconds)
+        Database.close()
+        with cls._lock:
+            manager, cls._manager = cls._manager, None
+        if manager:
+            manager.stop()
+        cls._ready.clear()
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def lifespan(cls):
+        """App lifespan task: start PGlite in the background, stop it on exit."""
+        from .db import Database
+
+        cls.start()
+        yield
+        # The async pool lives on the app's loop, so it is closed here.
+        await Database.aclose()
+        cls.stop()
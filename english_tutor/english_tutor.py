@@ -5,9 +5,7 @@ from .views.dashboard import dashboard_view
 from .views.admin import admin_view
 from .views.login import login_view
 from .db_manager import DBManager
-
-# Start DB Manager
-DBManager.start()
+from .loop_monitor import LoopLagMonitor
 
 app = rx.App(
     theme=rx.theme(
@@ -18,6 +16,9 @@ app = rx.App(
     )
 )
 
+app.register_lifespan_task(LoopLagMonitor.run)
+app.register_lifespan_task(DBManager.lifespan)
+
 app.add_page(index, route="/")
 app.add_page(chat_view, route="/chat")
 app.add_page(dashboard_view, route="/dashboard")
@@ -0,0 +1,46 @@
+import asyncio
+import collections
+import dotenv
+import os
+import threading
+import time
+
+from .metrics import summarize
+
+
+dotenv.load_dotenv()
+
+
+class LoopLagMonitor:
+    """Measures event loop lag: how late a periodic sleep wakes up.
+
+    Anything that blocks the loop (a synchronous LLM or DB call in a handler)
+    shows up directly as lag for every other connected user. `run` is
+    registered as a Reflex lifespan task; the load test starts it too.
+    """
+
+    _lock = threading.Lock()
+    interval_seconds = float(os.environ.get("LOOP_LAG_INTERVAL_MS", "100")) / 1000
+    # Lag samples in ms; at the default interval this is the last ~2 minutes.
+    _samples: collections.deque[float] = collections.deque(maxlen=1200)
+
+    @classmethod
+    async def run(cls):
+        """Sample lag until cancelled."""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(cls.interval_seconds)
+            lag = time.perf_counter() - start - cls.interval_seconds
+            with cls._lock:
+                cls._samples.append(max(lag, 0.0) * 1000)
+
+    @classmethod
+    def stats(cls) -> dict[str, float]:
+        with cls._lock:
+            samples = list(cls._samples)
+        return summarize(samples)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._samples.clear()
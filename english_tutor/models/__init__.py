@@ -1,7 +1,7 @@
 from .user import User, Session
 from .evaluation import Message, Evaluation
 from .content import Curriculum, AgentPrompt
-from .token_usage import TokenUsage
+from .token_usage import TokenUsage, ModelPrice, UserDailyCost, TokenUsageRollup
 
 __all__ = [
     "User",
@@ -11,4 +11,7 @@ __all__ = [
     "Curriculum",
     "AgentPrompt",
     "TokenUsage",
+    "ModelPrice",
+    "UserDailyCost",
+    "TokenUsageRollup",
 ]
@@ -1,4 +1,5 @@
 import reflex as rx
+from sqlalchemy import Index
 from sqlmodel import Field
 
 
@@ -16,6 +17,11 @@ class Curriculum(rx.Model, table=True):
 class AgentPrompt(rx.Model, table=True):
     """Versioned agent prompts."""
 
+    __table_args__ = (
+        # Version history and active prompt lookup per agent
+        Index("ix_agentprompt_agent_name_version", "agent_name", "version"),
+    )
+
     agent_name: str  # evaluation, tutoring, learning_plan, counseling
     prompt_text: str
     version: int = 1
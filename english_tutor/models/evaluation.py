@@ -1,4 +1,5 @@
 import reflex as rx
+from sqlalchemy import Index
 from sqlmodel import Field
 from datetime import datetime
 from datetime import timezone
@@ -7,6 +8,14 @@ from datetime import timezone
 class Message(rx.Model, table=True):
     """Individual chat messages."""
 
+    # Conversation history is read per session in (created_at, id) order,
+    # newest page first.
+    __table_args__ = (
+        Index(
+            "ix_message_session_id_created_at_id", "session_id", "created_at", "id"
+        ),
+    )
+
     session_id: int
     sender: str  # user, agent
     content_text: str
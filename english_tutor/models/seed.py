@@ -1,5 +1,5 @@
 from .content import Curriculum, AgentPrompt
-import reflex as rx
+from ..db import Database
 
 
 def seed_data():
@@ -31,7 +31,7 @@ def seed_data():
         ),
     ]
 
-    with rx.session() as session:
+    with Database.session() as session:
         # Clear existing
         # session.exec(Curriculum.delete())
         for c in curricula:
@@ -1,5 +1,7 @@
 import reflex as rx
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field
+from datetime import date
 from datetime import datetime
 from datetime import timezone
 
@@ -7,6 +9,13 @@ from datetime import timezone
 class TokenUsage(rx.Model, table=True):
     """Track detailed token usage per message."""
 
+    __table_args__ = (
+        # Latency percentiles over a recent time window
+        Index("ix_tokenusage_created_at", "created_at"),
+        # Admin drill-down into one (model, agent), newest first
+        Index("ix_tokenusage_model_agent_id", "model_name", "agent_name", "id"),
+    )
+
     # References
     message_id: int | None = None  # Optional reference to Message table
     session_id: int
@@ -14,6 +23,7 @@ class TokenUsage(rx.Model, table=True):
 
     # Model information
     model_name: str  # e.g., "gemini-1.5-pro"
+    agent_name: str = ""  # Orchestrator key, e.g. "tutoring"
 
     # Message content (for analysis)
     input_message: str
@@ -27,9 +37,77 @@ class TokenUsage(rx.Model, table=True):
 
     # Performance
     response_time_ms: int = 0  # Response time in milliseconds
+    ttft_ms: int = 0  # Time to first streamed token
+    generation_ms: int = 0  # Time from request to last token
+    # Time spent in DB reads and in writing this turn (its insert and commit);
+    # reads only in write-behind mode, where the turn is written in a batch.
+    db_ms: int = 0
+    chunk_count: int = 0  # Streamed chunks received
+    mean_inter_token_ms: float = 0.0  # Mean gap between consecutive chunks
 
-    # Cost estimation (optional)
+    # Cost in USD at the model's price when the turn was saved
     estimated_cost: float = 0.0
 
     # Metadata
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class ModelPrice(rx.Model, table=True):
+    """USD price per million tokens for a model, effective from a point in time.
+
+    Prices are never edited in place: a change is a new row with a later
+    `effective_from`, so past usage keeps the price it was billed at.
+    """
+
+    model_name: str
+    input_per_mtok: float
+    output_per_mtok: float
+    cached_input_per_mtok: float
+    effective_from: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+
+class UserDailyCost(rx.Model, table=True):
+    """Per-user, per-day usage totals, upserted as each turn is saved."""
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "day"),
+        Index("ix_userdailycost_day", "day"),
+    )
+
+    user_id: int
+    day: date
+    turns: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    total_tokens: int = 0
+    cost: float = 0.0
+
+
+class TokenUsageRollup(rx.Model, table=True):
+    """Usage totals per hour or day, model, agent and user.
+
+    Upserted alongside every TokenUsage insert so the admin dashboard reads
+    aggregates instead of scanning the raw rows.
+    """
+
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket", "model_name", "agent_name", "user_id"
+        ),
+    )
+
+    granularity: str  # "hour" or "day"
+    bucket: datetime  # Start of the hour/day, naive UTC
+    model_name: str
+    agent_name: str = ""
+    user_id: int
+    turns: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    total_tokens: int = 0
+    cost: float = 0.0
+    response_time_ms: int = 0  # Sum; divide by turns for the mean
@@ -1,4 +1,5 @@
 import reflex as rx
+from sqlalchemy import Index, text
 from sqlmodel import Field
 from datetime import datetime
 from datetime import timezone
@@ -18,6 +19,17 @@ class User(rx.Model, table=True):
 class Session(rx.Model, table=True):
     """Chat session model."""
 
+    # Sidebar: a user's live sessions, paged by (updated_at, id), newest first.
+    __table_args__ = (
+        Index(
+            "ix_session_user_id_updated_at_id_live",
+            "user_id",
+            "updated_at",
+            "id",
+            postgresql_where=text("is_deleted = false"),
+        ),
+    )
+
     user_id: int
     session_type: str = "onboarding"  # onboarding, tutoring, testing
     status: str = "active"  # active, completed
@@ -25,3 +37,6 @@ class Session(rx.Model, table=True):
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     title: str | None = None
     is_deleted: bool = Field(default=False)
+    # Rolling summary of the messages that fell out of the LLM context window
+    context_summary: str = ""
+    summarized_count: int = 0  # Number of leading messages folded into the summary
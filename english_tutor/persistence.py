@@ -0,0 +1,333 @@
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import null, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from .models.evaluation import Message
+from .models.token_usage import TokenUsage, TokenUsageRollup, UserDailyCost
+from .models.user import Session
+from .pricing import PriceTable
+from .tracing import span
+from .write_behind import WriteBehindQueue
+from .db import Database
+
+
+def upsert_statement(model, keys: dict, values: dict):
+    """INSERT a totals row, or add `values` to the existing row for `keys`."""
+    table = model.__table__
+    stmt = insert(table).values(**keys, **values)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in keys],
+        set_={name: table.c[name] + stmt.excluded[name] for name in values},
+    )
+
+
+def upsert_many(model, key_names: list[str], rows: list[dict]):
+    """Multi-row form of `upsert_statement`; keys must be distinct per row."""
+    table = model.__table__
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in key_names],
+        set_={
+            name: table.c[name] + stmt.excluded[name]
+            for name in rows[0]
+            if name not in key_names
+        },
+    )
+
+
+def usage_total_rows(token_usage: TokenUsage) -> list[tuple]:
+    """(model, keys, values) totals rows one usage row adds to.
+
+    The user's daily cost and the hourly and daily rollups.
+    """
+    created = token_usage.created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    hour = created.replace(minute=0, second=0, microsecond=0)
+    values = {
+        "turns": 1,
+        "prompt_tokens": token_usage.prompt_tokens,
+        "completion_tokens": token_usage.completion_tokens,
+        "cached_prompt_tokens": token_usage.cached_prompt_tokens,
+        "total_tokens": token_usage.total_tokens,
+        "cost": token_usage.estimated_cost,
+    }
+    rows = [
+        (
+            UserDailyCost,
+            {"user_id": token_usage.user_id, "day": created.date()},
+            values,
+        )
+    ]
+    for granularity, bucket in (("hour", hour), ("day", hour.replace(hour=0))):
+        rows.append(
+            (
+                TokenUsageRollup,
+                {
+                    "granularity": granularity,
+                    "bucket": bucket,
+                    "model_name": token_usage.model_name,
+                    "agent_name": token_usage.agent_name,
+                    "user_id": token_usage.user_id,
+                },
+                {**values, "response_time_ms": token_usage.response_time_ms},
+            )
+        )
+    return rows
+
+
+def usage_totals(token_usage: TokenUsage) -> list:
+    """Upserts adding one usage row to the daily cost and hourly/daily rollups."""
+    return [
+        upsert_statement(model, keys, values)
+        for model, keys, values in usage_total_rows(token_usage)
+    ]
+
+
+def add_usage_totals(db_session, token_usage: TokenUsage):
+    """Add one usage row to the daily cost and hourly/daily rollup totals."""
+    for stmt in usage_totals(token_usage):
+        with span("db.upsert", table=stmt.table.name):
+            db_session.exec(stmt)
+
+
+def build_token_usage(
+    session_id: int,
+    user_id: int,
+    user_text: str,
+    agent_text: str,
+    usage_metadata: dict,
+) -> TokenUsage:
+    """Priced TokenUsage row for one turn (message_id is filled in on insert)."""
+    model_name = usage_metadata.get("model_name", "unknown")
+    prompt_tokens = usage_metadata.get("prompt_tokens", 0)
+    completion_tokens = usage_metadata.get("completion_tokens", 0)
+    cached_prompt_tokens = usage_metadata.get("cached_prompt_tokens", 0)
+    return TokenUsage(
+        session_id=session_id,
+        user_id=user_id,
+        model_name=model_name,
+        agent_name=usage_metadata.get("agent_name", ""),
+        input_message=user_text,
+        output_message=agent_text,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cached_prompt_tokens=cached_prompt_tokens,
+        total_tokens=usage_metadata.get("total_tokens", 0),
+        response_time_ms=usage_metadata.get(
+            "response_time_ms", usage_metadata.get("generation_ms", 0)
+        ),
+        ttft_ms=usage_metadata.get("ttft_ms", 0),
+        generation_ms=usage_metadata.get("generation_ms", 0),
+        db_ms=usage_metadata.get("db_ms", 0),
+        chunk_count=usage_metadata.get("chunk_count", 0),
+        mean_inter_token_ms=usage_metadata.get("mean_inter_token_ms", 0.0),
+        estimated_cost=PriceTable.cost(
+            model_name, prompt_tokens, completion_tokens, cached_prompt_tokens
+        ),
+    )
+
+
+def message_row(
+    session_id: int, sender: str, content_text: str, created_at: datetime
+) -> dict:
+    """Column values of one Message row for a Core insert."""
+    return {
+        "session_id": session_id,
+        "sender": sender,
+        "content_text": content_text,
+        "content_audio_path": "",
+        "feedback": 0,
+        "created_at": created_at,
+    }
+
+
+def turn_statement(
+    session_id: int,
+    user_id: int,
+    user_text: str,
+    agent_text: str,
+    usage_metadata: dict,
+    user_sent_at: datetime | None = None,
+):
+    """One statement writing a whole turn.
+
+    The two messages go in as a multi-row INSERT ... RETURNING; the token usage
+    row (pointing at the returned agent message id), the daily cost and rollup
+    upserts and the session `updated_at` bump ride along as data-modifying
+    CTEs, so the turn costs one round trip plus the commit. Selects the agent
+    message id and the token usage id (NULL without usage).
+    """
+    now = datetime.now(timezone.utc)
+    messages = Message.__table__
+    rows = [
+        ("user", user_text, user_sent_at or now),
+        ("agent", agent_text, now),
+    ]
+    inserted = (
+        insert(messages)
+        .values([
+            message_row(session_id, sender, text, created_at)
+            for sender, text, created_at in rows
+        ])
+        .returning(messages.c.id, messages.c.sender)
+        .cte("inserted_messages")
+    )
+    agent_message_id = (
+        select(inserted.c.id).where(inserted.c.sender == "agent").scalar_subquery()
+    )
+    writes = [
+        update(Session.__table__)
+        .where(Session.__table__.c.id == session_id)
+        .values(updated_at=now)
+        .cte("touched_session")
+    ]
+    usage_id = null()
+    if usage_metadata:
+        token_usage = build_token_usage(
+            session_id, user_id, user_text, agent_text, usage_metadata
+        )
+        token_usage.created_at = now
+        usage = TokenUsage.__table__
+        inserted_usage = (
+            insert(usage)
+            .values(
+                **token_usage.model_dump(exclude={"id", "message_id"}),
+                message_id=agent_message_id,
+            )
+            .returning(usage.c.id)
+            .cte("inserted_usage")
+        )
+        usage_id = select(inserted_usage.c.id).scalar_subquery()
+        writes += [
+            stmt.cte(f"usage_totals_{i}")
+            for i, stmt in enumerate(usage_totals(token_usage))
+        ]
+    return (
+        select(inserted.c.id, usage_id)
+        .where(inserted.c.sender == "agent")
+        .add_cte(*writes)
+    )
+
+
+def db_ms_update(usage_id: int, write_ms: int):
+    """Add the time spent writing a turn to its TokenUsage.db_ms."""
+    usage = TokenUsage.__table__
+    return (
+        update(usage)
+        .where(usage.c.id == usage_id)
+        .values(db_ms=usage.c.db_ms + write_ms)
+    )
+
+
+def persist_turn(
+    session_id: int,
+    user_id: int,
+    user_text: str,
+    agent_text: str,
+    usage_metadata: dict,
+    user_sent_at: datetime | None = None,
+) -> int | None:
+    """Save one user/agent exchange with its token usage in one transaction.
+
+    `usage_metadata` may carry timings from the stream (ttft_ms, generation_ms,
+    chunk_count, mean_inter_token_ms), the end-to-end `response_time_ms` and
+    `db_ms` already spent on reads for this turn. The turn is priced from the
+    PriceTable and added to the user's daily cost and the usage rollups, and
+    the session's `updated_at` is bumped, all by the single statement from
+    `turn_statement`. The time that statement and its commit took is then
+    added to the usage row's `db_ms` by a primary-key update. `user_sent_at`
+    keeps the user message's own timestamp.
+    Returns the id of the stored agent message, or None in write-behind mode
+    (PERSIST_WRITE_BEHIND), where the turn is queued for a batched flush.
+    """
+    if WriteBehindQueue.enabled:
+        WriteBehindQueue.submit(
+            session_id, user_id, user_text, agent_text, usage_metadata, user_sent_at
+        )
+        return None
+
+    stmt = turn_statement(
+        session_id, user_id, user_text, agent_text, usage_metadata, user_sent_at
+    )
+    start = time.perf_counter()
+    with span("db.persist_turn"), Database.session() as db_session:
+        agent_message_id, usage_id = db_session.exec(stmt).one()
+        with span("db.commit"):
+            db_session.commit()
+        if usage_id is not None:
+            write_ms = int((time.perf_counter() - start) * 1000)
+            db_session.exec(db_ms_update(usage_id, write_ms))
+            db_session.commit()
+    return agent_message_id
+
+
+async def apersist_turn(
+    session_id: int,
+    user_id: int,
+    user_text: str,
+    agent_text: str,
+    usage_metadata: dict,
+    user_sent_at: datetime | None = None,
+) -> int | None:
+    """`persist_turn` on the async engine, for event handlers."""
+    # Pricing reads the cached PriceTable; reload it here if it expired.
+    await PriceTable.arefresh()
+    if WriteBehindQueue.enabled:
+        await WriteBehindQueue.asubmit(
+            session_id, user_id, user_text, agent_text, usage_metadata, user_sent_at
+        )
+        return None
+
+    stmt = turn_statement(
+        session_id, user_id, user_text, agent_text, usage_metadata, user_sent_at
+    )
+    start = time.perf_counter()
+    with span("db.persist_turn"):
+        async with Database.async_session() as db_session:
+            agent_message_id, usage_id = (await db_session.exec(stmt)).one()
+            with span("db.commit"):
+                await db_session.commit()
+            if usage_id is not None:
+                write_ms = int((time.perf_counter() - start) * 1000)
+                await db_session.exec(db_ms_update(usage_id, write_ms))
+                await db_session.commit()
+    return agent_message_id
+
+
+async def arecord_usage(
+    session_id: int,
+    user_id: int,
+    input_text: str,
+    output_text: str,
+    usage_metadata: dict,
+):
+    """Save the TokenUsage row of an LLM call made outside a chat turn.
+
+    Titles, context summaries and the admin prompt optimizer; their
+    `agent_name` is the ModelRouter task, so the routed model shows up in
+    `TokenUsage.model_name`. The row has no message. Like a turn it is
+    priced and added to the user's daily cost and the usage rollups, in one
+    statement.
+    """
+    await PriceTable.arefresh()
+    token_usage = build_token_usage(
+        session_id, user_id, input_text, output_text, usage_metadata
+    )
+    token_usage.created_at = datetime.now(timezone.utc)
+    stmt = (
+        insert(TokenUsage.__table__)
+        .values(**token_usage.model_dump(exclude={"id"}))
+        .add_cte(
+            *[
+                totals.cte(f"usage_totals_{i}")
+                for i, totals in enumerate(usage_totals(token_usage))
+            ]
+        )
+    )
+    with span("db.record_usage", agent=token_usage.agent_name):
+        async with Database.async_session() as db_session:
+            await db_session.exec(stmt)
+            with span("db.commit"):
+                await db_session.commit()
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlmodel import select
+
+from .models.token_usage import ModelPrice
+from .db import Database
+
+
+class PriceTable:
+    """In-process copy of the ModelPrice table.
+
+    Reloaded every PRICE_CACHE_TTL_SECONDS (or on `invalidate`), so turns are
+    priced without a DB read. Models without a price cost 0 and are counted in
+    `stats()["unpriced"]` so the gap is visible in the admin page. Async
+    callers run `arefresh` first so an expired table is reloaded on the async
+    session instead of inside `price`.
+    """
+
+    _lock = threading.Lock()
+    # model -> price rows, newest effective_from first
+    _prices: dict[str, list[ModelPrice]] = {}
+    _loaded_at = 0.0
+    ttl_seconds = float(os.environ.get("PRICE_CACHE_TTL_SECONDS", "300"))
+    _stats: dict[str, int] = {"loads": 0, "unpriced": 0}
+
+    @classmethod
+    def price(cls, model_name: str, at: datetime | None = None) -> ModelPrice | None:
+        """The price row in effect for `model_name` at `at` (default: now)."""
+        if time.time() - cls._loaded_at > cls.ttl_seconds:
+            cls._load()
+        at = _as_utc(at or datetime.now(timezone.utc))
+        with cls._lock:
+            rows = cls._prices.get(model_name, [])
+        for row in rows:
+            if _as_utc(row.effective_from) <= at:
+                return row
+        return None
+
+    @classmethod
+    def cost(
+        cls,
+        model_name: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_prompt_tokens: int = 0,
+        at: datetime | None = None,
+    ) -> float:
+        """USD cost of one call; cached prompt tokens bill at the cached rate."""
+        price = cls.price(model_name, at)
+        if price is None:
+            with cls._lock:
+                cls._stats["unpriced"] += 1
+            return 0.0
+        cached = min(cached_prompt_tokens, prompt_tokens)
+        return (
+            (prompt_tokens - cached) * price.input_per_mtok
+            + cached * price.cached_input_per_mtok
+            + completion_tokens * price.output_per_mtok
+        ) / 1_000_000
+
+    @classmethod
+    def preload(cls):
+        """Load the table now (at startup), so the first turns find it."""
+        cls._load()
+
+    @classmethod
+    async def arefresh(cls):
+        """Reload the table on the async session if it has expired."""
+        if time.time() - cls._loaded_at <= cls.ttl_seconds:
+            return
+        try:
+            async with Database.async_session() as session:
+                rows = (await session.exec(cls._query())).all()
+        except Exception as e:
+            print(f"Failed to load model prices: {e}")
+            rows = None
+        cls._replace(rows)
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._loaded_at = 0.0
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        with cls._lock:
+            return {**cls._stats, "models": len(cls._prices)}
+
+    @staticmethod
+    def _query():
+        return select(ModelPrice).order_by(ModelPrice.effective_from.desc())
+
+    @classmethod
+    def _load(cls):
+        try:
+            with Database.session() as session:
+                rows = session.exec(cls._query()).all()
+        except Exception as e:
+            print(f"Failed to load model prices: {e}")
+            rows = None
+        cls._replace(rows)
+
+    @classmethod
+    def _replace(cls, rows: list[ModelPrice] | None):
+        with cls._lock:
+            cls._loaded_at = time.time()
+            if rows is None:
+                return
+            prices: dict[str, list[ModelPrice]] = {}
+            for row in rows:
+                prices.setdefault(row.model_name, []).append(row)
+            cls._prices = prices
+            cls._stats["loads"] += 1
+
+
+def _as_utc(value: datetime) -> datetime:
+    # The DB columns are naive UTC.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
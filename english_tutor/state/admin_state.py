@@ -1,8 +1,104 @@
+from datetime import date, datetime, timedelta, timezone
 import reflex as rx
+import time
 
 from sqlmodel import select, func
+from ..agents.context_cache import context_cache
+from ..agents.governor import LLMGovernor, llm_user
+from ..agents.prompt_store import PromptStore, active_prompt_query
+from ..curriculum_cache import CurriculumCache
+from ..loop_monitor import LoopLagMonitor
 from ..models.content import AgentPrompt, Curriculum
-from ..models.token_usage import TokenUsage
+from ..models.token_usage import TokenUsage, TokenUsageRollup, UserDailyCost
+from ..persistence import arecord_usage
+from ..pricing import PriceTable
+from ..tracing import tracer
+from ..db import Database
+from ..db_manager import DBManager
+
+
+def usage_summary_query(since: datetime):
+    """Totals per (model, agent) from the daily rollups since `since`."""
+    return (
+        select(
+            TokenUsageRollup.model_name,
+            TokenUsageRollup.agent_name,
+            func.sum(TokenUsageRollup.turns),
+            func.sum(TokenUsageRollup.total_tokens),
+            func.sum(TokenUsageRollup.cached_prompt_tokens),
+            func.sum(TokenUsageRollup.cost),
+            func.sum(TokenUsageRollup.response_time_ms),
+        )
+        .where(TokenUsageRollup.granularity == "day")
+        .where(TokenUsageRollup.bucket >= since)
+        .group_by(TokenUsageRollup.model_name, TokenUsageRollup.agent_name)
+        .order_by(func.sum(TokenUsageRollup.cost).desc())
+    )
+
+
+def latency_stats_query(since: datetime):
+    """TTFT and end-to-end latency percentiles per (model, agent)."""
+
+    def pct(q: float, column):
+        return func.percentile_cont(q).within_group(column)
+
+    return (
+        select(
+            TokenUsage.model_name,
+            TokenUsage.agent_name,
+            func.count(),
+            pct(0.5, TokenUsage.ttft_ms),
+            pct(0.95, TokenUsage.ttft_ms),
+            pct(0.99, TokenUsage.ttft_ms),
+            pct(0.5, TokenUsage.response_time_ms),
+            pct(0.95, TokenUsage.response_time_ms),
+            pct(0.99, TokenUsage.response_time_ms),
+            func.avg(TokenUsage.db_ms),
+        )
+        .where(TokenUsage.created_at >= since)
+        .where(TokenUsage.ttft_ms > 0)
+        .group_by(TokenUsage.model_name, TokenUsage.agent_name)
+        .order_by(TokenUsage.model_name, TokenUsage.agent_name)
+    )
+
+
+def usage_rows_query(
+    page_size: int, model: str = "", agent: str = "", before_id: int | None = None
+):
+    """One drill-down page of raw usage rows (no message text), newest first."""
+    query = select(
+        TokenUsage.id,
+        TokenUsage.created_at,
+        TokenUsage.model_name,
+        TokenUsage.agent_name,
+        TokenUsage.user_id,
+        TokenUsage.total_tokens,
+        TokenUsage.estimated_cost,
+        TokenUsage.response_time_ms,
+    )
+    if model:
+        query = query.where(TokenUsage.model_name == model)
+        query = query.where(TokenUsage.agent_name == agent)
+    if before_id is not None:
+        query = query.where(TokenUsage.id < before_id)
+    return query.order_by(TokenUsage.id.desc()).limit(page_size + 1)
+
+
+def daily_costs_query(since: date):
+    return (
+        select(UserDailyCost)
+        .where(UserDailyCost.day >= since)
+        .order_by(UserDailyCost.day.desc(), UserDailyCost.cost.desc())
+        .limit(100)
+    )
+
+
+def prompt_history_query(agent_key: str):
+    return (
+        select(AgentPrompt)
+        .where(AgentPrompt.agent_name == agent_key)
+        .order_by(AgentPrompt.version.desc())
+    )
 
 
 class AdminState(rx.State):
@@ -21,11 +117,35 @@ class AdminState(rx.State):
     ] = []  # [{"role": "user", "content": "..."}, {"role": "agent", "content": "..."}]
     optimizer_input: str = ""
     is_optimizing: bool = False
+    OPTIMIZER_FLUSH_INTERVAL = 0.1
 
-    # Token usage tracking
-    token_usage_records: list[TokenUsage] = []
+    # Token usage tracking, read from TokenUsageRollup over the recent window
+    USAGE_WINDOW_DAYS = 30
     total_tokens: int = 0
     total_cost: float = 0.0
+    # Totals per (model, agent) for the window
+    usage_summary: list[dict[str, str]] = []
+    # Drill-down into raw TokenUsage rows, newest first, keyset-paginated by id
+    USAGE_PAGE_SIZE = 25
+    usage_rows: list[dict[str, str]] = []
+    usage_filter_model: str = ""
+    usage_filter_agent: str = ""
+    usage_page: int = 0
+    usage_has_more: bool = False
+    # Lowest id on each page visited; page N lists ids below _usage_cursors[N-1]
+    _usage_cursors: list[int] = []
+    # Per-user daily cost totals over the recent window, newest first
+    daily_costs: list[dict[str, str]] = []
+    COST_WINDOW_DAYS = 7
+    # Latency percentiles per (model, agent) over the recent window
+    latency_stats: list[dict[str, str]] = []
+    LATENCY_WINDOW_HOURS = 24
+
+    # In-process cache and runtime counters: [{"cache": ..., "stats": "k=v, ..."}]
+    cache_stats: list[dict[str, str]] = []
+
+    # Recent traces, flattened to one row per span for display
+    trace_rows: list[dict[str, str]] = []
 
     # Curriculum management
     curriculums: list[Curriculum] = []
@@ -37,22 +157,197 @@ class AdminState(rx.State):
     curriculum_learning_goals: str = ""
     curriculum_common_pitfalls: str = ""
 
-    def load_token_usage(self):
-        """Load recent token usage records."""
-        with rx.session() as session:
-            records = session.exec(
-                select(TokenUsage).order_by(TokenUsage.created_at.desc()).limit(100)
-            ).all()
-
-            self.token_usage_records = list(records)
-
-            # Calculate totals
-            total = session.exec(select(func.sum(TokenUsage.total_tokens))).first()
-
-            self.total_tokens = total or 0
+    async def load_token_usage(self):
+        """Load usage totals from the daily rollups and the first drill-down page."""
+        since = (
+            datetime.now(timezone.utc) - timedelta(days=self.USAGE_WINDOW_DAYS)
+        ).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+        async with Database.async_session() as session:
+            rows = (await session.exec(usage_summary_query(since))).all()
+
+        self.total_tokens = sum(row[3] or 0 for row in rows)
+        # Priced per turn at insert time, see persist_turn
+        self.total_cost = sum(row[5] or 0.0 for row in rows)
+        self.usage_summary = [
+            {
+                "model": model,
+                "agent": agent or "-",
+                "agent_key": agent,
+                "turns": str(turns),
+                "tokens": str(tokens),
+                "cached": str(cached),
+                "cost": f"${cost or 0:.4f}",
+                "avg_ms": str(int(response_ms / turns)) if turns else "0",
+            }
+            for model, agent, turns, tokens, cached, cost, response_ms in rows
+        ]
+
+        self.usage_filter_model = ""
+        self.usage_filter_agent = ""
+        self.usage_page = 0
+        self._usage_cursors = []
+        await self.load_usage_rows()
+
+        await self.load_daily_costs()
+        await self.load_latency_stats()
+        self.load_cache_stats()
+
+    async def load_latency_stats(self):
+        """Compute TTFT and end-to-end latency percentiles per model and agent."""
+        since = datetime.now(timezone.utc) - timedelta(hours=self.LATENCY_WINDOW_HOURS)
+        async with Database.async_session() as session:
+            rows = (await session.exec(latency_stats_query(since))).all()
+
+        self.latency_stats = [
+            {
+                "model": model,
+                "agent": agent or "-",
+                "count": str(count),
+                "ttft_p50": f"{ttft_p50:.0f}",
+                "ttft_p95": f"{ttft_p95:.0f}",
+                "ttft_p99": f"{ttft_p99:.0f}",
+                "total_p50": f"{total_p50:.0f}",
+                "total_p95": f"{total_p95:.0f}",
+                "total_p99": f"{total_p99:.0f}",
+                "db_avg": f"{db_avg or 0:.0f}",
+            }
+            for (
+                model,
+                agent,
+                count,
+                ttft_p50,
+                ttft_p95,
+                ttft_p99,
+                total_p50,
+                total_p95,
+                total_p99,
+                db_avg,
+            ) in rows
+        ]
+
+    async def load_usage_rows(self):
+        """Load the current drill-down page of raw usage rows (no message text)."""
+        query = usage_rows_query(
+            self.USAGE_PAGE_SIZE,
+            self.usage_filter_model,
+            self.usage_filter_agent,
+            self._usage_cursors[self.usage_page - 1] if self.usage_page else None,
+        )
+        async with Database.async_session() as session:
+            rows = (await session.exec(query)).all()
+
+        self.usage_has_more = len(rows) > self.USAGE_PAGE_SIZE
+        rows = rows[: self.USAGE_PAGE_SIZE]
+        if rows:
+            del self._usage_cursors[self.usage_page :]
+            self._usage_cursors.append(rows[-1][0])
+        self.usage_rows = [
+            {
+                "time": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "model": model,
+                "agent": agent,
+                "user_id": str(user_id),
+                "tokens": str(tokens),
+                "cost": f"${cost:.5f}",
+                "response_ms": str(response_ms),
+            }
+            for _, created_at, model, agent, user_id, tokens, cost, response_ms in rows
+        ]
+
+    async def drill_down(self, model: str, agent: str):
+        """Show only the raw rows of one (model, agent) summary line."""
+        self.usage_filter_model = model
+        self.usage_filter_agent = agent
+        self.usage_page = 0
+        self._usage_cursors = []
+        await self.load_usage_rows()
+
+    async def clear_drill_down(self):
+        await self.drill_down("", "")
+
+    async def next_usage_page(self):
+        if self.usage_has_more:
+            self.usage_page += 1
+            await self.load_usage_rows()
+
+    async def prev_usage_page(self):
+        if self.usage_page:
+            self.usage_page -= 1
+            await self.load_usage_rows()
+
+    async def load_daily_costs(self):
+        """Per-user cost per day for the last COST_WINDOW_DAYS days."""
+        now = datetime.now(timezone.utc)
+        since = (now - timedelta(days=self.COST_WINDOW_DAYS)).date()
+        async with Database.async_session() as session:
+            rows = (await session.exec(daily_costs_query(since))).all()
+        self.daily_costs = [
+            {
+                "day": str(row.day),
+                "user_id": str(row.user_id),
+                "turns": str(row.turns),
+                "tokens": str(row.total_tokens),
+                "cached": str(row.cached_prompt_tokens),
+                "cost": f"${row.cost:.4f}",
+            }
+            for row in rows
+        ]
+
+    def load_cache_stats(self):
+        """Snapshot counters of the in-process caches and the event loop."""
+        from ..agents.blocking import BlockingPool
+        from ..agents.registry import AgentRegistry
+        from ..agents.router import ModelRouter
+        from ..write_behind import WriteBehindQueue
+
+        caches = {
+            "Agent registry": AgentRegistry.stats(),
+            "Prompt store": PromptStore.stats(),
+            "Context cache": context_cache.stats(),
+            "Curriculum cache": CurriculumCache.stats(),
+            "Price table": PriceTable.stats(),
+            "Event loop lag (ms)": LoopLagMonitor.stats(),
+            "Blocking LLM pool": BlockingPool.stats(),
+            "DB startup": DBManager.stats(),
+            "DB pool": Database.stats(),
+            "Async DB pool": Database.async_stats(),
+            "Write-behind queue": WriteBehindQueue.stats(),
+            "Model routes": {
+                route.task: route.model for route in ModelRouter.routes()
+            },
+            **{
+                f"Rate limiter {model}": stats
+                for model, stats in LLMGovernor.stats().items()
+            },
+        }
+        self.cache_stats = [
+            {"cache": name, "stats": ", ".join(f"{k}={v}" for k, v in stats.items())}
+            for name, stats in caches.items()
+        ]
+
+    def load_traces(self):
+        """Load the most recent traces from the in-memory span buffer."""
+        buffer = tracer.ring_buffer()
+        if buffer is None:
+            self.trace_rows = []
+            return
 
-            # Estimate cost (example: $0.001 per 1000 tokens)
-            self.total_cost = (self.total_tokens / 1000) * 0.001
+        rows = []
+        for spans in buffer.recent_traces(limit=20):
+            depth: dict[int, int] = {}
+            trace_start = spans[0]["start"]
+            for s in spans:
+                depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1
+                rows.append({
+                    "trace": str(s["trace_id"]),
+                    "root": "1" if s["parent_id"] is None else "",
+                    "name": "\u00a0\u00a0" * depth[s["span_id"]] + s["name"],
+                    "offset_ms": f"{(s['start'] - trace_start) * 1000:.1f}",
+                    "duration_ms": f"{s['duration_ms']:.1f}",
+                    "attrs": ", ".join(f"{k}={v}" for k, v in s["attrs"].items()),
+                    "error": s["error"],
+                })
+        self.trace_rows = rows
 
     # Mapping between UI labels and internal keys/file paths
     AGENT_CONFIG = {
@@ -76,13 +371,13 @@ class AdminState(rx.State):
         },
     }
 
-    def set_selected_agent(self, agent_name: str):
+    async def set_selected_agent(self, agent_name: str):
         """Set the selected agent and load its current prompt."""
         self.selected_agent = agent_name
-        self.load_current_prompt()
-        self.load_prompt_history()
+        await self.load_current_prompt()
+        await self.load_prompt_history()
 
-    def load_current_prompt(self):
+    async def load_current_prompt(self):
         """Load the active prompt for the selected agent."""
         if not self.selected_agent:
             return
@@ -93,13 +388,8 @@ class AdminState(rx.State):
 
         agent_key = config["key"]
 
-        with rx.session() as session:
-            prompt = session.exec(
-                select(AgentPrompt)
-                .where(AgentPrompt.agent_name == agent_key)
-                .where(AgentPrompt.is_active == True)
-                .order_by(AgentPrompt.version.desc())
-            ).first()
+        async with Database.async_session() as session:
+            prompt = (await session.exec(active_prompt_query(agent_key))).first()
 
             if prompt:
                 self.current_prompt_text = prompt.prompt_text
@@ -116,7 +406,7 @@ class AdminState(rx.State):
                     self.current_prompt_text = ""
                     self.original_prompt_text = ""
 
-    def load_prompt_history(self):
+    async def load_prompt_history(self):
         """Load all versions of prompts for the selected agent."""
         if not self.selected_agent:
             return
@@ -127,12 +417,8 @@ class AdminState(rx.State):
 
         agent_key = config["key"]
 
-        with rx.session() as session:
-            prompts = session.exec(
-                select(AgentPrompt)
-                .where(AgentPrompt.agent_name == agent_key)
-                .order_by(AgentPrompt.version.desc())
-            ).all()
+        async with Database.async_session() as session:
+            prompts = (await session.exec(prompt_history_query(agent_key))).all()
 
             self.prompt_history = list(prompts)
 
@@ -140,7 +426,7 @@ class AdminState(rx.State):
         """Update the current prompt text being edited."""
         self.current_prompt_text = text
 
-    def save_prompt(self):
+    async def save_prompt(self):
         """Save the current prompt as a new version."""
         if not self.selected_agent or not self.current_prompt_text:
             return
@@ -151,24 +437,24 @@ class AdminState(rx.State):
 
         agent_key = config["key"]
 
-        with rx.session() as session:
+        async with Database.async_session() as session:
             # Deactivate all previous versions
-            old_prompts = session.exec(
+            old_prompts = (await session.exec(
                 select(AgentPrompt)
                 .where(AgentPrompt.agent_name == agent_key)
                 .where(AgentPrompt.is_active == True)
-            ).all()
+            )).all()
 
             for old_prompt in old_prompts:
                 old_prompt.is_active = False
                 session.add(old_prompt)
 
             # Get the next version number
-            max_version = session.exec(
+            max_version = (await session.exec(
                 select(AgentPrompt.version)
                 .where(AgentPrompt.agent_name == agent_key)
                 .order_by(AgentPrompt.version.desc())
-            ).first()
+            )).first()
 
             next_version = (max_version or 0) + 1
 
@@ -181,14 +467,17 @@ class AdminState(rx.State):
             )
 
             session.add(new_prompt)
-            session.commit()
+            await session.commit()
+
+        PromptStore.invalidate(agent_key)
+        context_cache.invalidate(agent_key=agent_key)
 
         # Reload history
-        self.load_prompt_history()
+        await self.load_prompt_history()
 
         return rx.toast.success(f"Saved {self.selected_agent} prompt v{next_version}")
 
-    def restore_version(self, version: int):
+    async def restore_version(self, version: int):
         """Restore a previous version as the active prompt."""
         if not self.selected_agent:
             return
@@ -199,21 +488,24 @@ class AdminState(rx.State):
 
         agent_key = config["key"]
 
-        with rx.session() as session:
+        async with Database.async_session() as session:
             # Deactivate all versions
-            all_prompts = session.exec(
+            all_prompts = (await session.exec(
                 select(AgentPrompt).where(AgentPrompt.agent_name == agent_key)
-            ).all()
+            )).all()
 
             for prompt in all_prompts:
                 prompt.is_active = prompt.version == version
                 session.add(prompt)
 
-            session.commit()
+            await session.commit()
+
+        PromptStore.invalidate(agent_key)
+        context_cache.invalidate(agent_key=agent_key)
 
         # Reload
-        self.load_current_prompt()
-        self.load_prompt_history()
+        await self.load_current_prompt()
+        await self.load_prompt_history()
 
         return rx.toast.success(f"Restored version {version}")
 
@@ -246,15 +538,14 @@ class AdminState(rx.State):
         self.is_optimizing = True
         yield
 
+        usage: dict = {}
         try:
-            from ..agents.orchestrator import Orchestrator
+            from ..agents.orchestrator import orchestrator
             from ..models.user import Session
 
-            orch = Orchestrator()
-
             # Use onboarding agent for meta-prompting tasks
             temp_session = Session(id=0, user_id=0, session_type="onboarding")
-            agent = orch.get_agent_for_session(temp_session)
+            agent = orchestrator.get_agent_for_session(temp_session)
 
             system_meta_prompt = f"""You are a Prompt Engineering Expert. 
 Your task is to help the user improve an LLM system prompt for an English Tutoring app.
@@ -273,51 +564,75 @@ Response only with the improved prompt content or very brief explanation."""
 
             messages = [{"sender": "user", "content_text": system_meta_prompt}]
 
-            response_text, _ = agent.get_response(messages)
-
-            self.optimizer_history.append({"role": "agent", "content": response_text})
+            # Stream the suggestion into a placeholder entry, flushing to the
+            # client in batches rather than per chunk.
+            self.optimizer_history.append({"role": "agent", "content": ""})
+            response_text = ""
+            last_flush = time.monotonic()
+            llm_user.set("admin")
+            async for chunk_text, meta in agent.stream_response(
+                messages, task="optimize"
+            ):
+                if meta:
+                    usage = meta
+                response_text += chunk_text
+                if time.monotonic() - last_flush >= self.OPTIMIZER_FLUSH_INTERVAL:
+                    self.optimizer_history[-1] = {
+                        "role": "agent",
+                        "content": response_text,
+                    }
+                    last_flush = time.monotonic()
+                    yield
+
+            self.optimizer_history[-1] = {"role": "agent", "content": response_text}
         except Exception as e:
+            if self.optimizer_history and not self.optimizer_history[-1]["content"]:
+                self.optimizer_history.pop()
             yield rx.toast.error(f"Optimization failed: {str(e)}")
         finally:
             self.is_optimizing = False
 
+        if usage:
+            # Admin calls have no chat session; they are accounted to user 0.
+            try:
+                await arecord_usage(0, 0, user_req, response_text, usage)
+            except Exception as e:
+                print(f"Failed to record optimizer usage: {e}")
+
     def apply_optimized_prompt(self, text: str):
         """Apply the suggested prompt to the main text area."""
         self.current_prompt_text = text
         self.show_optimizer = False
         return rx.toast.success("AI suggested prompt applied!")
 
-    def load_curriculums(self):
+    async def load_curriculums(self):
         """Load all curriculum records."""
-        with rx.session() as session:
-            self.curriculums = session.exec(
+        async with Database.async_session() as session:
+            self.curriculums = (await session.exec(
                 select(Curriculum).order_by(Curriculum.level)
-            ).all()
+            )).all()
             if not self.curriculums:
                 # Initialize empty if none exist
                 pass
 
-    def select_curriculum_level(self, level: int):
+    async def select_curriculum_level(self, level: int):
         """Select a level to edit."""
         self.selected_level = level
-        with rx.session() as session:
-            cur = session.exec(
-                select(Curriculum).where(Curriculum.level == level)
-            ).first()
-            if cur:
-                self.edit_curriculum_id = cur.id
-                self.curriculum_title = cur.title
-                self.curriculum_description = cur.description
-                self.curriculum_base_content = cur.base_content
-                self.curriculum_learning_goals = cur.learning_goals
-                self.curriculum_common_pitfalls = cur.common_pitfalls
-            else:
-                self.edit_curriculum_id = None
-                self.curriculum_title = f"Level {level}"
-                self.curriculum_description = ""
-                self.curriculum_base_content = ""
-                self.curriculum_learning_goals = ""
-                self.curriculum_common_pitfalls = ""
+        cur = await CurriculumCache.aget(level)
+        if cur:
+            self.edit_curriculum_id = cur["id"]
+            self.curriculum_title = cur["title"]
+            self.curriculum_description = cur["description"]
+            self.curriculum_base_content = cur["base_content"]
+            self.curriculum_learning_goals = cur["learning_goals"]
+            self.curriculum_common_pitfalls = cur["common_pitfalls"]
+        else:
+            self.edit_curriculum_id = None
+            self.curriculum_title = f"Level {level}"
+            self.curriculum_description = ""
+            self.curriculum_base_content = ""
+            self.curriculum_learning_goals = ""
+            self.curriculum_common_pitfalls = ""
 
     def set_curriculum_field(self, field: str, value: str):
         if field == "title":
@@ -331,15 +646,15 @@ Response only with the improved prompt content or very brief explanation."""
         elif field == "pitfalls":
             self.curriculum_common_pitfalls = value
 
-    def save_curriculum(self):
+    async def save_curriculum(self):
         """Save or update curriculum for the selected level."""
-        with rx.session() as session:
+        async with Database.async_session() as session:
             if self.edit_curriculum_id:
-                cur = session.get(Curriculum, self.edit_curriculum_id)
+                cur = await session.get(Curriculum, self.edit_curriculum_id)
             else:
-                cur = session.exec(
+                cur = (await session.exec(
                     select(Curriculum).where(Curriculum.level == self.selected_level)
-                ).first()
+                )).first()
 
             if not cur:
                 cur = Curriculum(level=self.selected_level)
@@ -351,7 +666,9 @@ Response only with the improved prompt content or very brief explanation."""
             cur.common_pitfalls = self.curriculum_common_pitfalls
 
             session.add(cur)
-            session.commit()
+            await session.commit()
 
-        self.load_curriculums()
+        CurriculumCache.invalidate(self.selected_level)
+        context_cache.invalidate(level=self.selected_level)
+        await self.load_curriculums()
         return rx.toast.success(f"Curriculum for Level {self.selected_level} saved!")
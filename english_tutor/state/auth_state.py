@@ -1,5 +1,6 @@
 import reflex as rx
 from ..models.user import User
+from ..db import Database
 
 
 class AuthState(rx.State):
@@ -16,10 +17,10 @@ class AuthState(rx.State):
     def set_password(self, password: str):
         self.password = password
 
-    def login(self):
-        with rx.session() as session:
-            user = session.exec(
-                User.select.where(User.username == self.username)
+    async def login(self):
+        async with Database.async_session() as session:
+            user = (
+                await session.exec(User.select.where(User.username == self.username))
             ).first()
             if user and user.password_hash == self.password:  # Simple check for now
                 self.is_authenticated = True
@@ -28,10 +29,10 @@ class AuthState(rx.State):
             else:
                 self.error_message = "Invalid username or password"
 
-    def signup(self):
-        with rx.session() as session:
-            existing = session.exec(
-                User.select.where(User.username == self.username)
+    async def signup(self):
+        async with Database.async_session() as session:
+            existing = (
+                await session.exec(User.select.where(User.username == self.username))
             ).first()
             if existing:
                 self.error_message = "Username already exists"
@@ -39,7 +40,7 @@ class AuthState(rx.State):
 
             new_user = User(username=self.username, password_hash=self.password)
             session.add(new_user)
-            session.commit()
+            await session.commit()
             self.is_authenticated = True
             return rx.redirect("/chat")
 
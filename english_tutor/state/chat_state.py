@@ -1,21 +1,178 @@
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timezone
 import reflex as rx
+import time
 
-from sqlmodel import select
-from ..agents.orchestrator import Orchestrator
+from sqlalchemy import tuple_
+from sqlmodel import select, func
+from ..agents.governor import llm_user
+from ..agents.orchestrator import orchestrator
 from ..models.evaluation import Message
 from ..models.user import Session, User
-from ..models.content import Curriculum
+from ..curriculum_cache import CurriculumCache
+from ..persistence import apersist_turn, arecord_usage
+from ..tracing import span
+from ..db import Database
+
+# Title generation reads only the start of a conversation.
+TITLE_MESSAGE_LIMIT = 6
+TITLE_SNIPPET_CHARS = 400
+# Don't retry a session's title more often than this (seconds).
+TITLE_DEBOUNCE_SECONDS = 300.0
+# Most sessions tracked for debouncing; the oldest attempts are forgotten first.
+TITLE_ATTEMPTS_MAX = 10_000
+# session_id -> monotonic time of the last title generation attempt, oldest
+# first. Entries go once the title is saved or the debounce window has passed.
+_title_attempts: OrderedDict[int, float] = OrderedDict()
+# Messages rendered per page of chat history.
+MESSAGE_PAGE_SIZE = 30
+# Sessions listed per page of the sidebar.
+SESSION_PAGE_SIZE = 30
+
+SCROLL_TO_BOTTOM = (
+    "var el = document.getElementById('scroll-anchor');"
+    " if (el) el.scrollIntoView({ behavior: 'smooth' });"
+)
+# Click the "load older" button whenever it scrolls into view.
+OBSERVE_LOAD_OLDER = (
+    "var b = document.getElementById('load-older');"
+    " if (b && !b._observed) { b._observed = true;"
+    " new IntersectionObserver(function (e) {"
+    " if (e[0].isIntersecting) b.click(); }).observe(b); }"
+)
+OBSERVE_LOAD_MORE_SESSIONS = OBSERVE_LOAD_OLDER.replace(
+    "load-older", "load-more-sessions"
+)
+
+
+def _message_dict(sender: str, content_text: str, created_at: datetime | None):
+    return {
+        "sender": sender,
+        "content_text": content_text,
+        "created_at": created_at.strftime("%H:%M") if created_at else "",
+    }
+
+
+def message_page_query(
+    session_id: int, before: tuple[datetime, int] | None = None
+):
+    """Newest-first page of a session's messages older than `before`."""
+    query = select(
+        Message.id, Message.sender, Message.content_text, Message.created_at
+    ).where(Message.session_id == session_id)
+    if before is not None:
+        query = query.where(tuple_(Message.created_at, Message.id) < before)
+    return query.order_by(Message.created_at.desc(), Message.id.desc()).limit(
+        MESSAGE_PAGE_SIZE + 1
+    )
+
+
+async def message_page(
+    db_session, session_id: int, before: tuple[datetime, int] | None = None
+) -> tuple[list, bool]:
+    """Up to MESSAGE_PAGE_SIZE messages older than `before`, oldest first.
+
+    Keyset pagination on (created_at, id); returns the rows and whether
+    older messages remain.
+    """
+    rows = (await db_session.exec(message_page_query(session_id, before))).all()
+    has_older = len(rows) > MESSAGE_PAGE_SIZE
+    rows = list(rows[:MESSAGE_PAGE_SIZE])
+    rows.reverse()
+    return rows, has_older
+
+
+def _session_dict(
+    session_id: int, title: str | None, session_type: str, updated_at: datetime
+) -> dict[str, str]:
+    return {
+        "id": str(session_id),
+        "title": title or "",
+        "session_type": session_type,
+        "updated_at": updated_at.isoformat() if updated_at else "",
+    }
+
+
+def session_page_query(user_id: int, before: tuple[datetime, int] | None = None):
+    """Newest-first page of the user's live sessions after `before`."""
+    query = (
+        select(Session.id, Session.title, Session.session_type, Session.updated_at)
+        .where(Session.user_id == user_id)
+        .where(Session.is_deleted == False)
+    )
+    if before is not None:
+        query = query.where(tuple_(Session.updated_at, Session.id) < before)
+    return query.order_by(Session.updated_at.desc(), Session.id.desc()).limit(
+        SESSION_PAGE_SIZE + 1
+    )
+
+
+async def session_page(
+    db_session, user_id: int, before: tuple[datetime, int] | None = None
+) -> tuple[list, bool]:
+    """Up to SESSION_PAGE_SIZE of the user's live sessions, newest first.
+
+    Selects only the sidebar columns; keyset pagination on (updated_at, id).
+    Returns the rows and whether more remain.
+    """
+    rows = (await db_session.exec(session_page_query(user_id, before))).all()
+    return list(rows[:SESSION_PAGE_SIZE]), len(rows) > SESSION_PAGE_SIZE
+
+
+def pending_context_query(session_id: int, summarized_count: int):
+    return (
+        select(Message.sender, Message.content_text)
+        .where(Message.session_id == session_id)
+        .order_by(Message.created_at, Message.id)
+        .offset(summarized_count)
+    )
+
+
+async def pending_context(
+    db_session, session_id: int, summarized_count: int
+) -> list[dict[str, str]]:
+    """The session's messages not yet folded into its context summary."""
+    rows = (
+        await db_session.exec(pending_context_query(session_id, summarized_count))
+    ).all()
+    return [
+        {"sender": sender, "content_text": content_text}
+        for sender, content_text in rows
+    ]
+
+
+def title_snippets_query(session_id: int):
+    """The first messages of a session, truncated, for title generation."""
+    return (
+        select(
+            Message.sender,
+            func.substr(Message.content_text, 1, TITLE_SNIPPET_CHARS),
+        )
+        .where(Message.session_id == session_id)
+        .order_by(Message.created_at, Message.id)
+        .limit(TITLE_MESSAGE_LIMIT)
+    )
 
 
 class ChatState(rx.State):
     """The state for the chat interface."""
 
+    # Rendered history: the latest page plus any older pages scrolled into.
     messages: list[dict[str, str]] = []
+    has_older_messages: bool = False
     input_text: str = ""
     is_recording: bool = False
     is_processing: bool = False
 
+    # In-flight agent reply. Streamed into this small var instead of `messages`
+    # so each flush sends a short string delta rather than the whole history.
+    streaming_text: str = ""
+    is_streaming: bool = False
+
+    # Coalesce streamed chunks: flush at most every 50 ms or 200 characters.
+    STREAM_FLUSH_INTERVAL = 0.05
+    STREAM_FLUSH_CHARS = 200
+
     def set_input_text(self, text: str):
         self.input_text = text
 
@@ -24,20 +181,43 @@ class ChatState(rx.State):
             async for event in self.send_message():
                 yield event
 
-    # Session info
-    sessions: list[Session] = []
+    # Session info: sidebar rows (id, title, session_type, updated_at),
+    # paged in as the sidebar scrolls and updated in place afterwards.
+    sessions: list[dict[str, str]] = []
+    has_more_sessions: bool = False
+    # (updated_at, id) of the last session page read from the DB
+    _sessions_cursor: tuple[datetime, int] | None = None
     current_session_id: int = (
         0  # 0 or None indicates no session selected/new session needed
     )
     user_id: int = 1
     current_agent: str = "onboarding"
 
+    # Rolling context summary of the current session (backend only)
+    _context_summary: str = ""
+    _summarized_count: int = 0
+    # Messages after the summarized prefix, loaded from the DB: the LLM
+    # context, independent of which pages are rendered.
+    _context: list[dict[str, str]] = []
+    # (created_at, id) of the oldest rendered message
+    _older_cursor: tuple[datetime, int] | None = None
+    # Learner level, loaded once per session; 0 means not loaded yet.
+    # Reset on session switch so level promotions are picked up.
+    _user_level: int = 0
+
+    async def _get_user_level(self) -> int:
+        if not self._user_level:
+            async with Database.async_session() as db_session:
+                user = await db_session.get(User, self.user_id)
+                self._user_level = user.current_level if user else 1
+        return self._user_level
+
     # Delete session state
     confirm_dialog_open: bool = False
     session_to_delete: int | None = None
 
-    def ask_delete_session(self, session_id: int):
-        self.session_to_delete = session_id
+    def ask_delete_session(self, session_id: int | str):
+        self.session_to_delete = int(session_id)
         self.confirm_dialog_open = True
 
     def cancel_delete_session(self):
@@ -45,161 +225,244 @@ class ChatState(rx.State):
         self.session_to_delete = None
 
     async def confirm_delete_session(self):
-        if self.session_to_delete:
-            with rx.session() as db_session:
-                session = db_session.get(Session, self.session_to_delete)
-                if session:
-                    session.is_deleted = True
-                    db_session.add(session)
-                    db_session.commit()
-
-            # Refresh list
-            self.load_sessions()
-            
-            # If we deleted the current session, switch to another or new
-            if self.current_session_id == self.session_to_delete:
-                if self.sessions:
-                    await self.select_session(self.sessions[0].id)
-                else:
-                    await self.create_new_session()
-            
+        session_id = self.session_to_delete
         self.confirm_dialog_open = False
         self.session_to_delete = None
+        if not session_id:
+            return
 
-    def load_sessions(self):
-        """Load all sessions for the current user."""
-        with rx.session() as session:
-            self.sessions = session.exec(
-                select(Session)
-                .where(Session.user_id == self.user_id)
-                .where(Session.is_deleted == False)
-                .order_by(Session.updated_at.desc())
-            ).all()
-        # If no sessions, create one? Or wait for user.
-        if self.sessions and self.current_session_id == 0:
-            self.select_session(self.sessions[0].id)
-        elif not self.sessions and self.current_session_id == 0:
-            self.create_new_session()
+        async with Database.async_session() as db_session:
+            session = await db_session.get(Session, session_id)
+            if session:
+                session.is_deleted = True
+                db_session.add(session)
+                await db_session.commit()
+
+        self.sessions = [s for s in self.sessions if s["id"] != str(session_id)]
+
+        # If we deleted the current session, switch to another or new
+        if self.current_session_id == session_id:
+            if self.sessions:
+                return ChatState.select_session(self.sessions[0]["id"])
+            return ChatState.create_new_session()
+
+    async def load_sessions(self):
+        """Load the first page of the user's sessions into the sidebar."""
+        with span("db.load_sessions"):
+            async with Database.async_session() as db_session:
+                rows, self.has_more_sessions = await session_page(
+                    db_session, self.user_id
+                )
+        self.sessions = [_session_dict(*row) for row in rows]
+        self._sessions_cursor = (rows[-1].updated_at, rows[-1].id) if rows else None
+        if self.current_session_id == 0:
+            if self.sessions:
+                return ChatState.select_session(self.sessions[0]["id"])
+            return ChatState.create_new_session()
+        return ChatState.observe_session_list
+
+    async def load_more_sessions(self):
+        """Append the next page of sessions (sidebar infinite scroll)."""
+        if not self.has_more_sessions or self._sessions_cursor is None:
+            return
+        with span("db.load_sessions", page="next"):
+            async with Database.async_session() as db_session:
+                rows, has_more = await session_page(
+                    db_session, self.user_id, self._sessions_cursor
+                )
+        loaded = {s["id"] for s in self.sessions}
+        self.sessions = self.sessions + [
+            _session_dict(*row) for row in rows if str(row.id) not in loaded
+        ]
+        self.has_more_sessions = has_more
+        if rows:
+            self._sessions_cursor = (rows[-1].updated_at, rows[-1].id)
+        return ChatState.observe_session_list
+
+    def observe_session_list(self):
+        return rx.call_script(OBSERVE_LOAD_MORE_SESSIONS)
+
+    def _update_session_row(self, session_id: int, **changes):
+        """Change one sidebar row in place; `updated_at` moves it to the top."""
+        key = str(session_id)
+        for i, row in enumerate(self.sessions):
+            if row["id"] == key:
+                row = {**row, **changes}
+                before, after = self.sessions[:i], self.sessions[i + 1 :]
+                if "updated_at" in changes:
+                    self.sessions = [row] + before + after
+                else:
+                    self.sessions = before + [row] + after
+                return
 
+    def _schedule_title(self, session_id: int):
+        """Event that generates the session title in the background (debounced).
+
+        Returns None if this session was already attempted recently, so
+        switching back and forth does not re-trigger the LLM call.
+        """
+        now = time.monotonic()
+        while _title_attempts and (
+            len(_title_attempts) >= TITLE_ATTEMPTS_MAX
+            or now - next(iter(_title_attempts.values())) >= TITLE_DEBOUNCE_SECONDS
+        ):
+            _title_attempts.popitem(last=False)
+        if session_id in _title_attempts:
+            return None
+        _title_attempts[session_id] = now
+        return ChatState.generate_title_for_session(session_id)
+
+    @rx.event(background=True)
     async def generate_title_for_session(self, session_id: int):
         """Generate a title for the session if it doesn't have one."""
-        with rx.session() as db_session:
-            session = db_session.get(Session, session_id)
-            if not session or session.title:
-                return
+        with span("generate_title", session_id=session_id):
+            async with Database.async_session() as db_session:
+                with span("db.get", row="session"):
+                    row = (
+                        await db_session.exec(
+                            select(Session.id, Session.title).where(
+                                Session.id == session_id
+                            )
+                        )
+                    ).first()
+                if not row or row[1]:
+                    _title_attempts.pop(session_id, None)
+                    return
 
-            yield
-            # Get messages to summarize
-            msgs = db_session.exec(
-                select(Message)
-                .where(Message.session_id == session_id)
-                .order_by(Message.created_at)
-            ).all()
+                # Only the first few messages, truncated by the DB
+                with span("db.load_messages"):
+                    msgs = (
+                        await db_session.exec(title_snippets_query(session_id))
+                    ).all()
 
             if not msgs:
+                # Nothing to summarize yet; allow a retry once messages exist.
+                _title_attempts.pop(session_id, None)
                 return
 
-            # Simple summarization prompt
-            # Limit to first 2000 chars to save tokens
-            conversation_text = "\n".join([
-                f"{m.sender}: {m.content_text}" for m in msgs
-            ])
-            if len(conversation_text) > 2000:
-                conversation_text = conversation_text[:2000] + "..."
-
-        try:
-            orch = Orchestrator()
-            # We can reuse an agent or ask orchestrator for a summarizer
-            # For simplicity, we'll ask a generic agent or the current one (if stateless enough)
-            # Actually, Orchestrator might not have a direct 'summarize' method.
-            # We can just prompt the current agent type.
-
-            # Ideally: orch.get_summarizer()...
-            # Or just use the 'onboarding' agent for utility tasks?
-            # Let's use the current agent loop or a new utility request.
-            # "Please summarize this conversation in 3-5 words for a title."
-
-            # We need to construct a prompt.
-            # Since agents are chat-based, we can try to instantiate a temporary agent.
-            # Assuming 'onboarding' is safe.
-            temp_session = Session(
-                session_id=session_id, user_id=self.user_id, session_type="onboarding"
-            )
-            agent = orch.get_agent_for_session(temp_session)
-
-            summary_prompt = [
-                {
-                    "sender": "user",
-                    "content_text": f"Summarize the following conversation into a short title (max 5 words). Return ONLY the title, no quotes.\n\n{conversation_text}",
-                }
-            ]
-            title, _ = agent.get_response(
-                summary_prompt
-            )  # Unpack tuple, ignore metadata
-            title = title.strip().strip('"')
-
-            with rx.session() as db_session:
-                session = db_session.get(Session, session_id)
-                if session:
-                    session.title = title
-                    db_session.add(session)
-                    db_session.commit()
-
-            # Refresh sessions list to show new title
-            self.load_sessions()
-            yield
+            conversation_text = "\n".join(f"{sender}: {text}" for sender, text in msgs)
+
+            try:
+                # Use the 'onboarding' agent for this utility request.
+                agent = orchestrator.get_agent("onboarding")
+
+                summary_prompt = [
+                    {
+                        "sender": "user",
+                        "content_text": f"Summarize the following conversation into a short title (max 5 words). Return ONLY the title, no quotes.\n\n{conversation_text}",
+                    }
+                ]
+                with span("llm.title"):
+                    llm_user.set(str(self.user_id))
+                    title, usage = await agent.aget_response(
+                        summary_prompt, task="title"
+                    )
+                title = title.strip().strip('"')
+
+                with span("db.save_title"):
+                    async with Database.async_session() as db_session:
+                        session = await db_session.get(Session, session_id)
+                        if session:
+                            session.title = title
+                            db_session.add(session)
+                            await db_session.commit()
+                _title_attempts.pop(session_id, None)
+
+                # Show the new title in the sidebar
+                async with self:
+                    self._update_session_row(session_id, title=title)
+
+                await arecord_usage(
+                    session_id, self.user_id, conversation_text, title, usage
+                )
 
-        except Exception as e:
-            print(f"Failed to generate title: {e}")
+            except Exception as e:
+                print(f"Failed to generate title: {e}")
 
     async def create_new_session(self, session_type: str = "onboarding"):
         """Create a new chat session."""
         if self.current_session_id:
-            async for _ in self.generate_title_for_session(self.current_session_id):
-                yield
+            yield self._schedule_title(self.current_session_id)
 
-        with rx.session() as db_session:
+        async with Database.async_session() as db_session:
             new_session = Session(user_id=self.user_id, session_type=session_type)
             db_session.add(new_session)
-            db_session.commit()
-            db_session.refresh(new_session)
+            await db_session.commit()
+            await db_session.refresh(new_session)
             self.current_session_id = new_session.id
-            self.load_sessions()
+            self.sessions = [
+                _session_dict(
+                    new_session.id,
+                    new_session.title,
+                    new_session.session_type,
+                    new_session.updated_at,
+                )
+            ] + self.sessions
             self.messages = []
-
-    async def select_session(self, session_id: int):
+            self.has_older_messages = False
+            self._older_cursor = None
+            self._context = []
+            self._context_summary = ""
+            self._summarized_count = 0
+            self._user_level = 0
+
+    async def select_session(self, session_id: int | str):
         """Select a session and load its messages."""
-        if self.current_session_id and self.current_session_id != session_id:
-            async for _ in self.generate_title_for_session(self.current_session_id):
-                yield
-
-        self.current_session_id = session_id
-        self.messages = []
-        with rx.session() as db_session:
-            msgs = db_session.exec(
-                select(Message)
-                .where(Message.session_id == session_id)
-                .order_by(Message.created_at)
-            ).all()
-            for m in msgs:
-                self.messages.append({
-                    "sender": m.sender,
-                    "content_text": m.content_text,
-                    "created_at": m.created_at.strftime("%H:%M")
-                    if m.created_at
-                    else "",
-                })
-        # Scroll to bottom after loading
-        async for _ in self.scroll_to_bottom():
-            yield
+        session_id = int(session_id)
+        with span("select_session", session_id=session_id):
+            if self.current_session_id and self.current_session_id != session_id:
+                yield self._schedule_title(self.current_session_id)
+
+            self.current_session_id = session_id
+            with span("db.load_messages"):
+                async with Database.async_session() as db_session:
+                    session = await db_session.get(Session, session_id)
+                    self._context_summary = session.context_summary if session else ""
+                    self._summarized_count = session.summarized_count if session else 0
+                    self._user_level = 0
+                    rows, self.has_older_messages = await message_page(
+                        db_session, session_id
+                    )
+                    with span("db.load_context"):
+                        self._context = await pending_context(
+                            db_session, session_id, self._summarized_count
+                        )
+            self.messages = [
+                _message_dict(r.sender, r.content_text, r.created_at) for r in rows
+            ]
+            self._older_cursor = (rows[0].created_at, rows[0].id) if rows else None
+            # Scroll to bottom after loading
+            with span("state_sync"):
+                async for _ in self.scroll_to_bottom():
+                    yield
+                yield rx.call_script(OBSERVE_LOAD_OLDER)
+                yield rx.call_script(OBSERVE_LOAD_MORE_SESSIONS)
+
+    async def load_older_messages(self):
+        """Prepend the page of messages before the oldest rendered one."""
+        if not self.has_older_messages or self._older_cursor is None:
+            return
+        session_id = self.current_session_id
+        with span("db.load_older_messages", session_id=session_id):
+            async with Database.async_session() as db_session:
+                rows, has_older = await message_page(
+                    db_session, session_id, self._older_cursor
+                )
+        if session_id != self.current_session_id or not rows:
+            return
+        self.messages = [
+            _message_dict(r.sender, r.content_text, r.created_at) for r in rows
+        ] + self.messages
+        self.has_older_messages = has_older
+        self._older_cursor = (rows[0].created_at, rows[0].id)
+        yield
+        yield rx.call_script(OBSERVE_LOAD_OLDER)
 
     async def scroll_to_bottom(self):
         """Scroll to the bottom of the chat."""
         # Yield to let UI update first
         yield
-        yield rx.call_script(
-            "var el = document.getElementById('scroll-anchor'); if (el) el.scrollIntoView({ behavior: 'smooth' });"
-        )
+        yield rx.call_script(SCROLL_TO_BOTTOM)
 
     async def send_message(self):
         if not self.input_text:
@@ -214,6 +477,7 @@ class ChatState(rx.State):
         self.input_text = ""
 
         # Add user message
+        sent_at = datetime.now(timezone.utc)
         timestamp = datetime.now().strftime("%H:%M")
         new_msg = {
             "sender": "user",
@@ -221,118 +485,190 @@ class ChatState(rx.State):
             "created_at": timestamp,
         }
         self.messages.append(new_msg)
+        # Unsaved turns are dropped from the context again if they fail.
+        context_len = len(self._context)
+        self._context.append({"sender": "user", "content_text": current_text})
 
         # Process with Orchestrator
         self.is_processing = True
         yield
-        yield rx.call_script(
-            "var el = document.getElementById('scroll-anchor'); if (el) el.scrollIntoView({ behavior: 'smooth' });"
-        )
-
-        try:
-            import time
-            from ..models.token_usage import TokenUsage
-
-            orch = Orchestrator()
-            session = Session(
-                id=self.current_session_id,
-                user_id=self.user_id,
-                session_type=self.current_agent,
-            )
-            agent = orch.get_agent_for_session(session)
-
-            # Measure response time
-            start_time = time.time()
-
-            # Prepare kwargs for the agent (e.g. curriculum data for ProgressAgent)
-            agent_kwargs = {}
-            if self.current_agent == "progress_test":
-                with rx.session() as db_session:
-                    user = db_session.get(User, self.user_id)
-                    cur = db_session.exec(
-                        select(Curriculum).where(Curriculum.level == user.current_level)
-                    ).first()
+        yield rx.call_script(SCROLL_TO_BOTTOM)
+
+        fold_session_id = 0
+        with span(
+            "chat.turn",
+            session_id=self.current_session_id,
+            session_type=self.current_agent,
+        ) as turn_span:
+            try:
+                session = Session(
+                    id=self.current_session_id,
+                    user_id=self.user_id,
+                    session_type=self.current_agent,
+                )
+                with span("agent_selection"):
+                    agent = orchestrator.get_agent_for_session(session)
+
+                # Measure response time
+                start_time = time.time()
+
+                # Prepare kwargs for the agent (e.g. curriculum data for ProgressAgent)
+                agent_kwargs = {}
+                lookup_ms = 0
+                if self.current_agent == "progress_test":
+                    lookup_start = time.time()
+                    with span("curriculum_lookup") as lookup_span:
+                        cur = await CurriculumCache.aget(await self._get_user_level())
+                        lookup_span.set(level=self._user_level)
                     if cur:
                         agent_kwargs = {
-                            "level": cur.level,
-                            "chapter_title": cur.title,
-                            "learning_goals": cur.learning_goals,
-                            "common_pitfalls": cur.common_pitfalls,
+                            "level": cur["level"],
+                            "chapter_title": cur["title"],
+                            "learning_goals": cur["learning_goals"],
+                            "common_pitfalls": cur["common_pitfalls"],
                         }
-
-            # Get response from LLM (streaming)
-            ai_timestamp = datetime.now().strftime("%H:%M")
-            ai_msg = {
-                "sender": "agent",
-                "content_text": "",
-                "created_at": ai_timestamp,
-            }
-            self.messages.append(ai_msg)
-            msg_index = len(self.messages) - 1
-
-            usage_metadata = {}
-            async for chunk_text, meta in agent.stream_response(
-                self.messages[:-1], **agent_kwargs
-            ):
-                if chunk_text:
-                    self.messages[msg_index]["content_text"] += chunk_text
-                    # Trigger UI update
-                    self.messages = list(self.messages)
+                    lookup_ms = int((time.time() - lookup_start) * 1000)
+
+                # Get response from LLM (streaming)
+                ai_timestamp = datetime.now().strftime("%H:%M")
+                self.streaming_text = ""
+                self.is_streaming = True
+
+                usage_metadata = {}
+                reply_text = ""
+                pending = 0
+                last_flush = time.monotonic()
+                # Time spent handing deltas back to Reflex for state sync
+                sync_seconds = 0.0
+                # Queue this turn fairly among other learners' LLM calls.
+                llm_user.set(str(self.user_id))
+                # `_context` already excludes the summarized prefix.
+                async for chunk_text, meta in agent.stream_response(
+                    self._context,
+                    context_summary=self._context_summary,
+                    **agent_kwargs,
+                ):
+                    if chunk_text:
+                        reply_text += chunk_text
+                        pending += len(chunk_text)
+                        now = time.monotonic()
+                        if (
+                            pending >= self.STREAM_FLUSH_CHARS
+                            or now - last_flush >= self.STREAM_FLUSH_INTERVAL
+                        ):
+                            self.streaming_text = reply_text
+                            pending = 0
+                            last_flush = now
+                            yield
+                            sync_seconds += time.monotonic() - now
+                    if meta:
+                        usage_metadata = meta
+
+                # Merge the finished reply into the history exactly once.
+                self.messages.append({
+                    "sender": "agent",
+                    "content_text": reply_text,
+                    "created_at": ai_timestamp,
+                })
+                self._context.append({"sender": "agent", "content_text": reply_text})
+                self.streaming_text = ""
+                self.is_streaming = False
+                with span("state_sync.final_merge"):
                     yield
-                if meta:
-                    usage_metadata = meta
-
-            # Save to DB
-            with rx.session() as db_session:
-                # Save messages
-                user_message = Message(
-                    session_id=self.current_session_id,
-                    sender="user",
-                    content_text=current_text,
-                )
-                db_session.add(user_message)
-                db_session.flush()  # Get message ID
+                turn_span.set(state_sync_ms=round(sync_seconds * 1000, 3))
 
-                agent_message = Message(
-                    session_id=self.current_session_id,
-                    sender="agent",
-                    content_text=self.messages[msg_index]["content_text"],
+                usage_metadata["response_time_ms"] = int(
+                    (time.time() - start_time) * 1000
                 )
-                db_session.add(agent_message)
-                db_session.flush()  # Get message ID
-
-                # Save token usage
-                if usage_metadata:
-                    token_usage = TokenUsage(
-                        message_id=agent_message.id,
-                        session_id=self.current_session_id,
-                        user_id=self.user_id,
-                        model_name=usage_metadata.get("model_name", "unknown"),
-                        input_message=current_text,
-                        output_message=self.messages[msg_index]["content_text"],
-                        prompt_tokens=usage_metadata.get("prompt_tokens", 0),
-                        completion_tokens=usage_metadata.get("completion_tokens", 0),
-                        total_tokens=usage_metadata.get("total_tokens", 0),
-                    )
-                    db_session.add(token_usage)
+                # Reads so far; apersist_turn adds the time of the turn's write.
+                usage_metadata["db_ms"] = lookup_ms
+
+                # Save to DB
+                await apersist_turn(
+                    self.current_session_id,
+                    self.user_id,
+                    current_text,
+                    reply_text,
+                    usage_metadata,
+                    user_sent_at=sent_at,
+                )
+                self._update_session_row(
+                    self.current_session_id,
+                    updated_at=datetime.now(timezone.utc).isoformat(),
+                )
+
+                fold_session_id = self.current_session_id
+
+            except Exception as e:
+                del self._context[context_len:]
+                yield rx.toast.error(f"Error: {str(e)}")
 
-                db_session.commit()
+        self.streaming_text = ""
+        self.is_streaming = False
+        self.is_processing = False
+        yield rx.call_script(SCROLL_TO_BOTTOM)
 
-                # Update session updated_at
-                session_obj = db_session.get(Session, self.current_session_id)
-                if session_obj:
-                    session_obj.updated_at = datetime.now()
-                    db_session.add(session_obj)
+        if fold_session_id:
+            # Fold turns that left the verbatim window into the rolling summary.
+            yield ChatState.fold_context(fold_session_id)
 
-                db_session.commit()
+    @rx.event(background=True)
+    async def fold_context(self, session_id: int):
+        """Fold older turns into the session's rolling summary.
 
+        A background event, so the learner's next message is not queued
+        behind the summary call.
+        """
+        async with self:
+            if session_id != self.current_session_id:
+                return
+            context = list(self._context)
+            summary = self._context_summary
+            summarized_count = self._summarized_count
+            user_id = self.user_id
+            agent = orchestrator.get_agent_for_session(
+                Session(
+                    id=session_id,
+                    user_id=self.user_id,
+                    session_type=self.current_agent,
+                )
+            )
+        try:
+            llm_user.set(str(user_id))
+            folded = await agent.afold_context(context, summary)
         except Exception as e:
-            yield rx.toast.error(f"Error: {str(e)}")
+            print(f"Failed to update context summary: {e}")
+            return
+        if not folded:
+            return
 
-        self.is_processing = False
-        yield rx.call_script(
-            "var el = document.getElementById('scroll-anchor'); if (el) el.scrollIntoView({ behavior: 'smooth' });"
-        )
+        summary_text, end, usage = folded
+        try:
+            await arecord_usage(session_id, user_id, "", summary_text, usage)
+        except Exception as e:
+            print(f"Failed to record summary usage: {e}")
+
+        async with self:
+            # Skip if the session changed or another fold got there first.
+            if (
+                session_id != self.current_session_id
+                or self._summarized_count != summarized_count
+            ):
+                return
+            # `end` counts messages of `_context`, which starts after the prefix;
+            # turns appended since the snapshot stay after it.
+            self._context_summary = summary_text
+            self._summarized_count += end
+            self._context = self._context[end:]
+            summary, summarized_count = self._context_summary, self._summarized_count
+
+        async with Database.async_session() as db_session:
+            session_obj = await db_session.get(Session, session_id)
+            if session_obj:
+                session_obj.context_summary = summary
+                session_obj.summarized_count = summarized_count
+                db_session.add(session_obj)
+                await db_session.commit()
 
     def toggle_recording(self):
         self.is_recording = not self.is_recording
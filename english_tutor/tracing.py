@@ -0,0 +1,174 @@
+"""Lightweight phase tracing for the chat hot path.
+
+Spans nest through a ContextVar, so a `with span("db.commit")` inside a turn
+is attached to that turn's trace without passing handles around. Finished
+spans go to the configured exporters:
+
+- memory: an in-process ring buffer read by the admin Traces tab.
+- jsonl: one JSON object per span appended to TRACE_JSONL_PATH.
+
+Select exporters with TRACE_EXPORTERS (comma separated, default "memory").
+"""
+
+import collections
+import contextvars
+import dotenv
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+dotenv.load_dotenv()
+
+
+class Span:
+    """One timed phase; `parent_id` is None for the root of a trace."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, trace_id: int, parent_id: int | None, attrs: dict):
+        self.name = name
+        self.span_id = next(self._ids)
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_ms = 0.0
+        self.error = ""
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class SpanExporter:
+    def export(self, span: Span):
+        raise NotImplementedError
+
+
+class RingBufferExporter(SpanExporter):
+    """Keeps the most recent spans in memory."""
+
+    def __init__(self, capacity: int = 5000):
+        self._spans: collections.deque[dict] = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def recent_traces(self, limit: int = 20) -> list[list[dict]]:
+        """Spans of the `limit` most recent traces, newest trace first."""
+        with self._lock:
+            spans = list(self._spans)
+        traces: dict[int, list[dict]] = {}
+        for span in reversed(spans):
+            if span["trace_id"] not in traces:
+                if len(traces) == limit:
+                    break
+                traces[span["trace_id"]] = []
+            traces[span["trace_id"]].append(span)
+        return [
+            sorted(trace, key=lambda s: (s["start"], s["span_id"]))
+            for trace in traces.values()
+        ]
+
+
+class JsonlExporter(SpanExporter):
+    """Appends spans as JSON lines for offline analysis."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Tracer:
+    def __init__(self, exporters: list[SpanExporter]):
+        self.exporters = exporters
+        self._trace_ids = itertools.count(1)
+
+    def start_span(self, name: str, **attrs) -> Span:
+        """Start a span as a child of the current one (or a new trace)."""
+        parent = _current_span.get()
+        if parent is None:
+            trace_id = int(time.time() * 1000) * 1000 + next(self._trace_ids) % 1000
+            return Span(name, trace_id, None, attrs)
+        return Span(name, parent.trace_id, parent.span_id, attrs)
+
+    def end_span(self, span: Span, error: BaseException | None = None):
+        span.duration_ms = (time.perf_counter() - span._start_perf) * 1000
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Failed to export span {span.name}: {e}")
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time the enclosed block; nested spans become its children."""
+        parent = _current_span.get()
+        current = self.start_span(name, **attrs)
+        # Restore the parent explicitly instead of via a reset token: Reflex may
+        # resume generator handlers in a different context between yields.
+        _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            _current_span.set(parent)
+            self.end_span(current, e)
+            raise
+        _current_span.set(parent)
+        self.end_span(current)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        names = os.environ.get("TRACE_EXPORTERS", "memory").split(",")
+        exporters: list[SpanExporter] = []
+        for name in (n.strip() for n in names):
+            if name == "memory":
+                exporters.append(
+                    RingBufferExporter(int(os.environ.get("TRACE_BUFFER_SIZE", "5000")))
+                )
+            elif name == "jsonl":
+                exporters.append(
+                    JsonlExporter(os.environ.get("TRACE_JSONL_PATH", "traces.jsonl"))
+                )
+        return cls(exporters)
+
+    def ring_buffer(self) -> RingBufferExporter | None:
+        for exporter in self.exporters:
+            if isinstance(exporter, RingBufferExporter):
+                return exporter
+        return None
+
+
+tracer = Tracer.from_env()
+span = tracer.span
@@ -145,11 +145,13 @@ def prompt_editor() -> rx.Component:
 def token_stats() -> rx.Component:
     return rx.hstack(
         rx.card(
-            rx.vstack(rx.text("Total Tokens"), rx.heading(AdminState.total_tokens))
+            rx.vstack(
+                rx.text("Tokens (30 days)"), rx.heading(AdminState.total_tokens)
+            )
         ),
         rx.card(
             rx.vstack(
-                rx.text("Estimated Cost"), rx.heading(f"${AdminState.total_cost:.4f}")
+                rx.text("Cost (30 days)"), rx.heading(f"${AdminState.total_cost:.4f}")
             )
         ),
         width="100%",
@@ -157,28 +159,253 @@ def token_stats() -> rx.Component:
     )
 
 
+def usage_summary_table() -> rx.Component:
+    columns = [
+        ("Model", "model"),
+        ("Agent", "agent"),
+        ("Turns", "turns"),
+        ("Tokens", "tokens"),
+        ("Cached", "cached"),
+        ("Cost", "cost"),
+        ("Avg ms", "avg_ms"),
+    ]
+    return rx.vstack(
+        rx.heading("Usage by Model and Agent (last 30 days)", size="4"),
+        rx.table.root(
+            rx.table.header(
+                rx.table.row(
+                    *[rx.table.column_header_cell(label) for label, _ in columns],
+                    rx.table.column_header_cell(""),
+                )
+            ),
+            rx.table.body(
+                rx.foreach(
+                    AdminState.usage_summary,
+                    lambda r: rx.table.row(
+                        *[rx.table.cell(r[key]) for _, key in columns],
+                        rx.table.cell(
+                            rx.button(
+                                "Rows",
+                                size="1",
+                                variant="soft",
+                                on_click=AdminState.drill_down(
+                                    r["model"], r["agent_key"]
+                                ),
+                            )
+                        ),
+                    ),
+                )
+            ),
+            width="100%",
+        ),
+        width="100%",
+    )
+
+
 def usage_table() -> rx.Component:
-    return rx.scroll_area(
+    columns = [
+        ("Time", "time"),
+        ("Model", "model"),
+        ("Agent", "agent"),
+        ("User", "user_id"),
+        ("Tokens", "tokens"),
+        ("Cost", "cost"),
+        ("ms", "response_ms"),
+    ]
+    return rx.vstack(
+        rx.hstack(
+            rx.heading("Usage Rows", size="4"),
+            rx.cond(
+                AdminState.usage_filter_model != "",
+                rx.badge(
+                    AdminState.usage_filter_model,
+                    " / ",
+                    AdminState.usage_filter_agent,
+                ),
+            ),
+            rx.spacer(),
+            rx.cond(
+                AdminState.usage_filter_model != "",
+                rx.button(
+                    "All rows",
+                    size="1",
+                    variant="ghost",
+                    on_click=AdminState.clear_drill_down,
+                ),
+            ),
+            rx.button(
+                "Newer",
+                size="1",
+                disabled=AdminState.usage_page == 0,
+                on_click=AdminState.prev_usage_page,
+            ),
+            rx.text(f"Page {AdminState.usage_page + 1}", size="2"),
+            rx.button(
+                "Older",
+                size="1",
+                disabled=~AdminState.usage_has_more,
+                on_click=AdminState.next_usage_page,
+            ),
+            width="100%",
+            align="center",
+        ),
         rx.table.root(
             rx.table.header(
                 rx.table.row(
-                    rx.table.column_header_cell("Time"),
-                    rx.table.column_header_cell("Model"),
-                    rx.table.column_header_cell("Tokens"),
+                    *[rx.table.column_header_cell(label) for label, _ in columns]
                 )
             ),
             rx.table.body(
                 rx.foreach(
-                    AdminState.token_usage_records,
+                    AdminState.usage_rows,
                     lambda r: rx.table.row(
-                        rx.table.cell(r.created_at.to(str)),
-                        rx.table.cell(r.model_name),
-                        rx.table.cell(r.total_tokens),
+                        *[rx.table.cell(r[key]) for _, key in columns]
                     ),
                 )
             ),
+            width="100%",
         ),
-        height="400px",
+        width="100%",
+    )
+
+
+def daily_cost_table() -> rx.Component:
+    columns = [
+        ("Day", "day"),
+        ("User", "user_id"),
+        ("Turns", "turns"),
+        ("Tokens", "tokens"),
+        ("Cached", "cached"),
+        ("Cost", "cost"),
+    ]
+    return rx.vstack(
+        rx.heading("Daily Cost per User (last 7 days)", size="4"),
+        rx.scroll_area(
+            rx.table.root(
+                rx.table.header(
+                    rx.table.row(
+                        *[rx.table.column_header_cell(label) for label, _ in columns]
+                    )
+                ),
+                rx.table.body(
+                    rx.foreach(
+                        AdminState.daily_costs,
+                        lambda r: rx.table.row(
+                            *[rx.table.cell(r[key]) for _, key in columns]
+                        ),
+                    )
+                ),
+                width="100%",
+            ),
+            max_height="300px",
+        ),
+        width="100%",
+    )
+
+
+def latency_table() -> rx.Component:
+    columns = [
+        ("Model", "model"),
+        ("Agent", "agent"),
+        ("Turns", "count"),
+        ("TTFT p50", "ttft_p50"),
+        ("TTFT p95", "ttft_p95"),
+        ("TTFT p99", "ttft_p99"),
+        ("Total p50", "total_p50"),
+        ("Total p95", "total_p95"),
+        ("Total p99", "total_p99"),
+        ("DB avg", "db_avg"),
+    ]
+    return rx.vstack(
+        rx.heading("Latency (ms, last 24h)", size="4"),
+        rx.table.root(
+            rx.table.header(
+                rx.table.row(
+                    *[rx.table.column_header_cell(label) for label, _ in columns]
+                )
+            ),
+            rx.table.body(
+                rx.foreach(
+                    AdminState.latency_stats,
+                    lambda r: rx.table.row(
+                        *[rx.table.cell(r[key]) for _, key in columns]
+                    ),
+                )
+            ),
+            width="100%",
+        ),
+        width="100%",
+    )
+
+
+def traces_tab() -> rx.Component:
+    return rx.vstack(
+        rx.hstack(
+            rx.heading("Recent Traces", size="4"),
+            rx.button(
+                "Refresh",
+                rx.icon("refresh-cw", size=16),
+                size="1",
+                variant="soft",
+                on_click=AdminState.load_traces,
+            ),
+            align_items="center",
+            spacing="3",
+        ),
+        rx.scroll_area(
+            rx.table.root(
+                rx.table.header(
+                    rx.table.row(
+                        rx.table.column_header_cell("Span"),
+                        rx.table.column_header_cell("Start (ms)"),
+                        rx.table.column_header_cell("Duration (ms)"),
+                        rx.table.column_header_cell("Attributes"),
+                        rx.table.column_header_cell("Error"),
+                    )
+                ),
+                rx.table.body(
+                    rx.foreach(
+                        AdminState.trace_rows,
+                        lambda r: rx.table.row(
+                            rx.table.cell(
+                                rx.text(
+                                    r["name"],
+                                    weight=rx.cond(r["root"] == "1", "bold", "regular"),
+                                    white_space="pre",
+                                )
+                            ),
+                            rx.table.cell(r["offset_ms"]),
+                            rx.table.cell(r["duration_ms"]),
+                            rx.table.cell(rx.text(r["attrs"], size="1", color="gray")),
+                            rx.table.cell(rx.text(r["error"], size="1", color="red")),
+                        ),
+                    )
+                ),
+                width="100%",
+            ),
+            height="600px",
+        ),
+        width="100%",
+        spacing="3",
+    )
+
+
+def cache_stats_table() -> rx.Component:
+    return rx.vstack(
+        rx.heading("Caches & Runtime", size="4"),
+        rx.table.root(
+            rx.table.body(
+                rx.foreach(
+                    AdminState.cache_stats,
+                    lambda r: rx.table.row(
+                        rx.table.row_header_cell(r["cache"]),
+                        rx.table.cell(rx.text(r["stats"], size="1")),
+                    ),
+                )
+            ),
+            width="100%",
+        ),
+        width="100%",
     )
 
 
@@ -267,6 +494,7 @@ def admin_view() -> rx.Component:
                         rx.tabs.trigger("Prompts", value="prompts"),
                         rx.tabs.trigger("Curriculum", value="curriculum"),
                         rx.tabs.trigger("Usage", value="usage"),
+                        rx.tabs.trigger("Traces", value="traces"),
                     ),
                     rx.tabs.content(
                         rx.vstack(
@@ -284,10 +512,22 @@ def admin_view() -> rx.Component:
                     rx.tabs.content(curriculum_tab(), value="curriculum"),
                     rx.tabs.content(
                         rx.vstack(
-                            token_stats(), rx.divider(), usage_table(), width="100%"
+                            token_stats(),
+                            rx.divider(),
+                            usage_summary_table(),
+                            rx.divider(),
+                            daily_cost_table(),
+                            rx.divider(),
+                            latency_table(),
+                            rx.divider(),
+                            cache_stats_table(),
+                            rx.divider(),
+                            usage_table(),
+                            width="100%",
                         ),
                         value="usage",
                     ),
+                    rx.tabs.content(traces_tab(), value="traces"),
                     default_value="prompts",
                 ),
                 width="100%",
@@ -298,5 +538,6 @@ def admin_view() -> rx.Component:
             AdminState.load_prompt_history,
             AdminState.load_token_usage,
             AdminState.load_curriculums,
+            AdminState.load_traces,
         ],
     )
@@ -1,7 +1,6 @@
 import reflex as rx
 from .components import navbar, footer
 from ..state.chat_state import ChatState
-from ..models.user import Session
 
 
 def chat_bubble(msg: dict) -> rx.Component:
@@ -75,13 +74,16 @@ def chat_bubble(msg: dict) -> rx.Component:
     )
 
 
-def sidebar_item(session: Session) -> rx.Component:
+def sidebar_item(session: dict) -> rx.Component:
+    is_current = session["id"] == ChatState.current_session_id.to_string()
     return rx.box(
         rx.hstack(
             rx.hstack(
                 rx.icon("message-square", size=16),
                 rx.text(
-                    rx.cond(session.title, session.title, f"Session {session.id}"),
+                    rx.cond(
+                        session["title"], session["title"], f"Session {session['id']}"
+                    ),
                     font_size="sm",
                     truncate=True,
                     max_width="120px",
@@ -89,7 +91,7 @@ def sidebar_item(session: Session) -> rx.Component:
                 align_items="center",
                 spacing="2",
                 flex="1",
-                on_click=lambda: ChatState.select_session(session.id),
+                on_click=lambda: ChatState.select_session(session["id"]),
                 cursor="pointer",
             ),
             rx.menu.root(
@@ -101,7 +103,7 @@ def sidebar_item(session: Session) -> rx.Component:
                     rx.menu.item(
                         "Delete",
                         color="red",
-                        on_click=lambda: ChatState.ask_delete_session(session.id),
+                        on_click=lambda: ChatState.ask_delete_session(session["id"]),
                     ),
                 ),
             ),
@@ -112,12 +114,12 @@ def sidebar_item(session: Session) -> rx.Component:
         padding="0.75em",
         border_radius="8px",
         background=rx.cond(
-            session.id == ChatState.current_session_id,
+            is_current,
             "rgba(99, 102, 241, 0.1)",  # Indigo tint
             "transparent",
         ),
         color=rx.cond(
-            session.id == ChatState.current_session_id,
+            is_current,
             "indigo",
             "gray.700",
         ),
@@ -165,6 +167,18 @@ def sidebar() -> rx.Component:
         rx.divider(),
         rx.vstack(
             rx.foreach(ChatState.sessions, sidebar_item),
+            rx.cond(
+                ChatState.has_more_sessions,
+                rx.button(
+                    "Load more",
+                    id="load-more-sessions",
+                    variant="ghost",
+                    color_scheme="gray",
+                    size="1",
+                    width="100%",
+                    on_click=ChatState.load_more_sessions,
+                ),
+            ),
             width="100%",
             spacing="1",
             overflow_y="auto",
@@ -237,9 +251,30 @@ def chat_view() -> rx.Component:
                             rx.divider(),
                             rx.scroll_area(
                                 rx.vstack(
+                                    rx.cond(
+                                        ChatState.has_older_messages,
+                                        rx.button(
+                                            "Load older messages",
+                                            id="load-older",
+                                            variant="ghost",
+                                            color_scheme="gray",
+                                            size="1",
+                                            align_self="center",
+                                            on_click=ChatState.load_older_messages,
+                                        ),
+                                    ),
                                     rx.foreach(ChatState.messages, chat_bubble),
                                     rx.cond(
-                                        ChatState.is_processing,
+                                        ChatState.is_streaming,
+                                        chat_bubble({
+                                            "sender": "agent",
+                                            "content_text": ChatState.streaming_text,
+                                            "created_at": "",
+                                        }),
+                                    ),
+                                    rx.cond(
+                                        ChatState.is_processing
+                                        & ~ChatState.is_streaming,
                                         rx.hstack(
                                             rx.spinner(size="2", color="indigo"),
                                             rx.text(
@@ -0,0 +1,406 @@
+import asyncio
+import dotenv
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.postgresql import insert
+
+from .models.evaluation import Message
+from .models.token_usage import TokenUsage
+from .models.user import Session
+from .tracing import span
+from .db import Database
+
+
+dotenv.load_dotenv()
+
+
+@dataclass
+class PendingTurn:
+    """One chat turn waiting to be written."""
+
+    session_id: int
+    # User and agent Message rows, in that order
+    messages: list[dict]
+    token_usage: TokenUsage | None
+    updated_at: datetime
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "session_id": self.session_id,
+                "messages": self.messages,
+                "token_usage": self.token_usage.model_dump()
+                if self.token_usage is not None
+                else None,
+                "updated_at": self.updated_at,
+            },
+            default=datetime.isoformat,
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "PendingTurn":
+        data = json.loads(line)
+        usage = data["token_usage"]
+        if usage is not None:
+            usage["created_at"] = datetime.fromisoformat(usage["created_at"])
+            usage = TokenUsage(**usage)
+        return cls(
+            session_id=data["session_id"],
+            messages=[
+                {**row, "created_at": datetime.fromisoformat(row["created_at"])}
+                for row in data["messages"]
+            ],
+            token_usage=usage,
+            updated_at=datetime.fromisoformat(data["updated_at"]),
+        )
+
+
+class WriteBehindQueue:
+    """Optional write-behind persistence for chat turns.
+
+    With PERSIST_WRITE_BEHIND=1, `persist_turn` only queues the turn, so
+    handler latency no longer includes the DB commit. A background thread
+    writes queued turns of all users in batches (WRITE_BEHIND_BATCH_SIZE
+    turns or WRITE_BEHIND_FLUSH_MS, whichever comes first) as bulk inserts
+    in one transaction. The queue holds WRITE_BEHIND_MAX_QUEUE turns; when it
+    is full the turn is written synchronously instead of being dropped.
+    Async callers use `asubmit`, which runs that synchronous write in a thread.
+
+    A batch that still fails after `max_attempts` stays with the flusher and is
+    retried every WRITE_BEHIND_RETRY_S seconds until the database takes it.
+    `stop` (called from DBManager.stop) writes everything still queued; turns
+    it cannot write are appended to WRITE_BEHIND_SPILL_PATH and it raises.
+    `replay_spill` writes them once the database is back.
+    """
+
+    enabled = os.environ.get("PERSIST_WRITE_BEHIND", "").lower() in ("1", "true")
+    batch_size = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "200"))
+    flush_seconds = float(os.environ.get("WRITE_BEHIND_FLUSH_MS", "200")) / 1000
+    max_queue = int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", "10000"))
+    # Attempts per batch before it is held back and retried later
+    max_attempts = 3
+    retry_seconds = float(os.environ.get("WRITE_BEHIND_RETRY_S", "5"))
+    spill_path = os.environ.get("WRITE_BEHIND_SPILL_PATH", "write_behind_spill.jsonl")
+
+    _lock = threading.Lock()
+    _queue: queue.Queue | None = None
+    _thread: threading.Thread | None = None
+    # Put on the queue by `stop`; the flusher exits after writing what precedes it.
+    _STOP = object()
+    # Set by `stop`: held turns get one last attempt instead of waiting.
+    _stopping = threading.Event()
+    # Turns the flusher could not write before it exited
+    _unwritten: list[PendingTurn] = []
+    _stats: dict[str, int] = {
+        "submitted": 0,
+        "written": 0,
+        "batches": 0,
+        "overflow": 0,
+        "failed": 0,
+        "held": 0,
+        "spilled": 0,
+        "last_batch": 0,
+        "last_flush_ms": 0,
+    }
+
+    @classmethod
+    def submit(
+        cls,
+        session_id: int,
+        user_id: int,
+        user_text: str,
+        agent_text: str,
+        usage_metadata: dict,
+        user_sent_at: datetime | None = None,
+    ):
+        """Queue one turn; written synchronously if the queue is full."""
+        turn = cls._pending(
+            session_id, user_id, user_text, agent_text, usage_metadata, user_sent_at
+        )
+        if not cls._enqueue(turn):
+            cls._write([turn])
+
+    @classmethod
+    async def asubmit(
+        cls,
+        session_id: int,
+        user_id: int,
+        user_text: str,
+        agent_text: str,
+        usage_metadata: dict,
+        user_sent_at: datetime | None = None,
+    ):
+        """`submit` for coroutines: the overflow write runs off the event loop."""
+        turn = cls._pending(
+            session_id, user_id, user_text, agent_text, usage_metadata, user_sent_at
+        )
+        if not cls._enqueue(turn):
+            await asyncio.to_thread(cls._write, [turn])
+
+    @classmethod
+    def _pending(
+        cls,
+        session_id: int,
+        user_id: int,
+        user_text: str,
+        agent_text: str,
+        usage_metadata: dict,
+        user_sent_at: datetime | None,
+    ) -> PendingTurn:
+        from .persistence import build_token_usage, message_row
+
+        now = datetime.now(timezone.utc)
+        token_usage = None
+        if usage_metadata:
+            token_usage = build_token_usage(
+                session_id, user_id, user_text, agent_text, usage_metadata
+            )
+            token_usage.created_at = now
+        return PendingTurn(
+            session_id=session_id,
+            messages=[
+                message_row(session_id, "user", user_text, user_sent_at or now),
+                message_row(session_id, "agent", agent_text, now),
+            ],
+            token_usage=token_usage,
+            updated_at=now,
+        )
+
+    @classmethod
+    def _enqueue(cls, turn: PendingTurn) -> bool:
+        """Queue `turn`; False if the queue is full and the caller must write it."""
+        with cls._lock:
+            cls._stats["submitted"] += 1
+        try:
+            cls._ensure_started().put_nowait(turn)
+        except queue.Full:
+            with cls._lock:
+                cls._stats["overflow"] += 1
+            return False
+        return True
+
+    @classmethod
+    def stop(cls, timeout: float = 30.0):
+        """Write all queued turns and stop the flusher.
+
+        Raises if some turns could not be written; they are spilled to disk.
+        """
+        with cls._lock:
+            thread, q = cls._thread, cls._queue
+            cls._thread = None
+        if thread is None:
+            return
+        cls._stopping.set()
+        q.put(cls._STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f"Write-behind flusher still running after {timeout}s")
+            return
+        cls._stopping.clear()
+        with cls._lock:
+            unwritten, cls._unwritten = cls._unwritten, []
+        if unwritten:
+            cls._spill(unwritten)
+            raise RuntimeError(
+                f"{len(unwritten)} write-behind turns were not written; "
+                f"saved to {cls.spill_path}"
+            )
+
+    @classmethod
+    def replay_spill(cls):
+        """Write the turns a failed shutdown spilled, then remove the file."""
+        path = Path(cls.spill_path)
+        if not path.exists():
+            return
+        turns = [
+            PendingTurn.from_json(line)
+            for line in path.read_text().splitlines()
+            if line
+        ]
+        if turns:
+            cls._write(turns)
+        path.unlink()
+        print(f"Replayed {len(turns)} spilled write-behind turns")
+
+    @classmethod
+    def _spill(cls, turns: list[PendingTurn]):
+        with open(cls.spill_path, "a") as f:
+            for turn in turns:
+                f.write(turn.to_json() + "\n")
+        with cls._lock:
+            cls._stats["spilled"] += len(turns)
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        with cls._lock:
+            queued = cls._queue.qsize() if cls._queue is not None else 0
+            return {"enabled": int(cls.enabled), "queued": queued, **cls._stats}
+
+    @classmethod
+    def _ensure_started(cls) -> queue.Queue:
+        with cls._lock:
+            if cls._queue is None:
+                cls._queue = queue.Queue(maxsize=cls.max_queue)
+            if cls._thread is None:
+                cls._thread = threading.Thread(
+                    target=cls._run,
+                    args=(cls._queue,),
+                    name="write-behind",
+                    daemon=True,
+                )
+                cls._thread.start()
+            return cls._queue
+
+    @classmethod
+    def _run(cls, q: queue.Queue):
+        # A failed batch; retried on its own while newer turns wait in the queue
+        held: list[PendingTurn] = []
+        while True:
+            saw_stop = False
+            if held:
+                cls._stopping.wait(cls.retry_seconds)
+                batch, held = held, []
+            else:
+                batch, saw_stop = cls._next_batch(q)
+            if batch and not cls._write_with_retry(batch):
+                held = batch
+            with cls._lock:
+                cls._stats["held"] = len(held)
+            if held and cls._stopping.is_set():
+                # Shutting down without a database: `stop` spills the rest.
+                held += cls._drain(q)
+                break
+            if saw_stop:
+                break
+        with cls._lock:
+            cls._unwritten = held
+
+    @classmethod
+    def _next_batch(cls, q: queue.Queue) -> tuple[list[PendingTurn], bool]:
+        """Up to `batch_size` turns or one flush window; True if `stop` was seen."""
+        item = q.get()
+        batch: list[PendingTurn] = []
+        deadline = time.monotonic() + cls.flush_seconds
+        while item is not cls._STOP:
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= cls.batch_size or remaining <= 0:
+                return batch, False
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    @classmethod
+    def _drain(cls, q: queue.Queue) -> list[PendingTurn]:
+        turns = []
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                return turns
+            if item is not cls._STOP:
+                turns.append(item)
+
+    @classmethod
+    def _write_with_retry(cls, batch: list[PendingTurn]) -> bool:
+        for attempt in range(1, cls.max_attempts + 1):
+            try:
+                cls._write(batch)
+                return True
+            except Exception as e:
+                print(f"Write-behind batch of {len(batch)} failed ({attempt}): {e}")
+                time.sleep(0.5 * attempt)
+        with cls._lock:
+            cls._stats["failed"] += len(batch)
+        return False
+
+    @classmethod
+    def _write(cls, batch: list[PendingTurn]):
+        """Bulk-insert a batch of turns in one transaction."""
+        from .persistence import upsert_many, usage_total_rows
+
+        start = time.perf_counter()
+        messages = Message.__table__
+        sessions = Session.__table__
+        with (
+            span("db.write_behind", turns=len(batch)),
+            Database.session() as db_session,
+        ):
+            rows = [row for turn in batch for row in turn.messages]
+            ids = (
+                db_session.exec(
+                    insert(messages).returning(
+                        messages.c.id, sort_by_parameter_order=True
+                    ),
+                    params=rows,
+                )
+                .scalars()
+                .all()
+            )
+
+            usage_rows = []
+            # (model, key values) -> summed totals across the batch
+            totals: dict[tuple, tuple[dict, dict]] = {}
+            position = 0
+            for turn in batch:
+                position += len(turn.messages)
+                if turn.token_usage is None:
+                    continue
+                usage_rows.append({
+                    **turn.token_usage.model_dump(exclude={"id", "message_id"}),
+                    # The agent message is the turn's last row.
+                    "message_id": ids[position - 1],
+                })
+                for model, keys, values in usage_total_rows(turn.token_usage):
+                    key = (model, *keys.values())
+                    if key in totals:
+                        summed = totals[key][1]
+                        for name, value in values.items():
+                            summed[name] += value
+                    else:
+                        totals[key] = (keys, dict(values))
+            if usage_rows:
+                db_session.exec(insert(TokenUsage.__table__), params=usage_rows)
+
+            by_model: dict = {}
+            for (model, *_), (keys, values) in totals.items():
+                by_model.setdefault(model, (list(keys), []))[1].append(
+                    {**keys, **values}
+                )
+            for model, (key_names, model_rows) in by_model.items():
+                with span("db.upsert", table=model.__table__.name):
+                    db_session.exec(upsert_many(model, key_names, model_rows))
+
+            latest: dict[int, datetime] = {}
+            for turn in batch:
+                latest[turn.session_id] = max(
+                    turn.updated_at, latest.get(turn.session_id, turn.updated_at)
+                )
+            db_session.exec(
+                update(sessions)
+                .where(sessions.c.id == bindparam("b_id"))
+                .values(updated_at=bindparam("b_updated_at")),
+                params=[
+                    {"b_id": session_id, "b_updated_at": updated_at}
+                    for session_id, updated_at in latest.items()
+                ],
+            )
+            with span("db.commit"):
+                db_session.commit()
+
+        with cls._lock:
+            cls._stats["written"] += len(batch)
+            cls._stats["batches"] += 1
+            cls._stats["last_batch"] = len(batch)
+            cls._stats["last_flush_ms"] = int((time.perf_counter() - start) * 1000)
+
@@ -1,3 +1,4 @@
+import dotenv
 import reflex as rx
 import os
 from pathlib import Path
@@ -11,8 +12,18 @@ data_dir.mkdir(exist_ok=True)
 # For Reflex, we can use a local sqlite for easier dev, or a fixed pglite path.
 # py-pglite provides a way to get the DSN.
 
-# To keep it simple and ensure reflex run works, we'll use TCP on 5432
-db_url = "postgresql+psycopg://swarf@localhost:5432/postgres"
+# TCP on PGLITE_PORT (5432) by default; with PGLITE_SOCKET_DIR set, DBManager
+# starts PGlite on a Unix-domain socket in that directory instead.
+dotenv.load_dotenv()
+pglite_port = os.environ.get("PGLITE_PORT", "5432")
+pglite_socket_dir = os.environ.get("PGLITE_SOCKET_DIR", "")
+if pglite_socket_dir:
+    db_url = (
+        "postgresql+psycopg://swarf@/postgres"
+        f"?host={Path(pglite_socket_dir).resolve()}&port={pglite_port}"
+    )
+else:
+    db_url = f"postgresql+psycopg://swarf@localhost:{pglite_port}/postgres"
 
 config = rx.Config(
     app_name="english_tutor",
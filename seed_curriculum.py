@@ -1,4 +1,5 @@
-import reflex as rx
+from english_tutor.db import Database
+from english_tutor.db_manager import DBManager
 from english_tutor.models.content import Curriculum
 from sqlmodel import select
 
@@ -71,7 +72,7 @@ def seed_curriculum():
         },
     ]
 
-    with rx.session() as session:
+    with Database.session() as session:
         for cur_data in curricula:
             existing = session.exec(
                 select(Curriculum).where(Curriculum.level == cur_data["level"])
@@ -84,8 +85,15 @@ def seed_curriculum():
                 new_cur = Curriculum(**cur_data)
                 session.add(new_cur)
         session.commit()
+    # This runs in its own process, so it cannot clear the app's
+    # CurriculumCache; running app processes pick up the new rows once their
+    # entries expire (CURRICULUM_CACHE_TTL_SECONDS).
     print("Seed complete!")
 
 
 if __name__ == "__main__":
-    seed_curriculum()
+    DBManager.start()
+    try:
+        seed_curriculum()
+    finally:
+        DBManager.stop()
@@ -0,0 +1,38 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def pglite_engine(tmp_path_factory):
+    """Engine on a throwaway PGlite server holding the app schema.
+
+    The server runs on a Unix socket in a temporary directory, so it never
+    touches `pgdata` or port 5432. The schema comes from the models, whose
+    `__table_args__` declare the same indexes as the migrations.
+    """
+    from py_pglite import PGliteConfig, PGliteManager
+    from sqlalchemy import create_engine
+    from sqlmodel import SQLModel
+
+    import english_tutor.models  # noqa: F401  (registers the tables)
+
+    base = tmp_path_factory.mktemp("pglite")
+    config = PGliteConfig(
+        work_dir=base,
+        cleanup_on_exit=True,
+        use_tcp=False,
+        socket_path=str(base / ".s.PGSQL.5432"),
+        timeout=60,
+    )
+    manager = PGliteManager(config)
+    manager.start()
+    if not manager.wait_for_ready():
+        manager.stop()
+        pytest.fail("PGlite did not start")
+
+    engine = create_engine(f"postgresql+psycopg://postgres@/postgres?host={base}")
+    SQLModel.metadata.create_all(engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        manager.stop()
@@ -0,0 +1,161 @@
+"""LLMGovernor fairness, slot accounting, hedging and fallbacks.
+
+Runs against FakeChatModel, whose latencies and failures are deterministic.
+"""
+
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from english_tutor.agents.governor import LLMGovernor, RateLimiter
+from english_tutor.agents.providers import FakeChatModel
+
+MESSAGES = [HumanMessage(content="How was your weekend?")]
+
+
+class SlowFirstCall(FakeChatModel):
+    """Only the first request waits `slow_ms`, so a hedge beats it."""
+
+    def _ttft(self) -> float:
+        return (self.slow_ms if self.calls == 1 else self.ttft_ms) / 1000
+
+
+def fake(model: str, **options) -> FakeChatModel:
+    return FakeChatModel(model, ttft_ms=0, tokens_per_sec=10_000, **options)
+
+
+async def collect(stream) -> str:
+    return "".join([chunk.content async for chunk in stream])
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(LLMGovernor, "_limiters", {})
+    monkeypatch.setattr(LLMGovernor, "hedge_enabled", False)
+    monkeypatch.setattr(LLMGovernor, "retry_base_seconds", 0.001)
+
+
+def test_waiting_users_are_served_round_robin():
+    async def scenario() -> list[str]:
+        limiter = RateLimiter("m", rpm=60_000, tpm=10_000_000, max_concurrency=1)
+        await limiter.acquire("holder", 1)
+        order = []
+
+        async def call(user: str, name: str):
+            await limiter.acquire(user, 1)
+            order.append(name)
+            limiter.release(1)
+
+        # "a" queues three calls before "b" queues one.
+        tasks = [asyncio.create_task(call("a", f"a{i}")) for i in range(3)]
+        tasks.append(asyncio.create_task(call("b", "b0")))
+        await asyncio.sleep(0)
+        limiter.release(1)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["a0", "b0", "a1", "a2"]
+
+
+def test_cancelled_waiter_leaves_no_slot_behind():
+    async def scenario() -> RateLimiter:
+        limiter = RateLimiter("m", rpm=60_000, tpm=10_000_000, max_concurrency=1)
+        await limiter.acquire("holder", 1)
+        waiter = asyncio.create_task(limiter.acquire("a", 1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release(1)
+        return limiter
+
+    stats = asyncio.run(scenario()).stats()
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_release_trues_up_the_token_bucket():
+    limiter = RateLimiter("m", rpm=60_000, tpm=10_000, max_concurrency=1)
+    limiter.acquire_sync("a", 1_000)
+    limiter.release(1_000, actual_tokens=4_000)
+    assert limiter.tokens.level == pytest.approx(10_000 - 4_000, abs=5)
+
+
+def test_hedge_wins_and_the_loser_frees_its_slot(monkeypatch):
+    monkeypatch.setattr(LLMGovernor, "hedge_enabled", True)
+    monkeypatch.setattr(LLMGovernor, "hedge_delay_seconds", 0.05)
+    llm = SlowFirstCall(
+        "hedged", ttft_ms=0, tokens_per_sec=10_000, reply_tokens=5, slow_ms=2_000
+    )
+
+    start = time.monotonic()
+    text = asyncio.run(collect(LLMGovernor.astream(llm, "hedged", MESSAGES)))
+
+    assert text
+    assert time.monotonic() - start < 1
+    stats = LLMGovernor.limiter("hedged").stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_first_token_timeout_fails_over(monkeypatch):
+    monkeypatch.setattr(LLMGovernor, "first_token_timeout", 0.05)
+    primary = FakeChatModel("primary", ttft_ms=2_000, tokens_per_sec=10_000)
+    backup = fake("backup")
+
+    text = asyncio.run(
+        collect(
+            LLMGovernor.astream(
+                primary, "primary", MESSAGES, fallback=(backup, "backup", MESSAGES, {})
+            )
+        )
+    )
+
+    assert text
+    assert backup.calls == 1
+    stats = LLMGovernor.limiter("primary").stats()
+    assert stats["timeouts"] == 1
+    assert stats["fallbacks"] == 1
+    assert stats["in_flight"] == 0
+    assert LLMGovernor.limiter("backup").stats()["in_flight"] == 0
+
+
+def test_upstream_failure_fails_over_after_retries(monkeypatch):
+    monkeypatch.setattr(LLMGovernor, "max_retries", 1)
+    primary = fake("primary", failure_rate=1.0)
+    backup = fake("backup")
+
+    response = asyncio.run(
+        LLMGovernor.ainvoke(
+            primary, "primary", MESSAGES, fallback=(backup, "backup", MESSAGES, {})
+        )
+    )
+
+    assert response.response_metadata["model_name"] == "backup"
+    assert primary.calls == 2
+    stats = LLMGovernor.limiter("primary").stats()
+    assert stats["retries"] == 1
+    assert stats["fallbacks"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_blocking_invoke_times_out_to_the_fallback(monkeypatch):
+    monkeypatch.setattr(LLMGovernor, "request_timeout", 0.05)
+    primary = FakeChatModel("primary", ttft_ms=300, tokens_per_sec=10_000)
+    backup = fake("backup")
+
+    response = LLMGovernor.invoke(
+        primary, "primary", MESSAGES, fallback=(backup, "backup", MESSAGES, {})
+    )
+
+    assert response.response_metadata["model_name"] == "backup"
+    limiter = LLMGovernor.limiter("primary")
+    assert limiter.stats()["timeouts"] == 1
+    # The abandoned call keeps its slot until it returns.
+    deadline = time.monotonic() + 2
+    while limiter.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.stats()["in_flight"] == 0
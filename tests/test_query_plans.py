@@ -0,0 +1,282 @@
+"""Query plans and latency of the ChatState/AdminState hot queries.
+
+Seeds a synthetic dataset into a throwaway PGlite server, runs ANALYZE and
+checks, for every query the states run, that its EXPLAIN plan reads the big
+table through the expected index and that its median latency stays under a
+ceiling. The statements come from the same builders the states use.
+
+QUERY_PLAN_SCALE (default 1) scales the dataset: 10k sessions, 200k messages
+and 100k token usage rows per unit. QUERY_PLAN_CEILING_MS (default 50) is the
+latency ceiling.
+"""
+
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+SCALE = float(os.environ.get("QUERY_PLAN_SCALE", "1"))
+CEILING_MS = float(os.environ.get("QUERY_PLAN_CEILING_MS", "50"))
+REPEAT = 5
+
+USER_ID_BASE = 800_000
+MODELS = ["gemini-3-flash-preview", "gemini-2.5-flash", "gemini-2.5-flash-lite"]
+AGENTS = ["tutoring", "counseling", "evaluation", "onboarding", "placement", "title"]
+
+# Rows per unit of QUERY_PLAN_SCALE
+USERS = 1_000
+SESSIONS_PER_USER = 10
+MESSAGES_PER_SESSION = 20
+TOKEN_USAGE_ROWS = 100_000
+HISTORY_DAYS = 60
+PROMPT_AGENTS = 20
+PROMPT_VERSIONS = 100
+
+SEED_STATEMENTS = [
+    # One in ten sessions is soft-deleted.
+    """
+    INSERT INTO session (user_id, session_type, status, created_at,
+        updated_at, title, is_deleted, context_summary, summarized_count)
+    SELECT :base + g % :users, 'tutoring', 'active',
+        now() - (g % (:days * 24)) * interval '1 hour',
+        now() - (g % (:days * 24)) * interval '1 hour',
+        'Bench session ' || g, g % 10 = 0, '', 0
+    FROM generate_series(1, :sessions) g
+    """,
+    """
+    INSERT INTO message (session_id, sender, content_text,
+        content_audio_path, feedback, created_at)
+    SELECT s.id, CASE WHEN g % 2 = 0 THEN 'agent' ELSE 'user' END,
+        'Bench message ' || g, '', 0, s.created_at + g * interval '1 second'
+    FROM session s CROSS JOIN generate_series(1, :per_session) g
+    """,
+    """
+    INSERT INTO tokenusage (session_id, user_id, model_name, agent_name,
+        input_message, output_message, prompt_tokens, completion_tokens,
+        cached_prompt_tokens, total_tokens, response_time_ms, ttft_ms,
+        generation_ms, db_ms, chunk_count, mean_inter_token_ms,
+        estimated_cost, created_at)
+    SELECT 0, :base + g % :users,
+        (:models)[1 + g % cardinality(:models)],
+        (:agents)[1 + g % cardinality(:agents)],
+        'in', 'out', 1200, 300, 800, 1500, 900, 400, 900, 5, 30, 15.0,
+        0.001, now() - (g % (:days * 24 * 60)) * interval '1 minute'
+    FROM generate_series(1, :usage_rows) g
+    """,
+    """
+    INSERT INTO agentprompt (agent_name, prompt_text, version, is_active)
+    SELECT 'agent_' || a, 'Prompt ' || v, v, v = :prompt_versions
+    FROM generate_series(1, :prompt_agents) a,
+        generate_series(1, :prompt_versions) v
+    """,
+    """
+    INSERT INTO userdailycost (user_id, day, turns, prompt_tokens,
+        completion_tokens, cached_prompt_tokens, total_tokens, cost)
+    SELECT :base + u, current_date - d, 10, 12000, 3000, 8000, 15000, 0.01
+    FROM generate_series(0, :users - 1) u, generate_series(0, :days - 1) d
+    """,
+    """
+    INSERT INTO tokenusagerollup (granularity, bucket, model_name,
+        agent_name, user_id, turns, prompt_tokens, completion_tokens,
+        cached_prompt_tokens, total_tokens, cost, response_time_ms)
+    SELECT 'day', date_trunc('day', now()) - d * interval '1 day',
+        (:models)[1 + u % cardinality(:models)],
+        (:agents)[1 + u % cardinality(:agents)],
+        :base + u, 10, 12000, 3000, 8000, 15000, 0.01, 9000
+    FROM generate_series(0, :users - 1) u, generate_series(0, :days - 1) d
+    """,
+]
+
+
+@dataclass
+class Check:
+    statement: object
+    # Table that must not be read with a Seq Scan
+    table: str
+    # Index the plan must use; None when any index on `table` is acceptable
+    index: str | None
+
+
+@pytest.fixture(scope="module")
+def plan_db(pglite_engine):
+    """A connection to the seeded and analyzed dataset."""
+    users = max(1, int(USERS * SCALE))
+    params = {
+        "base": USER_ID_BASE,
+        "users": users,
+        "sessions": users * SESSIONS_PER_USER,
+        "per_session": MESSAGES_PER_SESSION,
+        "usage_rows": max(1, int(TOKEN_USAGE_ROWS * SCALE)),
+        "days": HISTORY_DAYS,
+        "prompt_agents": PROMPT_AGENTS,
+        "prompt_versions": PROMPT_VERSIONS,
+        "models": MODELS,
+        "agents": AGENTS,
+    }
+    with pglite_engine.begin() as connection:
+        for statement in SEED_STATEMENTS:
+            connection.execute(text(statement), params)
+    with pglite_engine.connect() as connection:
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+        yield connection
+
+
+@pytest.fixture(scope="module")
+def checks(plan_db) -> dict[str, Check]:
+    """The states' hot queries, built by the states' own query builders."""
+    from sqlmodel import select
+
+    from english_tutor.agents.prompt_store import active_prompt_query
+    from english_tutor.models.evaluation import Message
+    from english_tutor.models.user import Session
+    from english_tutor.state.admin_state import (
+        AdminState,
+        daily_costs_query,
+        latency_stats_query,
+        prompt_history_query,
+        usage_rows_query,
+        usage_summary_query,
+    )
+    from english_tutor.state.chat_state import (
+        message_page_query,
+        pending_context_query,
+        session_page_query,
+        title_snippets_query,
+    )
+
+    user_id = USER_ID_BASE + 1
+    session_id = plan_db.execute(
+        select(Session.id).where(Session.user_id == user_id).limit(1)
+    ).scalar_one()
+    # Cursors in the middle of that session's history and the user's sessions
+    message_cursor = tuple(
+        plan_db.execute(
+            select(Message.created_at, Message.id)
+            .where(Message.session_id == session_id)
+            .order_by(Message.created_at, Message.id)
+            .offset(MESSAGES_PER_SESSION // 2)
+        ).first()
+    )
+    session_cursor = tuple(
+        plan_db.execute(
+            select(Session.updated_at, Session.id)
+            .where(Session.user_id == user_id)
+            .where(Session.is_deleted == False)  # noqa: E712
+            .order_by(Session.updated_at.desc(), Session.id.desc())
+            .offset(SESSIONS_PER_USER // 2)
+        ).first()
+    )
+    now = datetime.now(timezone.utc)
+    page_size = AdminState.USAGE_PAGE_SIZE
+    sessions_index = "ix_session_user_id_updated_at_id_live"
+    messages_index = "ix_message_session_id_created_at_id"
+    prompts_index = "ix_agentprompt_agent_name_version"
+
+    return {
+        "chat.load_sessions": Check(
+            session_page_query(user_id), "session", sessions_index
+        ),
+        "chat.load_more_sessions": Check(
+            session_page_query(user_id, session_cursor), "session", sessions_index
+        ),
+        "chat.latest_messages": Check(
+            message_page_query(session_id), "message", messages_index
+        ),
+        "chat.older_messages": Check(
+            message_page_query(session_id, message_cursor), "message", messages_index
+        ),
+        "chat.pending_context": Check(
+            pending_context_query(session_id, MESSAGES_PER_SESSION // 2),
+            "message",
+            messages_index,
+        ),
+        "chat.title_snippets": Check(
+            title_snippets_query(session_id), "message", messages_index
+        ),
+        "admin.latency_stats": Check(
+            latency_stats_query(now - timedelta(hours=24)),
+            "tokenusage",
+            "ix_tokenusage_created_at",
+        ),
+        "admin.usage_rows": Check(usage_rows_query(page_size), "tokenusage", None),
+        "admin.usage_rows_drill_down": Check(
+            usage_rows_query(page_size, MODELS[0], AGENTS[0]),
+            "tokenusage",
+            "ix_tokenusage_model_agent_id",
+        ),
+        "admin.usage_summary": Check(
+            usage_summary_query(now - timedelta(days=30)), "tokenusagerollup", None
+        ),
+        "admin.daily_costs": Check(
+            daily_costs_query(date.today() - timedelta(days=7)),
+            "userdailycost",
+            "ix_userdailycost_day",
+        ),
+        "admin.active_prompt": Check(
+            active_prompt_query("agent_1"), "agentprompt", prompts_index
+        ),
+        "admin.prompt_history": Check(
+            prompt_history_query("agent_1"), "agentprompt", prompts_index
+        ),
+    }
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "chat.load_sessions",
+        "chat.load_more_sessions",
+        "chat.latest_messages",
+        "chat.older_messages",
+        "chat.pending_context",
+        "chat.title_snippets",
+        "admin.latency_stats",
+        "admin.usage_rows",
+        "admin.usage_rows_drill_down",
+        "admin.usage_summary",
+        "admin.daily_costs",
+        "admin.active_prompt",
+        "admin.prompt_history",
+    ],
+)
+def test_query_plan(plan_db, checks, name):
+    check = checks[name]
+    compiled = check.statement.compile(dialect=plan_db.dialect)
+    sql, params = str(compiled), compiled.params
+
+    plan = plan_db.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]["Plan"]))
+    assert not [
+        n
+        for n in nodes
+        if n["Node Type"] == "Seq Scan" and n.get("Relation Name") == check.table
+    ], f"Seq Scan on {check.table}"
+    indexes = {n["Index Name"] for n in nodes if "Index Name" in n}
+    if check.index is not None:
+        assert check.index in indexes, f"plan uses {sorted(indexes) or 'no index'}"
+    else:
+        assert any(
+            n.get("Relation Name") == check.table and "Index Name" in n for n in nodes
+        ), f"no index scan on {check.table}"
+
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        plan_db.exec_driver_sql(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    median_ms = statistics.median(timings)
+    assert median_ms <= CEILING_MS, f"median {median_ms:.1f} ms"
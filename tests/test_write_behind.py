@@ -0,0 +1,117 @@
+"""WriteBehindQueue retries, shutdown flush and spill, without a database."""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from english_tutor.write_behind import PendingTurn, WriteBehindQueue
+
+
+class FlakyWriter:
+    """Stands in for `WriteBehindQueue._write`; fails the first `failures` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches: list[list[PendingTurn]] = []
+
+    def __call__(self, batch: list[PendingTurn]):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(batch))
+
+    @property
+    def written(self) -> list[PendingTurn]:
+        return [turn for batch in self.batches for turn in batch]
+
+
+def pending_turn(session_id: int) -> PendingTurn:
+    now = datetime.now(timezone.utc)
+    return PendingTurn(
+        session_id=session_id,
+        messages=[
+            {
+                "session_id": session_id,
+                "sender": sender,
+                "content_text": f"{sender} {session_id}",
+                "content_audio_path": "",
+                "feedback": 0,
+                "created_at": now,
+            }
+            for sender in ("user", "agent")
+        ],
+        token_usage=None,
+        updated_at=now,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue(monkeypatch, tmp_path):
+    monkeypatch.setattr(WriteBehindQueue, "_queue", None)
+    monkeypatch.setattr(WriteBehindQueue, "_thread", None)
+    monkeypatch.setattr(WriteBehindQueue, "_stopping", threading.Event())
+    monkeypatch.setattr(WriteBehindQueue, "_unwritten", [])
+    monkeypatch.setattr(WriteBehindQueue, "_stats", dict(WriteBehindQueue._stats))
+    monkeypatch.setattr(WriteBehindQueue, "max_attempts", 1)
+    monkeypatch.setattr(WriteBehindQueue, "retry_seconds", 0.01)
+    monkeypatch.setattr(WriteBehindQueue, "spill_path", str(tmp_path / "spill.jsonl"))
+    yield
+    WriteBehindQueue.stop()
+
+
+def install(monkeypatch, writer: FlakyWriter) -> FlakyWriter:
+    monkeypatch.setattr(WriteBehindQueue, "_write", writer)
+    return writer
+
+
+def test_failed_batch_is_retried_not_dropped(monkeypatch):
+    monkeypatch.setattr(WriteBehindQueue, "flush_seconds", 0.01)
+    writer = install(monkeypatch, FlakyWriter(failures=1))
+    turns = [pending_turn(i) for i in range(3)]
+    for turn in turns:
+        assert WriteBehindQueue._enqueue(turn)
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and (
+        len(writer.written) < len(turns) or WriteBehindQueue.stats()["held"]
+    ):
+        time.sleep(0.01)
+
+    assert writer.written == turns
+    stats = WriteBehindQueue.stats()
+    assert stats["failed"] >= 1
+    assert stats["held"] == 0
+
+
+def test_stop_flushes_queued_turns(monkeypatch):
+    # A long flush window: only `stop` makes the flusher write.
+    monkeypatch.setattr(WriteBehindQueue, "flush_seconds", 60)
+    writer = install(monkeypatch, FlakyWriter())
+    turns = [pending_turn(i) for i in range(3)]
+    for turn in turns:
+        WriteBehindQueue._enqueue(turn)
+
+    WriteBehindQueue.stop()
+
+    assert writer.written == turns
+
+
+def test_stop_spills_unwritten_turns_and_replays_them(monkeypatch, tmp_path):
+    monkeypatch.setattr(WriteBehindQueue, "flush_seconds", 0.01)
+    install(monkeypatch, FlakyWriter(failures=1_000_000))
+    turns = [pending_turn(i) for i in range(3)]
+    for turn in turns:
+        WriteBehindQueue._enqueue(turn)
+
+    with pytest.raises(RuntimeError, match="3 write-behind turns"):
+        WriteBehindQueue.stop()
+    spill = tmp_path / "spill.jsonl"
+    assert len(spill.read_text().splitlines()) == len(turns)
+
+    writer = install(monkeypatch, FlakyWriter())
+    WriteBehindQueue.replay_spill()
+
+    assert writer.written == turns
+    assert not spill.exists()